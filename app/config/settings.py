@@ -15,23 +15,49 @@ ENV = os.environ.get("ENV", "production")
 GOOGLE_CLIENT_IDS = os.environ.get("GOOGLE_CLIENT_IDS", "")
 # Zoho Zepto Mail Configuration
 ZEPTO_MAIL_API_KEY = os.environ.get("ZEPTO_MAIL_API_KEY")
+# Outbound mail queue (app/utils/email_outbox.py)
+EMAIL_OUTBOX_WORKERS = int(os.environ.get("EMAIL_OUTBOX_WORKERS", 2))
+EMAIL_MAX_ATTEMPTS = int(os.environ.get("EMAIL_MAX_ATTEMPTS", 5))
+EMAIL_SEND_TIMEOUT_SECONDS = float(os.environ.get("EMAIL_SEND_TIMEOUT_SECONDS", 10))
 
-PUBLIC_PATHS = os.environ.get("PUBLIC_PATHS")
-if not PUBLIC_PATHS:
-	PUBLIC_PATHS = ",".join([
-		"/api/v1/health",
-		"/api/v1/health/auth-config",
-		"/api/v1/auth/login",
-		"/api/v1/auth/register",
-		"/api/v1/auth/google",
-		"/api/v1/auth/refresh",
-		"/api/v1/auth/forgot-password",
-		"/api/v1/auth/reset-password",
-		"/api/v1/auth/email/send-otp",
-		"/api/v1/auth/email/verify-otp",
-		"/api/v1/auth/resend-otp",
-		"/api/v1/auth/resend-verification",
-	])
+# Extra public paths (comma-separated). Public routes are normally declared
+# with @public_endpoint on the route itself; see app/middleware/public_paths.py
+PUBLIC_PATHS = os.environ.get("PUBLIC_PATHS", "")
+# Per-user auth context cache (UserContextMiddleware)
+AUTH_CONTEXT_CACHE_TTL_SECONDS = int(os.environ.get("AUTH_CONTEXT_CACHE_TTL_SECONDS", 30))
+AUTH_CONTEXT_CACHE_MAX_ENTRIES = int(os.environ.get("AUTH_CONTEXT_CACHE_MAX_ENTRIES", 10000))
+# How often a worker applies cache invalidations made by other workers
+AUTH_CONTEXT_SYNC_SECONDS = float(os.environ.get("AUTH_CONTEXT_SYNC_SECONDS", 2))
+# Per-user cache for GET /payments/stats
+PAYMENT_STATS_CACHE_TTL_SECONDS = int(os.environ.get("PAYMENT_STATS_CACHE_TTL_SECONDS", 15))
+PAYMENT_STATS_CACHE_MAX_ENTRIES = int(os.environ.get("PAYMENT_STATS_CACHE_MAX_ENTRIES", 5000))
+# Maximum queries a single QueryPlan runs at once (see app/utils/query_plan.py)
+QUERY_PLAN_MAX_CONCURRENCY = int(os.environ.get("QUERY_PLAN_MAX_CONCURRENCY", 4))
+# Send per-query timings as a Server-Timing response header (defaults to on outside production)
+QUERY_TIMING_HEADER = os.environ.get("QUERY_TIMING_HEADER", str(ENV != "production")).lower() == "true"
+# Apply the index manifest at startup (turn off when `python -m app.database.indexes` runs at deploy time)
+ENSURE_INDEXES_ON_STARTUP = os.environ.get("ENSURE_INDEXES_ON_STARTUP", "true").lower() == "true"
+# Thread pool for argon2 hashing and the number of operations allowed to
+# wait for a thread before new ones are rejected with 503
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_QUEUE = int(os.environ.get("PASSWORD_HASH_MAX_QUEUE", 32))
+# Daily payment generation: concurrent property shards and upserts per bulk write
+PAYMENT_GENERATION_WORKERS = int(os.environ.get("PAYMENT_GENERATION_WORKERS", 4))
+PAYMENT_GENERATION_BATCH_SIZE = int(os.environ.get("PAYMENT_GENERATION_BATCH_SIZE", 500))
+# The daily job creates a tenant's payment once its nextDueDate is this close
+BILLING_HORIZON_DAYS = int(os.environ.get("BILLING_HORIZON_DAYS", 7))
+# Lease on a scheduled job's lock; renewed by heartbeat while the job runs
+JOB_LOCK_TTL_SECONDS = int(os.environ.get("JOB_LOCK_TTL_SECONDS", 120))
+# Auto-renewal job: subscriptions per prefetch batch and concurrent Razorpay orders
+RENEWAL_BATCH_SIZE = int(os.environ.get("RENEWAL_BATCH_SIZE", 200))
+RENEWAL_CONCURRENCY = int(os.environ.get("RENEWAL_CONCURRENCY", 8))
+# How often a worker checks whether another worker changed the plans (plan_catalog)
+PLAN_CATALOG_REFRESH_SECONDS = float(os.environ.get("PLAN_CATALOG_REFRESH_SECONDS", 30))
 # Razorpay
 RAZORPAY_KEY_ID = os.environ.get("RAZORPAY_KEY_ID")
-RAZORPAY_KEY_SECRET = os.environ.get("RAZORPAY_KEY_SECRET")
\ No newline at end of file
+RAZORPAY_KEY_SECRET = os.environ.get("RAZORPAY_KEY_SECRET")
+# REST endpoint (override to point at a local fake server), per-request
+# timeout and retries for failed calls
+RAZORPAY_API_BASE_URL = os.environ.get("RAZORPAY_API_BASE_URL", "https://api.razorpay.com/v1")
+RAZORPAY_TIMEOUT_SECONDS = float(os.environ.get("RAZORPAY_TIMEOUT_SECONDS", 10))
+RAZORPAY_MAX_RETRIES = int(os.environ.get("RAZORPAY_MAX_RETRIES", 2))
\ No newline at end of file
@@ -0,0 +1,267 @@
+"""
+Declarative index manifest.
+
+INDEXES lists every index the application relies on, per collection.
+ensure_indexes() applies each collection's list with one create_indexes
+call. It then stores a hash of the manifest in `schema_meta`, so later
+process starts skip index work entirely until the manifest changes.
+
+An index that cannot be built does not stop startup. Examples are a
+conflicting existing index, or a unique index over duplicate data. The
+failure is logged and recorded in `schema_meta`, and the hash is not stored,
+so the next start tries again. `--check` is the gate that fails when
+manifest indexes are missing.
+
+Apply or verify the indexes out-of-band (e.g. from a deploy step) with:
+
+    python -m app.database.indexes            # apply if the manifest changed
+    python -m app.database.indexes --force    # apply even if the hash matches
+    python -m app.database.indexes --check    # report missing indexes, exit 1 if any
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+from .mongodb import db
+
+logger = logging.getLogger(__name__)
+
+META_COLLECTION = "schema_meta"
+META_ID = "indexes"
+# IndexOptionsConflict / IndexKeySpecsConflict: an index on the same keys
+# already exists with a different name or options (reported, left as is)
+CONFLICT_CODES = {85, 86}
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel("email", unique=True),
+        IndexModel("createdAt"),
+        IndexModel("phone"),
+    ],
+    "auth_context_invalidations": [
+        # Read by every worker every few seconds; an hour of history is plenty
+        IndexModel("at", expireAfterSeconds=60*60),
+    ],
+    "token_blacklist": [
+        IndexModel("createdAt", expireAfterSeconds=60*60*24*7),
+    ],
+    "properties": [
+        IndexModel("ownerIds"),
+        IndexModel("createdAt"),
+        IndexModel("active"),
+        IndexModel([("ownerIds", ASCENDING), ("active", ASCENDING)]),
+        # Text search for property search
+        IndexModel([("name", TEXT), ("address", TEXT)]),
+    ],
+    "rooms": [
+        IndexModel("propertyId"),
+        IndexModel("active"),
+        IndexModel([("propertyId", ASCENDING), ("active", ASCENDING)]),
+        # Room number uniqueness checks
+        IndexModel([("propertyId", ASCENDING), ("roomNumber", ASCENDING)]),
+    ],
+    "beds": [
+        IndexModel("propertyId"),
+        IndexModel("roomId"),
+        IndexModel("status"),
+        IndexModel([("propertyId", ASCENDING), ("status", ASCENDING)]),
+        IndexModel([("roomId", ASCENDING), ("status", ASCENDING)]),
+    ],
+    "tenants": [
+        IndexModel("propertyId"),
+        IndexModel("bedId"),
+        IndexModel("status"),
+        IndexModel([("propertyId", ASCENDING), ("autoGeneratePayments", ASCENDING)]),
+        IndexModel([("propertyId", ASCENDING), ("status", ASCENDING)]),
+        IndexModel([("propertyId", ASCENDING), ("billingConfig.status", ASCENDING)]),
+        # Daily payment job reads only tenants whose next due date is near
+        IndexModel([("propertyId", ASCENDING), ("nextDueDate", ASCENDING)]),
+        IndexModel("nextDueDate"),
+        # Anchored prefix search on phone numbers and document ids
+        IndexModel([("propertyId", ASCENDING), ("phone", ASCENDING)]),
+        IndexModel([("propertyId", ASCENDING), ("documentId", ASCENDING)]),
+        # Partial-name prefix search, OR-ed with $text (every $or clause needs an index)
+        IndexModel("name"),
+        # Text search for tenant search
+        IndexModel([("name", TEXT), ("phone", TEXT), ("documentId", TEXT)]),
+    ],
+    "payments": [
+        IndexModel("propertyId"),
+        IndexModel("tenantId"),
+        IndexModel("status"),
+        IndexModel("dueDate"),
+        IndexModel([("propertyId", ASCENDING), ("status", ASCENDING)]),
+        IndexModel([("propertyId", ASCENDING), ("dueDate", ASCENDING)]),
+        # Keyset pagination for payment listings (newest first, _id tie-breaker)
+        IndexModel([("propertyId", ASCENDING), ("updatedAt", DESCENDING), ("_id", DESCENDING)]),
+        # One payment per tenant and due date (non-sparse to enforce uniqueness)
+        IndexModel([("tenantId", ASCENDING), ("dueDate", ASCENDING)], unique=True),
+    ],
+    "staff": [
+        IndexModel("propertyId"),
+        IndexModel("role"),
+        IndexModel("status"),
+        IndexModel([("propertyId", ASCENDING), ("archived", ASCENDING)]),
+    ],
+    "subscriptions": [
+        IndexModel([("ownerId", ASCENDING), ("plan", ASCENDING)], unique=True),
+        IndexModel("ownerId"),
+        IndexModel("status"),
+        IndexModel([("ownerId", ASCENDING), ("status", ASCENDING)]),
+    ],
+    "email_otps": [
+        IndexModel("email"),
+        IndexModel("createdAt", expireAfterSeconds=60*10),  # Auto-delete after 10 minutes
+    ],
+    "otp_attempts": [
+        IndexModel("email"),
+        IndexModel("createdAt", expireAfterSeconds=60*60),  # Auto-delete after 1 hour
+    ],
+    "email_outbox": [
+        IndexModel([("status", ASCENDING), ("nextAttemptAt", ASCENDING)]),
+        # Backstop for expired OTP mail when no worker is running to dead-letter it
+        IndexModel("expiresAt", expireAfterSeconds=60*10),
+    ],
+    "email_dead_letters": [
+        IndexModel("createdAt"),
+    ],
+    "razorpay_orders": [
+        IndexModel("order_id", unique=True),
+        IndexModel("propertyId"),
+        IndexModel("createdAt"),
+    ],
+    "renewal_orders": [
+        # Webhooks look renewals up by Razorpay order id
+        IndexModel("orderId"),
+    ],
+    "coupons": [
+        IndexModel("code", unique=True),
+        IndexModel("isActive"),
+        IndexModel("expiresAt"),
+        IndexModel("createdAt"),
+    ],
+    "plans": [
+        IndexModel("name", unique=True),
+        IndexModel("isActive"),
+        IndexModel("sort_order"),
+        IndexModel("createdAt"),
+    ],
+}
+
+
+def manifest_hash() -> str:
+    """Stable hash of INDEXES; changes whenever an index is added, removed or altered"""
+    manifest = {
+        collection: sorted(json.dumps(model.document, sort_keys=True, default=str) for model in models)
+        for collection, models in INDEXES.items()
+    }
+    return hashlib.sha256(json.dumps(manifest, sort_keys=True).encode()).hexdigest()
+
+
+async def _apply_collection(collection: str, models: List[IndexModel]) -> Dict[str, str]:
+    """Create a collection's indexes; returns {index name: error} for the ones that could not be built"""
+    try:
+        await db[collection].create_indexes(models)
+        return {}
+    except OperationFailure:
+        pass
+
+    # One bad index fails the whole batch: retry one by one so the rest
+    # still get built, and report the ones that fail
+    failures = {}
+    for model in models:
+        try:
+            await db[collection].create_indexes([model])
+        except OperationFailure as e:
+            reason = "conflicts with an existing index" if e.code in CONFLICT_CODES else "failed"
+            failures[model.document["name"]] = f"{reason} (code {e.code}): {e.details.get('errmsg', e) if e.details else e}"
+    return failures
+
+
+async def ensure_indexes(force: bool = False) -> bool:
+    """
+    Apply INDEXES unless the stored manifest hash says they already are.
+    Returns True when indexes were (re)applied.
+    """
+    current = manifest_hash()
+    if not force:
+        meta = await db[META_COLLECTION].find_one({"_id": META_ID}, {"hash": 1})
+        if meta and meta.get("hash") == current:
+            logger.info("✓ Indexes up to date (manifest unchanged), skipping")
+            return False
+
+    collections = list(INDEXES)
+    results = await asyncio.gather(*(_apply_collection(c, INDEXES[c]) for c in collections))
+
+    failures = {c: errors for c, errors in zip(collections, results) if errors}
+    for collection, errors in failures.items():
+        for name, error in errors.items():
+            logger.error(f"✗ Index {collection}.{name} not built: {error}")
+
+    update = {"$set": {"appliedAt": datetime.now(timezone.utc), "failures": failures}}
+    if failures:
+        # Without the hash the next start retries; `--check` reports what is missing
+        update["$unset"] = {"hash": ""}
+    else:
+        update["$set"]["hash"] = current
+    await db[META_COLLECTION].update_one({"_id": META_ID}, update, upsert=True)
+    logger.info(
+        f"✓ Indexes applied to {len(collections)} collections"
+        + (f", {sum(len(e) for e in failures.values())} failed" if failures else "")
+    )
+    return True
+
+
+async def missing_indexes() -> Dict[str, List[str]]:
+    """Manifest indexes (by key pattern) that do not exist in the database"""
+    missing = {}
+    for collection, models in INDEXES.items():
+        existing = set()
+        async for index in db[collection].list_indexes():
+            # Text indexes are stored as {_fts, _ftsx}; compare them by weights instead
+            if "weights" in index:
+                existing.add(("text", tuple(sorted(index["weights"]))))
+            else:
+                existing.add(tuple(index["key"].items()))
+
+        absent = []
+        for model in models:
+            keys = model.document["key"]
+            if TEXT in keys.values():
+                wanted = ("text", tuple(sorted(keys)))
+            else:
+                wanted = tuple(keys.items())
+            if wanted not in existing:
+                absent.append(model.document["name"])
+        if absent:
+            missing[collection] = absent
+    return missing
+
+
+async def _main(args) -> int:
+    if args.check:
+        missing = await missing_indexes()
+        for collection, names in missing.items():
+            print(f"{collection}: missing {', '.join(names)}")
+        if not missing:
+            print("All manifest indexes exist")
+        return 1 if missing else 0
+
+    applied = await ensure_indexes(force=args.force)
+    print("Indexes applied" if applied else "Indexes up to date")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Apply or verify the MongoDB index manifest")
+    parser.add_argument("--force", action="store_true", help="apply even when the stored manifest hash matches")
+    parser.add_argument("--check", action="store_true", help="only report indexes missing from the database")
+    raise SystemExit(asyncio.run(_main(parser.parse_args())))
@@ -0,0 +1,200 @@
+"""
+Mongo-backed lease locks for scheduled jobs.
+
+Every API process starts its own APScheduler, so each cron trigger fires
+once per worker. run_exclusive() lets exactly one of them run the job for a
+given schedule slot (by default the UTC date):
+
+- The lock document `job_locks/<job>` is taken with a single conditional
+  upsert. It succeeds only if the lock is free or its lease has expired, and
+  the slot has not been completed yet. Every other worker gets a duplicate
+  key error and skips the run.
+- While the job runs, a heartbeat extends the lease. A crashed holder's lease
+  expires after JOB_LOCK_TTL_SECONDS, and another worker may then take over.
+- Each acquisition increments a token. Heartbeats and release compare it,
+  so a holder that stalled past its lease can no longer renew the lock or
+  mark the slot completed after someone else took over. Jobs call
+  `await lease.check()` before each batch of writes. It re-reads the lock
+  document and raises LeaseLost once the token is gone or the lease has
+  expired. This is a check before each batch, not a fence on every write:
+  a takeover in the middle of a batch is caught before the next one.
+- run_now() takes the same lock for on-demand runs (e.g. an admin endpoint)
+  without touching the completed slot, and raises JobLocked while it is held.
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.config import settings
+from .mongodb import db
+
+logger = logging.getLogger(__name__)
+
+locks_collection = db["job_locks"]
+
+# Identifies this process as a lock owner
+OWNER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class LeaseLost(Exception):
+    """The lease expired or was taken over by another worker"""
+
+
+class JobLocked(Exception):
+    """Another worker is running the job right now"""
+
+
+class JobLease:
+    def __init__(self, name: str, slot: str, token: int, ttl_seconds: float):
+        self.name = name
+        self.slot = slot
+        self.token = token
+        self.ttl_seconds = ttl_seconds
+        self.lost = False
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    def _fence(self) -> dict:
+        return {"_id": self.name, "owner": OWNER_ID, "token": self.token}
+
+    async def check(self):
+        """Raise LeaseLost unless the lock document still holds this worker's unexpired token"""
+        if not self.lost:
+            doc = await locks_collection.find_one(
+                {**self._fence(), "expiresAt": {"$gt": datetime.now(timezone.utc)}},
+                {"_id": 1},
+            )
+            if doc is None:
+                self.lost = True
+                logger.error(f"✗ Job lock {self.name} (token {self.token}) is no longer held")
+        if self.lost:
+            raise LeaseLost(f"Lease on {self.name} (token {self.token}) was lost")
+
+    async def _renew_forever(self):
+        interval = max(1.0, self.ttl_seconds / 3)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                result = await locks_collection.update_one(
+                    self._fence(),
+                    {"$set": {
+                        "expiresAt": datetime.now(timezone.utc) + timedelta(seconds=self.ttl_seconds),
+                        "heartbeatAt": datetime.now(timezone.utc),
+                    }},
+                )
+            except Exception as e:
+                # Keep trying; the lease only counts as lost once someone else holds it
+                logger.warning(f"Heartbeat for job lock {self.name} failed: {e}")
+                continue
+            if result.matched_count == 0:
+                self.lost = True
+                logger.error(f"✗ Lost job lock {self.name} (token {self.token})")
+                return
+
+    def start_heartbeat(self):
+        self._heartbeat = asyncio.create_task(self._renew_forever())
+
+    async def release(self, completed: bool):
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            await asyncio.gather(self._heartbeat, return_exceptions=True)
+
+        now = datetime.now(timezone.utc)
+        update = {"owner": None, "expiresAt": now}
+        if completed:
+            update.update({"lastCompletedSlot": self.slot, "lastCompletedAt": now})
+        result = await locks_collection.update_one(self._fence(), {"$set": update})
+        if result.matched_count == 0:
+            self.lost = True
+
+
+async def acquire(name: str, slot: str, ttl_seconds: Optional[float] = None) -> Optional[JobLease]:
+    """Take the lock for `slot`; None when another worker holds it or the slot is done"""
+    ttl_seconds = ttl_seconds or settings.JOB_LOCK_TTL_SECONDS
+    now = datetime.now(timezone.utc)
+    try:
+        doc = await locks_collection.find_one_and_update(
+            {
+                "_id": name,
+                "$or": [{"owner": None}, {"expiresAt": {"$lte": now}}],
+                "lastCompletedSlot": {"$ne": slot},
+            },
+            {
+                "$set": {
+                    "owner": OWNER_ID,
+                    "slot": slot,
+                    "acquiredAt": now,
+                    "heartbeatAt": now,
+                    "expiresAt": now + timedelta(seconds=ttl_seconds),
+                },
+                "$inc": {"token": 1},
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # The document exists but is held or already completed for this slot
+        return None
+    return JobLease(name, slot, doc["token"], ttl_seconds)
+
+
+def daily_slot() -> str:
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+async def _run_with_lease(lease: JobLease, job: Callable[[JobLease], Awaitable[Any]], mark_completed: bool) -> Any:
+    lease.start_heartbeat()
+    completed = False
+    try:
+        result = await job(lease)
+        completed = mark_completed and not lease.lost
+        return result
+    finally:
+        await lease.release(completed)
+        if lease.lost:
+            logger.error(f"✗ {lease.name} for {lease.slot} finished after losing its lock; slot not marked completed")
+
+
+async def run_exclusive(
+    name: str,
+    job: Callable[[JobLease], Awaitable[Any]],
+    slot: Optional[str] = None,
+    ttl_seconds: Optional[float] = None,
+) -> Any:
+    """
+    Run `job(lease)` if this worker wins the lock for the slot, otherwise skip it.
+    Returns the job's result, or None when skipped.
+    """
+    slot = slot or daily_slot()
+    lease = await acquire(name, slot, ttl_seconds)
+    if lease is None:
+        logger.info(f"Skipping {name} for {slot}: already running or completed elsewhere")
+        return None
+
+    logger.info(f"Acquired job lock {name} for {slot} (token {lease.token})")
+    return await _run_with_lease(lease, job, mark_completed=True)
+
+
+async def run_now(
+    name: str,
+    job: Callable[[JobLease], Awaitable[Any]],
+    ttl_seconds: Optional[float] = None,
+) -> Any:
+    """
+    Run `job(lease)` on demand under the same lock as the scheduled runs.
+    Raises JobLocked when another worker holds it. The scheduled slot is left
+    as it was, so a manual run neither needs nor consumes it.
+    """
+    slot = f"manual:{uuid.uuid4().hex}"
+    lease = await acquire(name, slot, ttl_seconds)
+    if lease is None:
+        raise JobLocked(f"{name} is already running")
+
+    logger.info(f"Acquired job lock {name} for a manual run (token {lease.token})")
+    return await _run_with_lease(lease, job, mark_completed=False)
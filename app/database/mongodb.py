@@ -1,4 +1,5 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import OperationFailure
 
 from app.config import settings
 
@@ -20,3 +21,22 @@ db = client[db_name]
 
 def getCollection(name: str):
     return db[name]
+
+
+async def run_in_transaction(callback):
+    """
+    Run `await callback(session)` in a multi-document transaction.
+
+    Motor's with_transaction retries the callback on TransientTransactionError
+    and the commit on UnknownTransactionCommitResult, so the callback must be
+    safe to run more than once. Standalone servers (local development) do not
+    support transactions; there the callback runs once with session=None.
+    """
+    async with await client.start_session() as session:
+        try:
+            return await session.with_transaction(callback)
+        except OperationFailure as e:
+            # IllegalOperation: "Transaction numbers are only allowed on a replica set member or mongos"
+            if e.code != 20:
+                raise
+    return await callback(None)
@@ -1,6 +1,5 @@
 from dotenv import load_dotenv
 load_dotenv() 
-from app.database.mongodb import db
 from contextlib import asynccontextmanager
 from starlette.middleware.httpsredirect import HTTPSRedirectMiddleware
 from fastapi import FastAPI, Request
@@ -11,7 +10,8 @@ from fastapi.responses import JSONResponse
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 import logging
-from pymongo.errors import OperationFailure
+from app.config import settings
+from app.database.indexes import ensure_indexes
 
 import os
 from app.routes import health, auth, property, room, tenant, bed, subscription, dashboard, staff, payment, coupon, plan
@@ -33,136 +33,12 @@ if not os.path.exists(static_dir):
     os.makedirs(static_dir)
 
 # FastAPI lifespan event handler for startup tasks
-async def ensure_indexes():
-    """Create essential indexes for production-grade queries."""
-    logger = logging.getLogger(__name__)
-    
-    async def create_index_safe(collection, keys, **kwargs):
-        """Safely create an index, ignoring conflicts with existing indexes."""
-        try:
-            db[collection].create_index(keys, **kwargs)
-        except OperationFailure as e:
-            # IndexKeySpecsConflict (code 86) means the index already exists with different specs
-            # This is safe to ignore - the index was already created
-            if e.code == 86:
-                logger.debug(f"Index already exists on {collection} for {keys}, skipping")
-            else:
-                raise
-    
-    # ============ USERS COLLECTION ============
-    await create_index_safe("users", "email", unique=True)
-    await create_index_safe("users", "createdAt")
-    await create_index_safe("users", "phone")
-    logger.info("✓ Users indexes created")
-    
-    # ============ TOKEN BLACKLIST COLLECTION ============
-    await create_index_safe("token_blacklist", "createdAt", expireAfterSeconds=60*60*24*7)
-    logger.info("✓ Token blacklist indexes created")
-    
-    # ============ PROPERTIES COLLECTION ============
-    await create_index_safe("properties", "ownerIds")
-    await create_index_safe("properties", "createdAt")
-    await create_index_safe("properties", "active")
-    await create_index_safe("properties", [("ownerIds", 1), ("active", 1)])
-    logger.info("✓ Properties indexes created")
-    
-    # ============ ROOMS COLLECTION ============
-    await create_index_safe("rooms", "propertyId")
-    await create_index_safe("rooms", "active")
-    await create_index_safe("rooms", [("propertyId", 1), ("active", 1)])
-    logger.info("✓ Rooms indexes created")
-    
-    # ============ BEDS COLLECTION ============
-    await create_index_safe("beds", "propertyId")
-    await create_index_safe("beds", "roomId")
-    await create_index_safe("beds", "status")
-    await create_index_safe("beds", [("propertyId", 1), ("status", 1)])
-    logger.info("✓ Beds indexes created")
-    
-    # ============ TENANTS COLLECTION ============
-    await create_index_safe("tenants", "propertyId")
-    await create_index_safe("tenants", "bedId")
-    await create_index_safe("tenants", "status")
-    await create_index_safe("tenants", [("propertyId", 1), ("autoGeneratePayments", 1)])
-    await create_index_safe("tenants", [("propertyId", 1), ("status", 1)])
-    logger.info("✓ Tenants indexes created")
-    
-    # ============ PAYMENTS COLLECTION ============
-    await create_index_safe("payments", "propertyId")
-    await create_index_safe("payments", "tenantId")
-    await create_index_safe("payments", "status")
-    await create_index_safe("payments", "dueDate")
-    await create_index_safe("payments", [("propertyId", 1), ("status", 1)])
-    # Unique index to prevent duplicate payments (non-sparse to enforce uniqueness)
-        # Additional compound index for common tenant queries
-    await create_index_safe("tenants", [("propertyId", 1), ("billingConfig.status", 1)])
-    # Text search index for tenant search functionality
-    try:
-        await create_index_safe("tenants", [("name", "text"), ("phone", "text"), ("documentId", "text")])
-    except Exception:
-        pass  # Text indexes can conflict, skip if already exists
-    await create_index_safe("payments", [("tenantId", 1), ("dueDate", 1)], unique=True)
-    logger.info("✓ Payments indexes created (including unique tenantId+dueDate)")
-    
-    # ============ STAFF COLLECTION ============
-    await create_index_safe("staff", "propertyId")
-    await create_index_safe("staff", "role")
-    await create_index_safe("staff", "status")
-    await create_index_safe("staff", [("propertyId", 1), ("archived", 1)])
-        # Compound index for efficient payment queries by property and due date
-    await create_index_safe("payments", [("propertyId", 1), ("dueDate", 1)])
-    logger.info("✓ Staff indexes created")
-    
-    # ============ SUBSCRIPTIONS COLLECTION ============
-    await create_index_safe("subscriptions", [("ownerId", 1), ("plan", 1)], unique=True)
-    await create_index_safe("subscriptions", "ownerId")
-    await create_index_safe("subscriptions", "status")
-    await create_index_safe("subscriptions", [("ownerId", 1), ("status", 1)])
-    logger.info("✓ Subscriptions indexes created")
-    
-        # Compound index for room-specific bed queries
-    await create_index_safe("beds", [("roomId", 1), ("status", 1)])
-    # ============ EMAIL OTP COLLECTION ============
-    await create_index_safe("email_otps", "email")
-    await create_index_safe("email_otps", "createdAt", expireAfterSeconds=60*10)  # Auto-delete after 10 minutes
-    logger.info("✓ Email OTP indexes created (TTL: 10 minutes)")
-    
-    # ============ OTP ATTEMPTS COLLECTION ============
-        # Compound index for room number uniqueness checks
-    await create_index_safe("rooms", [("propertyId", 1), ("roomNumber", 1)])
-    await create_index_safe("otp_attempts", "email")
-    await create_index_safe("otp_attempts", "createdAt", expireAfterSeconds=60*60)  # Auto-delete after 1 hour
-    logger.info("✓ OTP Attempts indexes created (TTL: 1 hour)")
-    
-    # ============ RAZORPAY ORDERS COLLECTION ============
-    await create_index_safe("razorpay_orders", "order_id", unique=True)
-    await create_index_safe("razorpay_orders", "propertyId")
-        # Text search index for property search
-    try:
-        await create_index_safe("properties", [("name", "text"), ("address", "text")])
-    except Exception:
-        pass  # Text indexes can conflict, skip if already exists
-    await create_index_safe("razorpay_orders", "createdAt")
-    logger.info("✓ Razorpay Orders indexes created")
-    
-    # ============ COUPONS COLLECTION ============
-    await create_index_safe("coupons", "code", unique=True)
-    await create_index_safe("coupons", "isActive")
-    await create_index_safe("coupons", "expiresAt")
-    await create_index_safe("coupons", "createdAt")
-    logger.info("✓ Coupons indexes created")
-    
-    # ============ PLANS COLLECTION ============
-    await create_index_safe("plans", "name", unique=True)
-    await create_index_safe("plans", "isActive")
-    await create_index_safe("plans", "sort_order")
-    await create_index_safe("plans", "createdAt")
-    logger.info("✓ Plans indexes created")
-
-
 @asynccontextmanager
 async def lifespan(app):
-    await ensure_indexes()
+    # Indexes come from the manifest in app/database/indexes.py; this is a
+    # single read when it has not changed since the last apply
+    if settings.ENSURE_INDEXES_ON_STARTUP:
+        await ensure_indexes()
     
     # Initialize default subscription plans (idempotent - only creates if none exist)
     from app.services.plan_service import PlanService
@@ -174,23 +50,51 @@ async def lifespan(app):
     else:
         logger.info("✓ Subscription plans already exist")
     
+    from app.services.plan_catalog import plan_catalog
+    logger.info(f"✓ Plan catalog loaded ({await plan_catalog.load()} plans)")
+    
     # Initialize APScheduler for background jobs
     scheduler = AsyncIOScheduler()
     
     # Import here to avoid circular imports
     from app.services.tenant_service import TenantService
     from app.services.razorpay_subscription_service import RazorpaySubscriptionService
+    from app.services.property_stats_service import PropertyStatsService
+    from app.services.owner_usage_service import OwnerUsageService
+    from app.database.job_locks import run_exclusive
     tenant_service = TenantService()
+    property_stats_service = PropertyStatsService()
+    owner_usage_service = OwnerUsageService()
+    
+    # Every worker process fires these triggers; run_exclusive lets only the
+    # one holding the job lock run each job once per day
     
     # Wrapper for scheduled job to add logging
     async def generate_payments_job():
-        result = await tenant_service.generate_monthly_payments()
+        result = await run_exclusive(
+            "generate_monthly_payments",
+            lambda lease: tenant_service.generate_monthly_payments(fence=lease.check),
+        )
         # Result already contains timing info - logged by service
         return result
     
     # Wrapper for auto-renewal job
     async def auto_renewal_job():
-        result = await RazorpaySubscriptionService.check_and_renew_subscriptions()
+        result = await run_exclusive(
+            "auto_renewal_subscriptions",
+            lambda lease: RazorpaySubscriptionService.check_and_renew_subscriptions(fence=lease.check),
+        )
+        return result
+    
+    # Wrapper for dashboard counter reconciliation job
+    async def reconcile_property_stats_job():
+        async def reconcile(lease):
+            result = await property_stats_service.reconcile_all(fence=lease.check)
+            # Per-owner property counters are recounted from the properties collection
+            result["owner_usage"] = await owner_usage_service.reconcile_all(fence=lease.check)
+            return result
+
+        result = await run_exclusive("reconcile_property_stats", reconcile)
         return result
     
     # Job 1: Generate monthly payments daily at 00:05 UTC
@@ -219,11 +123,28 @@ async def lifespan(app):
         misfire_grace_time=300
     )
     
+    # Job 3: Rebuild materialized dashboard counters daily at 02:00 UTC
+    # Writes keep property_stats up to date incrementally; this repairs any drift
+    scheduler.add_job(
+        reconcile_property_stats_job,
+        trigger=CronTrigger(hour=2, minute=0, timezone="UTC"),
+        id="reconcile_property_stats",
+        name="Reconcile per-property dashboard counters",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+        misfire_grace_time=300
+    )
+    
     scheduler.start()
     app.state.scheduler = scheduler
+
+    # Background delivery of queued emails
+    from app.utils.email_outbox import email_outbox
+    email_outbox.start()
     
     logger.info("✓ Background scheduler initialized")
-    logger.info("✓ Jobs registered: generate_monthly_payments (daily at 00:05 UTC), auto_renewal_subscriptions (daily at 01:00 UTC)")
+    logger.info("✓ Jobs registered: generate_monthly_payments (daily at 00:05 UTC), auto_renewal_subscriptions (daily at 01:00 UTC), reconcile_property_stats (daily at 02:00 UTC)")
     
     yield
     
@@ -231,6 +152,17 @@ async def lifespan(app):
     scheduler.shutdown()
     logger.info("✓ Background scheduler shut down")
 
+    from app.utils.password_hasher import password_hasher
+    password_hasher.shutdown()
+
+    from app.services.razorpay_gateway import razorpay_gateway
+    await razorpay_gateway.aclose()
+
+    await email_outbox.stop()
+    from app.utils.email_service import close_email_client
+    await close_email_client()
+    logger.info("✓ Email outbox stopped")
+
 
 
 app = FastAPI(lifespan=lifespan)
@@ -0,0 +1,93 @@
+"""
+Public (unauthenticated) path matching for UserContextMiddleware.
+
+Routes opt out of authentication by decorating their endpoint with
+@public_endpoint. The matcher is built once from the application's routes
+(plus any extra paths from the PUBLIC_PATHS environment variable) and is
+immutable afterwards.
+"""
+from typing import Iterable
+
+from app.config import settings
+
+# Trie node markers (objects so they can never collide with a path segment)
+_WILDCARD = object()  # "{param}" segment
+_END = object()  # a full path/template ends here
+_PREFIX_END = object()  # everything below this node is public
+
+
+def public_endpoint(func):
+    """Mark a route endpoint as reachable without an access token"""
+    func.is_public = True
+    return func
+
+
+class PublicPathMatcher:
+    """Exact-match set plus a segment trie for prefixes and route templates"""
+
+    __slots__ = ("_exact", "_trie")
+
+    def __init__(
+        self,
+        exact_paths: Iterable[str] = (),
+        prefixes: Iterable[str] = (),
+        templates: Iterable[str] = (),
+    ):
+        self._exact = frozenset(exact_paths)
+        self._trie: dict = {}
+        for prefix in prefixes:
+            self._insert(prefix.rstrip("/"), _PREFIX_END)
+        for template in templates:
+            self._insert(template, _END)
+
+    @classmethod
+    def from_app(cls, app) -> "PublicPathMatcher":
+        """Collect @public_endpoint routes from the app and PUBLIC_PATHS from settings"""
+        exact = {p.strip() for p in (settings.PUBLIC_PATHS or "").split(",") if p.strip()}
+        templates = []
+        for route in getattr(app, "routes", []):
+            endpoint = getattr(route, "endpoint", None)
+            path = getattr(route, "path", None)
+            if not path or not getattr(endpoint, "is_public", False):
+                continue
+            if "{" in path:
+                templates.append(path)
+            else:
+                exact.add(path)
+        return cls(exact_paths=exact, templates=templates)
+
+    def _insert(self, path: str, marker) -> None:
+        node = self._trie
+        for segment in path.split("/")[1:]:
+            if segment.startswith("{") and segment.endswith("}"):
+                if segment.endswith(":path}"):
+                    node[_PREFIX_END] = True
+                    return
+                segment = _WILDCARD
+            node = node.setdefault(segment, {})
+        node[marker] = True
+
+    def matches(self, path: str) -> bool:
+        if path in self._exact:
+            return True
+        if not self._trie:
+            return False
+        return self._walk(self._trie, path.split("/"), 1)
+
+    def _walk(self, node: dict, segments: list[str], index: int) -> bool:
+        while True:
+            if _PREFIX_END in node and index < len(segments):
+                return True
+            if index == len(segments):
+                return _END in node
+
+            segment = segments[index]
+            literal = node.get(segment)
+            wildcard = node.get(_WILDCARD) if segment else None
+            if literal is not None and wildcard is not None:
+                # Rare ambiguity (literal and template sibling): try both branches
+                return self._walk(literal, segments, index + 1) or self._walk(wildcard, segments, index + 1)
+            node = literal if literal is not None else wildcard
+            if node is None:
+                return False
+            index += 1
@@ -1,5 +1,5 @@
 from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
 from app.database.mongodb import db
 from bson import ObjectId
 from app.utils.ownership import build_owner_query
@@ -9,9 +9,40 @@ from app.config import settings
 import logging
 from jose import JWTError, ExpiredSignatureError
 from starlette.responses import JSONResponse
+from app.utils.auth_context import get_auth_context, set_auth_context, sync_auth_context
+from app.middleware.public_paths import PublicPathMatcher
 
-class UserContextMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
+class UserContextMiddleware:
+    """
+    Authenticate the bearer token and populate request.state with the user context.
+
+    Pure ASGI middleware: the request and response streams are passed through
+    untouched, only rejected requests get a JSONResponse sent from here.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._public_matcher: PublicPathMatcher | None = None
+
+    def _get_public_matcher(self, scope: Scope) -> PublicPathMatcher:
+        # Built once, on the first request, when every router has been included
+        if self._public_matcher is None:
+            self._public_matcher = PublicPathMatcher.from_app(scope.get("app"))
+        return self._public_matcher
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        error_response = await self.dispatch(Request(scope))
+        if error_response is not None:
+            await error_response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+    async def dispatch(self, request: Request) -> JSONResponse | None:
+        """Return an error response to short-circuit, or None after populating request.state"""
         SECRET_KEY = settings.JWT_SECRET
         ALGORITHM = settings.JWT_ALGORITHM
         user_id = None
@@ -19,41 +50,16 @@ class UserContextMiddleware(BaseHTTPMiddleware):
         role = None
         property_ids = []
         subscription = None
+        cached = None
         auth_header = request.headers.get("Authorization")
         logger = logging.getLogger("uvicorn.error")
 
-        # Read public endpoints from environment variable PUBLIC_PATHS (comma-separated)
-        public_paths = {p.strip() for p in settings.PUBLIC_PATHS.split(",") if p.strip()}
-        public_paths.update({
-            "/api/v1/health",
-            "/api/v1/health/auth-config",
-            "/api/v1/auth/login",
-            "/api/v1/auth/register",
-            "/api/v1/auth/google",
-            "/api/v1/auth/email/send-otp",
-            "/api/v1/auth/email/verify-otp",
-            "/api/v1/auth/refresh",
-            "/api/v1/auth/logout",  # Logout only needs refresh token, not access token
-            "/api/v1/subscription/limits/free",  # Plan limits are public
-            "/api/v1/subscription/limits/pro",
-            "/api/v1/subscription/limits/premium",
-            "/api/v1/subscription/plans",  # Get all available plans
-        })
-        
-        # Public path prefixes (for paths with dynamic segments)
-        public_prefixes = [
-            "/api/v1/coupons/validate/",  # Coupon validation is public
-        ]
-        
-        # Check exact path match or prefix match
-        is_public = request.url.path in public_paths or any(
-            request.url.path.startswith(prefix) for prefix in public_prefixes
-        )
+        # Public endpoints are declared on the routes themselves (@public_endpoint)
+        is_public = self._get_public_matcher(request.scope).matches(request.url.path)
         
         if is_public:
             # Allow public access, skip authentication
-            response = await call_next(request)
-            return response
+            return None
 
         if auth_header and auth_header.startswith("Bearer "):
             token = auth_header.split(" ", 1)[1]
@@ -63,16 +69,25 @@ class UserContextMiddleware(BaseHTTPMiddleware):
                 if user_id is None:
                     logger.warning("JWT missing 'sub' claim.")
                     return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={"detail": "Invalid authentication credentials"})
-                user = await db["users"].find_one({"_id": ObjectId(user_id)})
-                if user:
+                # Drop entries other workers invalidated since the last check
+                await sync_auth_context()
+                cached = get_auth_context(user_id)
+                if cached:
+                    user = cached["user"]
                     role = user.get("role")
-                    owned_properties = await db["properties"].find(
-                        build_owner_query(user_id),
-                        {"_id": 1}
-                    ).to_list(length=None)
-                    property_ids = [str(doc["_id"]) for doc in owned_properties]
-                    # Sanitize user object (remove sensitive fields)
-                    user = {k: v for k, v in user.items() if k not in ["password", "hashed_password"]}
+                    property_ids = cached["property_ids"]
+                    subscription = cached["subscription"]
+                else:
+                    user = await db["users"].find_one({"_id": ObjectId(user_id)})
+                    if user:
+                        role = user.get("role")
+                        owned_properties = await db["properties"].find(
+                            build_owner_query(user_id),
+                            {"_id": 1}
+                        ).to_list(length=None)
+                        property_ids = [str(doc["_id"]) for doc in owned_properties]
+                        # Sanitize user object (remove sensitive fields)
+                        user = {k: v for k, v in user.items() if k not in ["password", "hashed_password"]}
             except ExpiredSignatureError:
                 logger.info(f"Expired JWT for user_id: {user_id}")
                 return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={"detail": "Your session has expired. Please log in again or refresh your token."})
@@ -86,14 +101,17 @@ class UserContextMiddleware(BaseHTTPMiddleware):
             logger.warning("Missing or invalid Authorization header.")
             return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={"detail": "Missing or invalid Authorization header"})
         
-        # Load subscription info
-        if user_id:
+        # Load subscription info (cached contexts already carry it)
+        if user_id and not cached:
             from app.services.subscription_service import SubscriptionService
             try:
                 subscription = await SubscriptionService.get_subscription(user_id)
             except Exception as e:
                 logger.warning(f"Failed to load subscription for {user_id}: {e}")
                 subscription = None
+            # Only cache known users with a loaded subscription
+            if user and subscription is not None:
+                set_auth_context(user_id, user, property_ids, subscription)
         
         # Attach metadata to request.state
         request.state.user_id = user_id
@@ -101,7 +119,7 @@ class UserContextMiddleware(BaseHTTPMiddleware):
         request.state.property_ids = property_ids
         request.state.current_user = user
         request.state.subscription = subscription
-        response = await call_next(request)
-        return response
+        return None
+
 
 
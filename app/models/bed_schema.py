@@ -27,3 +27,23 @@ class BedOut(BedBase):
     id: str
     createdAt: datetime
     updatedAt: datetime
+
+class BedClaimStatus(str, Enum):
+    CLAIMED = 'claimed'
+    RELEASED = 'released'
+    CONFLICT = 'conflict'
+    NOT_FOUND = 'not_found'
+
+class BedClaimResult(BaseModel):
+    """Outcome of BedService.claim_bed / release_bed"""
+    status: BedClaimStatus
+    bedId: str
+    # Current state of the bed when the claim or release was refused
+    currentStatus: Optional[str] = None
+    currentTenantId: Optional[str] = None
+    # Bed document before a successful write, for stats deltas
+    before: Optional[dict] = Field(default=None, exclude=True)
+
+    @property
+    def ok(self) -> bool:
+        return self.status in (BedClaimStatus.CLAIMED, BedClaimStatus.RELEASED)
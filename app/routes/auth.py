@@ -25,32 +25,38 @@ from app.models.user_schema import (
 )
 from app.utils.otp_memory_store import get_resend_cooldown_remaining
 from fastapi.responses import JSONResponse
+from app.middleware.public_paths import public_endpoint
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
 @router.post("/register", status_code=status.HTTP_201_CREATED, summary="Register a new user", tags=["auth"])
+@public_endpoint
 async def register(user: UserCreate):
     return await register_user_service(user)
 
 
 @router.post("/login", status_code=status.HTTP_200_OK, summary="Authenticate user and return JWT", tags=["auth"])
+@public_endpoint
 @rate_limit_dep
 async def login(request: Request, data: UserLogin):
     return await login_user_service(data)
 
 
 @router.post("/google", status_code=status.HTTP_200_OK, summary="Google sign in", tags=["auth"])
+@public_endpoint
 async def google_sign_in(payload: GoogleSignInRequest):
     return await google_sign_in_service(payload)
 
 
 @router.post("/email/send-otp", status_code=status.HTTP_200_OK, summary="Send email verification OTP", tags=["auth"])
+@public_endpoint
 async def send_email_otp(payload: EmailSendOTPRequest):
     return await send_email_otp_service(payload.email)
 
 
 @router.post("/email/resend-otp", status_code=status.HTTP_200_OK, summary="Check OTP resend cooldown status", tags=["auth"])
+@public_endpoint
 async def check_resend_status(payload: EmailSendOTPRequest):
     """Check if OTP can be resent or get cooldown remaining time"""
     normalized_email = payload.email.strip().lower()
@@ -67,16 +73,19 @@ async def check_resend_status(payload: EmailSendOTPRequest):
 
 
 @router.post("/email/verify-otp", status_code=status.HTTP_200_OK, summary="Verify email OTP", tags=["auth"])
+@public_endpoint
 async def verify_email_otp(payload: EmailVerifyOTPRequest):
     return await verify_email_otp_service(payload.email, payload.otp)
 
 
 @router.post("/refresh", status_code=status.HTTP_200_OK, summary="Refresh access token", tags=["auth"])
+@public_endpoint
 async def refresh_token_endpoint(payload: RefreshTokenRequest):
     return await refresh_token_service(payload)
 
 
 @router.post("/logout", status_code=status.HTTP_200_OK, summary="Logout user", tags=["auth"])
+@public_endpoint
 async def logout(payload: LogoutRequest):
     return await logout_user_service(payload)
 
@@ -87,10 +96,12 @@ async def get_current_user(request: Request):
 
 
 @router.post("/forgot-password", status_code=status.HTTP_200_OK, summary="Send password reset OTP", tags=["auth"])
+@public_endpoint
 async def forgot_password(payload: ForgotPasswordRequest):
     return await forgot_password_service(payload.email)
 
 
 @router.post("/reset-password", status_code=status.HTTP_200_OK, summary="Reset password with OTP", tags=["auth"])
+@public_endpoint
 async def reset_password(payload: ResetPasswordRequest):
     return await reset_password_service(payload.email, payload.otp, payload.newPassword)
@@ -2,6 +2,7 @@ from fastapi import APIRouter, HTTPException, status, Query, Request
 from typing import List
 from app.models.bed_schema import BedCreate, BedUpdate, BedOut
 from app.services.bed_service import BedService
+from app.utils.pagination import ASCENDING, apply_cursor, next_cursor, page_meta, sort_spec
 
 
 router = APIRouter(prefix="/beds", tags=["beds"])
@@ -42,7 +43,7 @@ async def get_all_beds_by_property(request: Request, property_id: str = Query(..
     }
 
 @router.get("", response_model=dict)
-async def list_beds(request: Request, room_id: str = Query(None), property_id: str = Query(None), status_filter: str = Query(None), page: int = Query(1), page_size: int = Query(50)):
+async def list_beds(request: Request, room_id: str = Query(None), property_id: str = Query(None), status_filter: str = Query(None), page: int = Query(1), page_size: int = Query(50), cursor: str = Query(None), withTotal: bool = Query(True)):
     beds = []
     query = {}
     property_ids = getattr(request.state, "property_ids", [])
@@ -60,22 +61,33 @@ async def list_beds(request: Request, room_id: str = Query(None), property_id: s
     page_size = min(100, max(1, page_size))  # Cap at 100 per page
     skip = (page - 1) * page_size
     
+    try:
+        page_query = apply_cursor(query, "_id", ASCENDING, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     # Get total count
-    total = await bed_service.db["beds"].count_documents(query)
+    total = await bed_service.db["beds"].count_documents(query) if withTotal else None
     
-    # Get paginated results
-    cursor = bed_service.db["beds"].find(query).skip(skip).limit(page_size)
-    async for doc in cursor:
+    # Get paginated results (one extra document to detect a next page)
+    find_cursor = bed_service.db["beds"].find(page_query).sort(sort_spec("_id", ASCENDING))
+    if not cursor:
+        find_cursor = find_cursor.skip(skip)
+    docs = await find_cursor.limit(page_size + 1).to_list(length=page_size + 1)
+    has_more = len(docs) > page_size
+    docs = docs[:page_size]
+    for doc in docs:
         beds.append(BedOut(**doc))
     
     return {
         "data": beds,
-        "meta": {
-            "total": total,
-            "page": page,
-            "pageSize": page_size,
-            "hasMore": skip + page_size < total
-        }
+        "meta": page_meta(
+            total=total,
+            page=page,
+            page_size=page_size,
+            has_more=has_more,
+            next_page_cursor=next_cursor(docs[-1], "_id") if has_more else None,
+        )
     }
 
 @router.post("", response_model=BedOut, status_code=status.HTTP_201_CREATED)
@@ -3,6 +3,7 @@ from typing import Optional
 from datetime import datetime
 from app.services.coupon_service import CouponService
 from app.utils.helpers import get_current_user
+from app.middleware.public_paths import public_endpoint
 
 router = APIRouter(prefix="/coupons", tags=["coupons"])
 
@@ -164,6 +165,7 @@ async def delete_coupon(
 # ==================== PUBLIC ENDPOINTS ====================
 
 @router.get("/validate/{code}")
+@public_endpoint
 async def validate_coupon(
     code: str,
     amount: int = Query(..., description="Amount in paise"),
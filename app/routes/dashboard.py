@@ -1,12 +1,16 @@
-from fastapi import APIRouter, Request, HTTPException
-from app.database.mongodb import getCollection
-from datetime import datetime, timedelta
-from bson import ObjectId
+from fastapi import APIRouter, Request, Response, HTTPException
+from datetime import datetime
+import time
+from app.config import settings
+from app.services.property_stats_service import PropertyStatsService
+from app.utils.query_plan import format_server_timing
+from app.utils.money import paise_to_rupees, format_rupees
 
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
+property_stats_service = PropertyStatsService()
 
 @router.get("/stats")
-async def get_dashboard_stats(request: Request, property_id: str):
+async def get_dashboard_stats(request: Request, response: Response, property_id: str):
     """Get aggregated dashboard statistics for a specific property"""
     property_ids = getattr(request.state, "property_ids", [])
     
@@ -14,156 +18,34 @@ async def get_dashboard_stats(request: Request, property_id: str):
     if property_id not in property_ids:
         raise HTTPException(status_code=403, detail="You don't have access to this property")
     
-    # Get collections
-    tenants_col = getCollection("tenants")
-    beds_col = getCollection("beds")
-    payments_col = getCollection("payments")
-    staff_col = getCollection("staff")
-    
-    # Count tenants for this property - separate active and vacated
-    # Handle tenants with missing tenantStatus field (treat as 'active' by default)
-    active_tenants_count = await tenants_col.count_documents({
-        "propertyId": property_id,
-        "archived": {"$ne": True},
-        "$or": [
-            {"tenantStatus": "active"},
-            {"tenantStatus": {"$exists": False}}  # Existing tenants without the field default to active
-        ]
-    })
-    vacated_tenants_count = await tenants_col.count_documents({
-        "propertyId": property_id,
-        "archived": {"$ne": True},
-        "tenantStatus": "vacated"
-    })
+    start = time.perf_counter()
+    timings = {}
+    stats = await property_stats_service.get_stats(property_id, timings=timings)
+    if settings.QUERY_TIMING_HEADER:
+        timings["total"] = (time.perf_counter() - start) * 1000
+        response.headers["Server-Timing"] = format_server_timing(timings)
+
+    def counter(field: str) -> int:
+        # Deltas can briefly drift below zero; the reconciliation job repairs them
+        return max(stats.get(field, 0), 0)
+
+    active_tenants_count = counter("activeTenants")
+    vacated_tenants_count = counter("vacatedTenants")
     tenants_count = active_tenants_count  # Count only active tenants
-    
-    # Count beds and occupancy
-    total_beds = await beds_col.count_documents({"propertyId": property_id})
-    occupied_beds = await beds_col.count_documents({
-        "propertyId": property_id,
-        "status": "occupied"
-    })
-    
+
+    total_beds = counter("totalBeds")
+    occupied_beds = counter("occupiedBeds")
     occupancy_rate = (occupied_beds / total_beds * 100) if total_beds > 0 else 0
-    
-    # Get current month dates
+
     today = datetime.now()
-    month_start = datetime(today.year, today.month, 1).date()
-    # Get last day of month
-    if today.month == 12:
-        month_end = datetime(today.year + 1, 1, 1).date() - timedelta(days=1)
-    else:
-        month_end = datetime(today.year, today.month + 1, 1).date() - timedelta(days=1)
-    
-    month_start_str = month_start.isoformat()
-    month_end_str = month_end.isoformat()
-    
-    # Get revenue metrics
-    paid_payments = await payments_col.aggregate([
-        {
-            "$match": {
-                "propertyId": property_id,
-                "status": "paid",
-                "paidDate": {
-                    "$gte": month_start_str,
-                    "$lte": month_end_str
-                }
-            }
-        },
-        {
-            "$addFields": {
-                "amountNumeric": {
-                    "$toInt": {
-                        "$replaceAll": {
-                            "input": {
-                                "$replaceAll": {
-                                    "input": "$amount",
-                                    "find": "₹",
-                                    "replacement": ""
-                                }
-                            },
-                            "find": ",",
-                            "replacement": ""
-                        }
-                    }
-                }
-            }
-        },
-        {
-            "$group": {
-                "_id": None,
-                "total": {"$sum": "$amountNumeric"}
-            }
-        }
-    ]).to_list(None)
-    
-    paid_this_month = paid_payments[0]["total"] if paid_payments else 0
-    
-    # Get pending payments
-    pending_payments = await payments_col.aggregate([
-        {
-            "$match": {
-                "propertyId": property_id,
-                "status": "due"
-            }
-        },
-        {
-            "$addFields": {
-                "amountNumeric": {
-                    "$toInt": {
-                        "$replaceAll": {
-                            "input": {
-                                "$replaceAll": {
-                                    "input": "$amount",
-                                    "find": "₹",
-                                    "replacement": ""
-                                }
-                            },
-                            "find": ",",
-                            "replacement": ""
-                        }
-                    }
-                }
-            }
-        },
-        {
-            "$group": {
-                "_id": None,
-                "count": {"$sum": 1},
-                "amount": {"$sum": "$amountNumeric"}
-            }
-        }
-    ]).to_list(None)
-    
-    pending_count = pending_payments[0]["count"] if pending_payments else 0
-    pending_amount = pending_payments[0]["amount"] if pending_payments else 0
-    
-    # Get monthly revenue (all paid in current month)
-    monthly_revenue = paid_this_month
-    
-    # Count check-ins today
-    today_start = datetime.combine(today.date(), datetime.min.time()).isoformat()
-    today_end = datetime.combine(today.date(), datetime.max.time()).isoformat()
-    
-    check_ins_today = await tenants_col.count_documents({
-        "propertyId": property_id,
-        "joinDate": {
-            "$gte": today_start,
-            "$lte": today_end
-        }
-    })
-    
-    # Get staff info
-    total_staff = await staff_col.count_documents({
-        "propertyId": property_id,
-        "active": True
-    })
-    
-    available_staff = await staff_col.count_documents({
-        "propertyId": property_id,
-        "active": True,
-        "status": "available"
-    })
+    monthly_revenue_paise = max((stats.get("paidByMonthPaise") or {}).get(today.strftime("%Y-%m"), 0), 0)
+    check_ins_today = max((stats.get("checkInsByDate") or {}).get(today.date().isoformat(), 0), 0)
+
+    pending_count = counter("pendingPayments")
+    pending_amount_paise = counter("pendingAmountPaise")
+
+    total_staff = counter("totalStaff")
+    available_staff = counter("availableStaff")
     
     return {
         "data": {
@@ -173,10 +55,10 @@ async def get_dashboard_stats(request: Request, property_id: str):
             "totalBeds": total_beds,
             "occupiedBeds": occupied_beds,
             "occupancyRate": round(occupancy_rate, 2),
-            "monthlyRevenue": monthly_revenue,
-            "monthlyRevenueFormatted": f"₹{monthly_revenue:,.0f}",
+            "monthlyRevenue": paise_to_rupees(monthly_revenue_paise),
+            "monthlyRevenueFormatted": format_rupees(monthly_revenue_paise),
             "pendingPayments": pending_count,
-            "duePaymentAmountFormatted": f"₹{pending_amount:,.0f}",
+            "duePaymentAmountFormatted": format_rupees(pending_amount_paise),
             "checkInsToday": check_ins_today,
             "totalStaff": total_staff,
             "availableStaff": available_staff,
@@ -2,10 +2,13 @@ from fastapi import APIRouter, status
 from fastapi.responses import JSONResponse
 from app.database.mongodb import db
 from app.config import settings
+from app.middleware.public_paths import public_endpoint
+from app.utils.password_hasher import password_hasher
 
 router = APIRouter()
 
 @router.get("/health", tags=["health"])
+@public_endpoint
 async def health_check():
     try:
         await db.command("ping")
@@ -15,6 +18,7 @@ async def health_check():
 
 
 @router.get("/health/auth-config", tags=["health"])
+@public_endpoint
 async def auth_config_health_check():
     google_client_ids = [client_id.strip() for client_id in settings.GOOGLE_CLIENT_IDS.split(",") if client_id.strip()]
     google_auth_configured = len(google_client_ids) > 0
@@ -28,3 +32,8 @@ async def auth_config_health_check():
             }
         },
     }
+
+
+@router.get("/health/password-hasher", tags=["health"])
+async def password_hasher_health_check():
+    return {"status": "ok", "passwordHasher": password_hasher.metrics()}
@@ -5,6 +5,8 @@ from bson import ObjectId
 from ..models.payment_schema import Payment, PaymentCreate, PaymentUpdate, PaymentMethod
 from ..services.payment_service import PaymentService
 from app.database.mongodb import getCollection
+from app.utils.lookups import lookup_by_object_id
+from app.utils.pagination import DESCENDING, apply_cursor, next_cursor, page_meta, sort_spec
 
 router = APIRouter(prefix="/payments", tags=["payments"])
 payment_service = PaymentService()
@@ -82,9 +84,28 @@ async def get_payment_methods():
     return {"data": methods}
 
 @router.get("/stats", response_model=dict)
-async def payment_stats(request: Request):
-    """Get payment statistics for the user's properties."""
-    return await payment_service.get_payment_stats()
+async def payment_stats(
+    request: Request,
+    propertyId: str = None,
+    startDate: str = None,
+    endDate: str = None,
+):
+    """Get payment statistics for the user's properties, optionally for one property and a due-date window."""
+    property_ids = getattr(request.state, "property_ids", [])
+    user_id = getattr(request.state, "user_id", None)
+
+    if propertyId:
+        if propertyId not in property_ids:
+            raise HTTPException(status_code=403, detail="Forbidden")
+        property_ids = [propertyId]
+
+    try:
+        start = datetime.fromisoformat(startDate.replace('Z', '+00:00')).date().isoformat() if startDate else None
+        end = datetime.fromisoformat(endDate.replace('Z', '+00:00')).date().isoformat() if endDate else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use ISO 8601 (YYYY-MM-DD)")
+
+    return await payment_service.get_payment_stats(property_ids, user_id=user_id, start_date=start, end_date=end)
 
 @router.get("", response_model=dict)
 async def list_payments(
@@ -96,13 +117,32 @@ async def list_payments(
     page_size: int = 50,
     startDate: str = None,
     endDate: str = None,
+    cursor: str = None,
+    withTotal: bool = True,
 ):
     from datetime import datetime
     
     property_ids = getattr(request.state, "property_ids", [])
     
+    page = max(1, page)
+    page_size = min(max(1, page_size), 200)
+    skip = (page - 1) * page_size
+    
+    # No properties means no visible payments (an empty match would return all of them)
+    if not property_ids:
+        return {
+            "data": [],
+            "meta": page_meta(
+                total=0 if withTotal else None,
+                page=page,
+                page_size=page_size,
+                has_more=False,
+                next_page_cursor=None,
+            )
+        }
+    
     # Build match stage
-    match_stage = {"propertyId": {"$in": property_ids}} if property_ids else {}
+    match_stage = {"propertyId": {"$in": property_ids}}
     
     if propertyId:
         if propertyId in property_ids:
@@ -127,112 +167,35 @@ async def list_payments(
         if date_query:
             match_stage["dueDate"] = date_query
 
-    page = max(1, page)
-    page_size = min(max(1, page_size), 200)
-    skip = (page - 1) * page_size
+    try:
+        page_match = apply_cursor(match_stage, "updatedAt", DESCENDING, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    # Get total count
-    count_pipeline = [
-        {"$match": match_stage},
-        {"$count": "total"}
-    ]
-    count_result = await payment_service.collection.aggregate(count_pipeline).to_list(1)
-    total = count_result[0]["total"] if count_result else 0
+    # Get total count (optional, clients paging by cursor can skip it)
+    total = None
+    if withTotal:
+        total = await payment_service.collection.count_documents(match_stage)
     
-    # Single aggregation pipeline replaces all N+1 queries
+    # Single aggregation pipeline replaces all N+1 queries.
+    # Most recently updated first, _id breaking ties. The cursor seek relies
+    # on updatedAt being a date everywhere (migrate_payment_updated_at.py
+    # backfills older payments). One extra document detects the next page.
     pipeline = [
-        {"$match": match_stage},
-        {"$sort": {"updatedAt": -1}},
-        {"$skip": skip},
-        {"$limit": page_size},
-        # Lookup tenant name
-        {
-            "$lookup": {
-                "from": "tenants",
-                "let": {"tenantId": "$tenantId"},
-                "as": "tenant",
-                "pipeline": [
-                    {
-                        "$match": {
-                            "$expr": {
-                                "$eq": [
-                                    {"$toString": "$_id"},
-                                    {"$toString": "$$tenantId"}
-                                ]
-                            }
-                        }
-                    },
-                    {"$project": {"_id": 1, "name": 1, "roomId": 1, "tenantStatus": 1}}
-                ]
-            }
-        },
-        # Lookup bed and room info
-        {
-            "$lookup": {
-                "from": "beds",
-                "let": {"bedId": "$bed"},
-                "as": "bed_info",
-                "pipeline": [
-                    {
-                        "$match": {
-                            "$expr": {
-                                "$eq": [
-                                    {"$toString": "$_id"},
-                                    {"$toString": "$$bedId"}
-                                ]
-                            }
-                        }
-                    },
-                    {
-                        "$lookup": {
-                            "from": "rooms",
-                            "let": {"roomId": "$roomId"},
-                            "as": "room_info",
-                            "pipeline": [
-                                {
-                                    "$match": {
-                                        "$expr": {
-                                            "$eq": [
-                                                {"$toString": "$_id"},
-                                                {"$toString": "$$roomId"}
-                                            ]
-                                        }
-                                    }
-                                },
-                                {"$project": {"roomNumber": 1}}
-                            ]
-                        }
-                    },
-                    {
-                        "$project": {
-                            "_id": 1,
-                            "roomNumber": {"$arrayElemAt": ["$room_info.roomNumber", 0]}
-                        }
-                    }
-                ]
-            }
-        },
+        {"$match": page_match},
+        {"$sort": dict(sort_spec("updatedAt", DESCENDING))},
+    ]
+    if not cursor:
+        pipeline.append({"$skip": skip})
+    pipeline.extend([
+        {"$limit": page_size + 1},
+        # Joins convert the string reference once and hit the _id index
+        *lookup_by_object_id("tenants", "tenantId", "tenant", project={"_id": 1, "name": 1, "roomId": 1, "tenantStatus": 1}),
+        # Bed, then the bed's room
+        *lookup_by_object_id("beds", "bed", "bed_info", project={"_id": 1, "roomId": 1}),
+        *lookup_by_object_id("rooms", {"$arrayElemAt": ["$bed_info.roomId", 0]}, "bed_room_info", project={"roomNumber": 1}),
         # Fallback: resolve room directly from tenant.roomId for older/incomplete payment records
-        {
-            "$lookup": {
-                "from": "rooms",
-                "let": {"tenantRoomId": {"$arrayElemAt": ["$tenant.roomId", 0]}},
-                "as": "tenant_room_info",
-                "pipeline": [
-                    {
-                        "$match": {
-                            "$expr": {
-                                "$eq": [
-                                    {"$toString": "$_id"},
-                                    {"$toString": "$$tenantRoomId"}
-                                ]
-                            }
-                        }
-                    },
-                    {"$project": {"roomNumber": 1}}
-                ]
-            }
-        },
+        *lookup_by_object_id("rooms", {"$arrayElemAt": ["$tenant.roomId", 0]}, "tenant_room_info", project={"roomNumber": 1}),
         # Project final output
         {
             "$project": {
@@ -251,7 +214,7 @@ async def list_payments(
                 "tenantStatus": {"$arrayElemAt": ["$tenant.tenantStatus", 0]},
                 "roomNumber": {
                     "$ifNull": [
-                        {"$arrayElemAt": ["$bed_info.roomNumber", 0]},
+                        {"$arrayElemAt": ["$bed_room_info.roomNumber", 0]},
                         {
                             "$ifNull": [
                                 {"$arrayElemAt": ["$tenant_room_info.roomNumber", 0]},
@@ -262,24 +225,27 @@ async def list_payments(
                 }
             }
         }
-    ]
+    ])
     
-    payments_cursor = await payment_service.collection.aggregate(pipeline).to_list(page_size)
+    payment_docs = await payment_service.collection.aggregate(pipeline).to_list(page_size + 1)
+    has_more = len(payment_docs) > page_size
+    payment_docs = payment_docs[:page_size]
     
     # Convert to Payment objects
     payments = []
-    for p in payments_cursor:
+    for p in payment_docs:
         p["id"] = str(p["_id"])
         payments.append(Payment(**p))
     
     return {
         "data": payments,
-        "meta": {
-            "total": total,
-            "page": page,
-            "pageSize": page_size,
-            "hasMore": (skip + len(payments)) < total
-        }
+        "meta": page_meta(
+            total=total,
+            page=page,
+            page_size=page_size,
+            has_more=has_more,
+            next_page_cursor=next_cursor(payment_docs[-1], "updatedAt") if has_more else None,
+        )
     }
 
 @router.get("/{payment_id}", response_model=Payment)
@@ -344,17 +310,24 @@ async def generate_monthly_payments_manual(request: Request):
     """
     Admin endpoint: Manually trigger monthly payment generation.
     Useful for testing or manual execution outside scheduled time.
-    Requires user authentication.
+    Requires user authentication. Runs under the scheduler's job lock and
+    returns 409 while the job is running elsewhere.
     """
     from app.services.tenant_service import TenantService
+    from app.database.job_locks import JobLocked, run_now
     tenant_service = TenantService()
     
     try:
-        result = await tenant_service.generate_monthly_payments()
+        result = await run_now(
+            "generate_monthly_payments",
+            lambda lease: tenant_service.generate_monthly_payments(fence=lease.check),
+        )
         return {
             "status": "success",
             "message": f"Generated {result['created']} payments, skipped {result['skipped']}",
             "details": result
         }
+    except JobLocked:
+        raise HTTPException(status_code=409, detail="Payment generation is already running")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating payments: {str(e)}")
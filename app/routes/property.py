@@ -1,7 +1,7 @@
 from fastapi import APIRouter, status, Request, HTTPException
 from app.models.property_schema import PropertyCreate, PropertyOut, PropertyUpdate
 from app.services.property_service import PropertyService
-from app.services.subscription_enforcement import SubscriptionEnforcement
+from app.services.subscription_enforcement import EnforcementContext, SubscriptionEnforcement
 
 
 router = APIRouter(prefix="/properties", tags=["properties"])
@@ -12,10 +12,10 @@ async def create_property(request: Request, property: PropertyCreate):
     try:
         user_id = getattr(request.state, "user_id", None)
         
-        # Check subscription quota before creating property
-        await SubscriptionEnforcement.ensure_can_create_property(user_id)
-        
-        return await property_service.create_property(property.model_dump(exclude_unset=True), user_id)
+        # Reserve subscription quota for the property; released if creation fails
+        context = await EnforcementContext.from_request(request)
+        async with SubscriptionEnforcement.reserve("properties", user_id, context=context) as reservation:
+            return await property_service.create_property(property.model_dump(exclude_unset=True), user_id, quota_reserved=reservation)
     except HTTPException:
         raise
     except Exception as e:
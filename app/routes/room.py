@@ -1,14 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from app.services.room_service import RoomService
-from app.services.subscription_enforcement import SubscriptionEnforcement
+from app.services.subscription_enforcement import EnforcementContext, SubscriptionEnforcement
 from app.models.room_schema import Room
 from app.database.mongodb import db
+from app.utils.pagination import ASCENDING, apply_cursor, next_cursor, page_meta, sort_spec
 
 router = APIRouter(prefix="/rooms", tags=["rooms"])
 room_service = RoomService()
 
 @router.get("/")
-async def get_rooms(request: Request, property_id: str = None, search: str = None, page: int = 1, page_size: int = 50):
+async def get_rooms(request: Request, property_id: str = None, search: str = None, page: int = 1, page_size: int = 50, cursor: str = None, withTotal: bool = True):
     property_ids = getattr(request.state, "property_ids", [])
     query = {"propertyId": {"$in": property_ids}}
     if property_id:
@@ -23,8 +24,19 @@ async def get_rooms(request: Request, property_id: str = None, search: str = Non
     page_size = min(100, max(1, page_size))  # Cap at 100 per page
     skip = (page - 1) * page_size
     
-    total = await room_service.collection.count_documents(query)
-    rooms = await room_service.collection.find(query).skip(skip).limit(page_size).to_list(length=page_size)
+    try:
+        page_query = apply_cursor(query, "_id", ASCENDING, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    total = await room_service.collection.count_documents(query) if withTotal else None
+    find_cursor = room_service.collection.find(page_query).sort(sort_spec("_id", ASCENDING))
+    if not cursor:
+        find_cursor = find_cursor.skip(skip)
+    rooms = await find_cursor.limit(page_size + 1).to_list(length=page_size + 1)
+    has_more = len(rooms) > page_size
+    rooms = rooms[:page_size]
+    next_page_cursor = next_cursor(rooms[-1], "_id") if has_more else None
     
     for doc in rooms:
         doc["id"] = str(doc["_id"])
@@ -33,12 +45,13 @@ async def get_rooms(request: Request, property_id: str = None, search: str = Non
     
     return {
         "data": rooms,
-        "meta": {
-            "total": total,
-            "page": page,
-            "pageSize": page_size,
-            "hasMore": skip + page_size < total
-        }
+        "meta": page_meta(
+            total=total,
+            page=page,
+            page_size=page_size,
+            has_more=has_more,
+            next_page_cursor=next_page_cursor,
+        )
     }
 
 @router.get("/{room_id}")
@@ -67,10 +80,10 @@ async def create_room(request: Request, room: Room):
         if room.propertyId not in property_ids:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden: Property not accessible by user.")
         
-        # Check subscription quota before creating room (30 rooms per property)
-        await SubscriptionEnforcement.ensure_can_create_room(user_id, room.propertyId)
-        
-        created = await room_service.create_room(room.model_dump())
+        # Reserve subscription quota for the room; released if creation fails
+        context = await EnforcementContext.from_request(request)
+        async with SubscriptionEnforcement.reserve("rooms", user_id, room.propertyId, context=context) as reservation:
+            created = await room_service.create_room(room.model_dump(), quota_reserved=reservation)
         return {"data": created.model_dump()}
     except HTTPException:
         raise
@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException, status, Request
 from app.services.staff_service import StaffService
-from app.services.subscription_enforcement import SubscriptionEnforcement
+from app.services.subscription_enforcement import EnforcementContext, SubscriptionEnforcement
 from app.models.staff_schema import StaffCreate, StaffUpdate
+from app.utils.pagination import page_meta
 
 router = APIRouter(prefix="/staff", tags=["staff"])
 staff_service = StaffService()
@@ -15,19 +16,26 @@ async def get_staff(
     role: str = None,
     page: int = 1,
     page_size: int = 50,
+    cursor: str = None,
+    withTotal: bool = True,
 ):
     """Get list of staff members"""
     page = max(1, page)
     page_size = min(100, max(1, page_size))
     skip = (page - 1) * page_size
 
-    staff_list, total = await staff_service.get_staff_list(
-        property_id=property_id,
-        search=search,
-        role=role,
-        skip=skip,
-        limit=page_size,
-    )
+    try:
+        staff_list, total, next_page_cursor = await staff_service.get_staff_list(
+            property_id=property_id,
+            search=search,
+            role=role,
+            skip=skip,
+            limit=page_size,
+            cursor=cursor,
+            with_total=withTotal,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     property_ids = getattr(request.state, "property_ids", [])
     filtered = (
@@ -38,12 +46,13 @@ async def get_staff(
 
     return {
         "data": [staff.model_dump(exclude_none=True) for staff in filtered],
-        "meta": {
-            "total": total,
-            "page": page,
-            "pageSize": page_size,
-            "hasMore": skip + page_size < total,
-        },
+        "meta": page_meta(
+            total=total,
+            page=page,
+            page_size=page_size,
+            has_more=next_page_cursor is not None,
+            next_page_cursor=next_page_cursor,
+        ),
     }
 
 
@@ -72,13 +81,13 @@ async def create_staff(request: Request, staff: StaffCreate):
         if staff.propertyId not in property_ids:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
 
-        # Check subscription quota before creating staff
+        # Reserve subscription quota for the staff member; released if creation fails
         user_id = getattr(request.state, "user_id", None)
-        await SubscriptionEnforcement.ensure_can_create_staff(user_id, staff.propertyId)
-
-        created = await staff_service.create_staff(
-            staff.model_dump(exclude_unset=True)
-        )
+        context = await EnforcementContext.from_request(request)
+        async with SubscriptionEnforcement.reserve("staff", user_id, staff.propertyId, context=context) as reservation:
+            created = await staff_service.create_staff(
+                staff.model_dump(exclude_unset=True), quota_reserved=reservation
+            )
         return {"data": created.model_dump()}
     except HTTPException:
         raise
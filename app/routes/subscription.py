@@ -6,6 +6,8 @@ from app.services.subscription_enforcement import SubscriptionEnforcement
 from app.services.subscription_lifecycle import SubscriptionLifecycle
 from app.services.razorpay_service import RazorpayService
 from app.services.coupon_service import CouponService
+from app.middleware.public_paths import public_endpoint
+from app.config import settings
 
 router = APIRouter(prefix="/subscription", tags=["subscription"])
 
@@ -23,6 +25,7 @@ async def get_subscription(user_id: str = Depends(get_current_user)):
 
 
 @router.get("/plans")
+@public_endpoint
 async def get_all_plans():
     """Get all available subscription plans with their pricing tiers"""
     try:
@@ -63,6 +66,7 @@ async def get_quota_warnings(user_id: str = Depends(get_current_user)):
 
 
 @router.get("/limits/{plan}")
+@public_endpoint
 async def get_limits(plan: str):
     try:
         limits = await SubscriptionService.get_plan_limits(plan)
@@ -170,7 +174,7 @@ async def create_checkout_session(
                 "discountAmount": discount_amount,
                 "couponCode": coupon_code if coupon_code else None,
                 "currency": order_doc.currency,
-                "keyId": RazorpayService.client.auth[0]
+                "keyId": settings.RAZORPAY_KEY_ID
             }
         }
     except HTTPException:
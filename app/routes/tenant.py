@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException, status, Request
 from app.services.tenant_service import TenantService
-from app.services.subscription_enforcement import SubscriptionEnforcement
+from app.services.subscription_enforcement import EnforcementContext, SubscriptionEnforcement
 from app.models.tenant_schema import TenantCreate, TenantUpdate
+from app.utils.pagination import page_meta
 
 router = APIRouter(prefix="/tenants", tags=["tenants"])
 tenant_service = TenantService()
@@ -13,32 +14,40 @@ async def get_tenants(
     search: str = None,
     status: str = None,
     page: int = 1,
-    page_size: int = 50
+    page_size: int = 50,
+    cursor: str = None,
+    withTotal: bool = True,
 ):
     page = max(1, page)
     page_size = min(100, max(1, page_size))  # Cap at 100 per page
     skip = (page - 1) * page_size
     
-    tenants, total = await tenant_service.get_tenants(
-        property_id=property_id,
-        search=search,
-        status=status,
-        skip=skip,
-        limit=page_size,
-        include_room_bed=True  # Enrich with room/bed data
-    )
+    try:
+        tenants, total, has_more, next_page_cursor = await tenant_service.get_tenants(
+            property_id=property_id,
+            search=search,
+            status=status,
+            skip=skip,
+            limit=page_size,
+            include_room_bed=True,  # Enrich with room/bed data
+            cursor=cursor,
+            with_total=withTotal,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     property_ids = getattr(request.state, "property_ids", [])
     filtered = [t for t in tenants if t.propertyId and t.propertyId in property_ids]
     
     return {
         "data": [tenant.model_dump(exclude_none=True) for tenant in filtered],
-        "meta": {
-            "total": total,
-            "page": page,
-            "pageSize": page_size,
-            "hasMore": skip + page_size < total
-        }
+        "meta": page_meta(
+            total=total,
+            page=page,
+            page_size=page_size,
+            has_more=has_more,
+            next_page_cursor=next_page_cursor,
+        )
     }
 
 @router.get("/{tenant_id}")
@@ -58,11 +67,11 @@ async def create_tenant(request: Request, tenant: TenantCreate):
         if tenant.propertyId not in property_ids:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
         
-        # Check subscription quota before creating tenant
+        # Reserve subscription quota for the tenant; released if creation fails
         user_id = getattr(request.state, "user_id", None)
-        await SubscriptionEnforcement.ensure_can_create_tenant(user_id, tenant.propertyId)
-        
-        created = await tenant_service.create_tenant(tenant.model_dump(exclude_unset=True))
+        context = await EnforcementContext.from_request(request)
+        async with SubscriptionEnforcement.reserve("tenants", user_id, tenant.propertyId, context=context) as reservation:
+            created = await tenant_service.create_tenant(tenant.model_dump(exclude_unset=True), quota_reserved=reservation)
         return {"data": created.model_dump()}
     except ValueError as e:
         # Handle validation errors (like bed already occupied)
@@ -13,13 +13,12 @@ from app.database.mongodb import db
 from app.database.token_blacklist import blacklist_token, is_token_blacklisted
 from app.config import settings
 from app.utils.helpers import (
-    hash_password,
-    verify_password,
     create_access_token,
     create_refresh_token,
     SECRET_KEY,
     ALGORITHM,
 )
+from app.utils.password_hasher import password_hasher
 from app.utils.attempt_tracking import (
     check_login_attempts,
     increment_login_attempts,
@@ -29,7 +28,7 @@ from app.utils.attempt_tracking import (
     reset_otp_attempts,
     delete_otp_attempts,
 )
-from app.utils.email_service import send_otp_email
+from app.utils.email_outbox import queue_email
 from app.utils.otp_memory_store import (
     generate_and_store_otp,
     get_otp,
@@ -39,6 +38,7 @@ from app.utils.otp_memory_store import (
     delete_otp,
 )
 from app.models.user_schema import UserCreate, UserLogin, UserOut
+from app.utils.auth_context import invalidate_auth_context
 import re
 
 users_collection = db["users"]
@@ -156,7 +156,7 @@ async def register_user_service(user: UserCreate):
         "name": user.name,
         "email": normalized_email,
         "phone": user.phone,
-        "password": hash_password(user.password),
+        "password": await password_hasher.hash(user.password),
         "role": "propertyowner",
         "isVerified": True,
         "isEmailVerified": True,
@@ -206,7 +206,10 @@ async def login_user_service(data: UserLogin):
     
     # SECURITY: Verify password AND check user existence together
     # This prevents timing attacks that could reveal if email exists
-    if not user or not verify_password(data.password, user.get("password", "")):
+    password_valid, upgraded_hash = False, None
+    if user:
+        password_valid, upgraded_hash = await password_hasher.verify_and_update(data.password, user.get("password", ""))
+    if not password_valid:
         failed_count = await increment_login_attempts(normalized_email)
         remaining_attempts = 5 - failed_count
         
@@ -248,11 +251,14 @@ async def login_user_service(data: UserLogin):
     # SECURITY: Reset attempts on successful login
     await reset_login_attempts(normalized_email)
 
-    # Update last login timestamp
+    # Update last login timestamp, replacing the hash if its parameters are outdated
     now = datetime.now(timezone.utc)
+    login_update = {"lastLogin": now, "updatedAt": now}
+    if upgraded_hash:
+        login_update["password"] = upgraded_hash
     await users_collection.update_one(
         {"_id": user["_id"]},
-        {"$set": {"lastLogin": now, "updatedAt": now}},
+        {"$set": login_update},
     )
 
     user_id = str(user["_id"])
@@ -281,7 +287,7 @@ async def google_sign_in_service(payload):
         user_doc = {
             "name": name,
             "email": email,
-            "password": hash_password(f"google-{random.randint(100000, 999999)}"),
+            "password": await password_hasher.hash(f"google-{random.randint(100000, 999999)}"),
             "role": "propertyowner",
             "isVerified": True,
             "isDeleted": False,
@@ -370,12 +376,12 @@ async def send_email_otp_service(email: str):
     # Generate OTP and store in memory
     otp, is_new = await generate_and_store_otp(normalized_email, "registration")
     
-    # Send OTP via Zoho Zepto Mail
-    email_sent = await send_otp_email(normalized_email, otp)
+    # Queue the OTP email; outbox workers deliver it via Zoho Zepto Mail
+    email_queued = await queue_email("otp", normalized_email, {"otp": otp})
     
-    if not email_sent:
+    if not email_queued:
         # Log warning but don't fail the request - OTP is stored in memory
-        print(f"[WARNING] Failed to send OTP email to {normalized_email}, but OTP stored in memory: {otp}")
+        print(f"[WARNING] Zepto Mail not configured, OTP email not queued for {normalized_email}, but OTP stored in memory: {otp}")
 
     return JSONResponse(
         status_code=status.HTTP_200_OK,
@@ -537,12 +543,12 @@ async def forgot_password_service(email: str):
     # Generate OTP and store in memory with type password_reset
     otp, is_new = await generate_and_store_otp(normalized_email, "password_reset")
 
-    # Send OTP via Zoho Zepto Mail
-    email_sent = await send_otp_email(normalized_email, otp, app_name="Hostel Manager")
+    # Queue the OTP email; outbox workers deliver it via Zoho Zepto Mail
+    email_queued = await queue_email("otp", normalized_email, {"otp": otp, "app_name": "Hostel Manager"})
     
-    if not email_sent:
+    if not email_queued:
         # Log warning but don't fail the request - OTP is stored in memory
-        print(f"[WARNING] Failed to send password reset OTP email to {normalized_email}, but OTP stored in memory: {otp}")
+        print(f"[WARNING] Zepto Mail not configured, password reset OTP email not queued for {normalized_email}, but OTP stored in memory: {otp}")
 
     return JSONResponse(
         status_code=status.HTTP_200_OK,
@@ -591,7 +597,7 @@ async def reset_password_service(email: str, otp: str, new_password: str):
         )
 
     # Update user password
-    hashed_password = hash_password(new_password)
+    hashed_password = await password_hasher.hash(new_password)
     await users_collection.update_one(
         {"_id": user["_id"]},
         {
@@ -602,6 +608,9 @@ async def reset_password_service(email: str, otp: str, new_password: str):
         }
     )
 
+    # Drop any cached auth context for this user
+    invalidate_auth_context(str(user["_id"]))
+
     # Delete the OTP from memory after successful reset
     await delete_otp(normalized_email)
 
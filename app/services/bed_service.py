@@ -2,8 +2,30 @@
 import uuid
 from datetime import datetime, timezone
 from typing import List, Optional
+from bson import ObjectId
+from pymongo import ReturnDocument
 from app.database.mongodb import db
-from app.models.bed_schema import BedCreate, BedUpdate, BedOut
+from app.models.bed_schema import BedClaimResult, BedClaimStatus, BedCreate, BedOut, BedStatus, BedUpdate
+from app.services.property_stats_service import PropertyStatsService
+
+property_stats_service = PropertyStatsService()
+
+
+def _bed_filter(bed_id: str) -> dict:
+    """
+    Beds are addressed by their ObjectId hex string; older records may still
+    be referenced by the uuid kept in their `id` field.
+    """
+    if ObjectId.is_valid(bed_id):
+        return {"_id": ObjectId(bed_id)}
+    return {"id": bed_id}
+
+
+def _bed_out(doc: dict, id_filter: dict) -> BedOut:
+    # Beds looked up by _id are exposed under it; legacy ones keep their uuid
+    if "_id" in id_filter:
+        doc["id"] = str(doc["_id"])
+    return BedOut(**doc)
 
 class BedService:
     def __init__(self):
@@ -16,57 +38,115 @@ class BedService:
         doc["updatedAt"] = now
         doc["id"] = str(uuid.uuid4())
         await self.db["beds"].insert_one(doc)
+        await property_stats_service.record_change("beds", after=doc)
         return BedOut(**doc)
 
+    async def create_beds_bulk(
+        self,
+        property_id: str,
+        room_id: str,
+        bed_numbers: List[str],
+        status: str = "available",
+    ) -> List[BedOut]:
+        """Create several beds of one room with a single insert_many"""
+        if not bed_numbers:
+            return []
+        now = datetime.now(timezone.utc).isoformat()
+        # Every bed shares the same fields apart from its number, so validate once
+        template = BedCreate(propertyId=property_id, roomId=room_id, bedNumber=str(bed_numbers[0]), status=status).model_dump()
+        template["createdAt"] = now
+        template["updatedAt"] = now
+        docs = [
+            {**template, "bedNumber": str(bed_number), "id": str(uuid.uuid4())}
+            for bed_number in bed_numbers
+        ]
+        await self.db["beds"].insert_many(docs)
+        await property_stats_service.record_inserted("beds", docs)
+        return [BedOut(**doc) for doc in docs]
+
     async def get_bed(self, bed_id: str) -> Optional[BedOut]:
-        from bson import ObjectId
-        try:
-            doc = await self.db["beds"].find_one({"_id": ObjectId(bed_id)})
-            if doc:
-                doc["id"] = str(doc["_id"])
-                return BedOut(**doc)
-        except:
-            # If ObjectId conversion fails, try looking by id field
-            doc = await self.db["beds"].find_one({"id": bed_id})
-            if doc:
-                return BedOut(**doc)
+        id_filter = _bed_filter(bed_id)
+        doc = await self.db["beds"].find_one(id_filter)
+        if doc:
+            return _bed_out(doc, id_filter)
         return None
 
     async def update_bed(self, bed_id: str, bed_update: BedUpdate) -> Optional[BedOut]:
-        from bson import ObjectId
         update_data = {k: v for k, v in bed_update.model_dump(exclude_unset=True).items()}
         if not update_data:
             return await self.get_bed(bed_id)
         update_data["updatedAt"] = datetime.now(timezone.utc).isoformat()
-        try:
-            result = await self.db["beds"].find_one_and_update(
-                {"_id": ObjectId(bed_id)},
-                {"$set": update_data},
-                return_document=True
-            )
-            if result:
-                result["id"] = str(result["_id"])
-                return BedOut(**result)
-        except:
-            # If ObjectId conversion fails, try by id field
-            result = await self.db["beds"].find_one_and_update(
-                {"id": bed_id},
-                {"$set": update_data},
-                return_document=True
-            )
-            if result:
-                return BedOut(**result)
-        return None
+        # Fetch the pre-image in the same round trip so stats deltas are exact
+        id_filter = _bed_filter(bed_id)
+        before = await self.db["beds"].find_one_and_update(
+            id_filter,
+            {"$set": update_data},
+            return_document=ReturnDocument.BEFORE
+        )
+        if not before:
+            return None
+        result = {**before, **update_data}
+        await property_stats_service.record_change("beds", before, result)
+        return _bed_out(result, id_filter)
+
+    async def _conditional_bed_write(
+        self, bed_id: str, expected: dict, update: dict, success: BedClaimStatus, session=None
+    ) -> BedClaimResult:
+        id_filter = _bed_filter(bed_id)
+        update["updatedAt"] = datetime.now(timezone.utc).isoformat()
+        before = await self.db["beds"].find_one_and_update(
+            {**id_filter, **expected},
+            {"$set": update},
+            return_document=ReturnDocument.BEFORE,
+            session=session,
+        )
+        if before:
+            return BedClaimResult(status=success, bedId=bed_id, before=before)
+
+        # Refused: report why (only costs a read on the conflict path)
+        current = await self.db["beds"].find_one(id_filter, {"status": 1, "tenantId": 1}, session=session)
+        if not current:
+            return BedClaimResult(status=BedClaimStatus.NOT_FOUND, bedId=bed_id)
+        return BedClaimResult(
+            status=BedClaimStatus.CONFLICT,
+            bedId=bed_id,
+            currentStatus=current.get("status"),
+            currentTenantId=current.get("tenantId"),
+        )
+
+    async def claim_bed(self, bed_id: str, tenant_id: str, session=None) -> BedClaimResult:
+        """
+        Occupy a bed for `tenant_id` if it is available (or already theirs).
+
+        The availability check and the write are one conditional
+        find_one_and_update, so two check-ins cannot both get the bed. Stats
+        are left to the caller, which records them from `result.before` once
+        the surrounding transaction has committed.
+        """
+        return await self._conditional_bed_write(
+            bed_id,
+            {"$or": [{"status": BedStatus.AVAILABLE.value}, {"status": BedStatus.OCCUPIED.value, "tenantId": tenant_id}]},
+            {"status": BedStatus.OCCUPIED.value, "tenantId": tenant_id},
+            BedClaimStatus.CLAIMED,
+            session=session,
+        )
+
+    async def release_bed(self, bed_id: str, tenant_id: str, session=None) -> BedClaimResult:
+        """Free a bed, but only while `tenant_id` still holds it"""
+        return await self._conditional_bed_write(
+            bed_id,
+            {"tenantId": tenant_id},
+            {"status": BedStatus.AVAILABLE.value, "tenantId": None},
+            BedClaimStatus.RELEASED,
+            session=session,
+        )
 
     async def delete_bed(self, bed_id: str) -> bool:
-        from bson import ObjectId
-        try:
-            result = await self.db["beds"].delete_one({"_id": ObjectId(bed_id)})
-            return result.deleted_count == 1
-        except:
-            # If ObjectId conversion fails, try by id field
-            result = await self.db["beds"].delete_one({"id": bed_id})
-            return result.deleted_count == 1
+        deleted = await self.db["beds"].find_one_and_delete(_bed_filter(bed_id))
+        if not deleted:
+            return False
+        await property_stats_service.record_change("beds", before=deleted)
+        return True
 
     async def get_available_beds_with_rooms(self, property_id: str) -> List[dict]:
         """Get all available beds for a property, grouped by rooms with room information"""
@@ -85,15 +165,8 @@ class BedService:
         # Get unique room IDs
         room_ids = list(set(bed["roomId"] for bed in beds))
         
-        # Convert room IDs (hex strings) back to ObjectId for querying
-        from bson import ObjectId
-        object_ids = []
-        for room_id in room_ids:
-            try:
-                object_ids.append(ObjectId(room_id))
-            except:
-                # If conversion fails, skip this room ID
-                pass
+        # Convert room IDs (hex strings) back to ObjectId for querying, skipping invalid ones
+        object_ids = [ObjectId(room_id) for room_id in room_ids if ObjectId.is_valid(room_id)]
         
         if not object_ids:
             return []
@@ -157,15 +230,8 @@ class BedService:
         # Get unique room IDs
         room_ids = list(set(bed["roomId"] for bed in beds))
         
-        # Convert room IDs (hex strings) back to ObjectId for querying
-        from bson import ObjectId
-        object_ids = []
-        for room_id in room_ids:
-            try:
-                object_ids.append(ObjectId(room_id))
-            except:
-                # If conversion fails, skip this room ID
-                pass
+        # Convert room IDs (hex strings) back to ObjectId for querying, skipping invalid ones
+        object_ids = [ObjectId(room_id) for room_id in room_ids if ObjectId.is_valid(room_id)]
         
         if not object_ids:
             return []
@@ -0,0 +1,150 @@
+"""
+Per-owner resource counters for quotas that are not tied to one property.
+
+One document per owner in `owner_usage` (_id = owner id) holds the number
+of properties the owner has. It is seeded from the properties collection
+the first time it is needed.
+
+Property creation first reserves a slot: a conditional $inc of `reserved`
+that only succeeds while properties + reserved is below the plan limit.
+The insert then turns the reservation into a counted property, and a
+failed insert gives it back. Reservations are kept apart from the count,
+so reseed() can recount `properties` from the source of truth without
+losing slots that are in flight. reseed() only writes if `seq` (bumped by
+every counter change) did not move while it counted. Like the property
+counters, a property inserted just before the count whose $inc lands just
+after reseed() is counted twice, so a refusal is confirmed with a fresh
+reseed() first.
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from app.database.mongodb import getCollection
+from app.services.property_stats_service import REBUILD_ATTEMPTS, RESERVATION_TTL_SECONDS, RESERVE_ATTEMPTS
+from app.utils.ownership import build_owner_query
+
+logger = logging.getLogger(__name__)
+
+USAGE_COLLECTION = "owner_usage"
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class OwnerUsageService:
+    def __init__(self):
+        self.collection = getCollection(USAGE_COLLECTION)
+
+    async def _count(self, owner_id: str) -> int:
+        return await getCollection("properties").count_documents(build_owner_query(owner_id))
+
+    async def _seed(self, owner_id: str):
+        count = await self._count(owner_id)
+        try:
+            await self.collection.update_one(
+                {"_id": owner_id},
+                {"$setOnInsert": {"properties": count, "reserved": 0, "seq": 0, "seededAt": _now()}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # A concurrent request seeded it first
+            pass
+
+    async def reserve_property(self, owner_id: str, limit: int) -> bool:
+        """Take one property slot if the owner's properties plus reservations are below `limit`"""
+        recounted = False
+        for _ in range(RESERVE_ATTEMPTS):
+            result = await self.collection.update_one(
+                {
+                    "_id": owner_id,
+                    "$expr": {"$lt": [
+                        {"$add": [{"$ifNull": ["$properties", 0]}, {"$ifNull": ["$reserved", 0]}]},
+                        limit,
+                    ]},
+                },
+                {"$inc": {"reserved": 1}, "$set": {"reservedAt": _now()}},
+            )
+            if result.modified_count:
+                return True
+            doc = await self.collection.find_one({"_id": owner_id}, {"properties": 1, "reserved": 1})
+            if doc is not None:
+                if doc.get("properties", 0) + doc.get("reserved", 0) >= limit:
+                    if recounted:
+                        return False
+                    # The count may be high after a racing reseed; confirm before refusing
+                    recounted = True
+                    await self.reseed(owner_id)
+                continue
+            await self._seed(owner_id)
+        logger.warning(f"Could not reserve a property slot for {owner_id} after {RESERVE_ATTEMPTS} attempts")
+        return False
+
+    async def release_reservation(self, owner_id: str):
+        """Give back a slot whose property was never created"""
+        await self.collection.update_one(
+            {"_id": owner_id, "reserved": {"$gt": 0}},
+            {"$inc": {"reserved": -1}},
+        )
+
+    async def record_property_created(self, owner_id: str, reserved: bool = False):
+        """
+        Count a new property (no-op until the owner is seeded). With
+        reserved=True the slot taken by reserve_property() becomes the count.
+        """
+        inc = {"properties": 1, "seq": 1}
+        if reserved:
+            inc["reserved"] = -1
+        await self.collection.update_one({"_id": owner_id}, {"$inc": inc})
+
+    async def release_property(self, owner_ids: Iterable[str]):
+        """Uncount a deleted property for each of its owners"""
+        owner_ids = [owner_id for owner_id in owner_ids if owner_id]
+        if owner_ids:
+            await self.collection.update_many(
+                {"_id": {"$in": owner_ids}, "properties": {"$gt": 0}},
+                {"$inc": {"properties": -1, "seq": 1}},
+            )
+
+    async def reseed(self, owner_id: str) -> Optional[int]:
+        """
+        Recount an owner's properties, keeping reservations. Returns the new
+        count, or None when the owner has no counter yet or it kept changing.
+        """
+        for _ in range(REBUILD_ATTEMPTS):
+            current = await self.collection.find_one({"_id": owner_id}, {"seq": 1})
+            if current is None:
+                return None
+            count = await self._count(owner_id)
+            result = await self.collection.update_one(
+                {"_id": owner_id, "seq": current.get("seq")},
+                {"$set": {"properties": count, "seededAt": _now()}, "$inc": {"seq": 1}},
+            )
+            if result.matched_count:
+                return count
+        logger.warning(f"Property usage of {owner_id} kept changing during reseed; left as is")
+        return None
+
+    async def reconcile_all(self, fence=None) -> dict:
+        """
+        Recount every seeded owner and drop reservations abandoned by a
+        crashed request. `fence` (the job lease's check) is awaited before
+        each owner.
+        """
+        result = {"reseeded": 0, "staleReservations": 0}
+        async for doc in self.collection.find({}, {"_id": 1}):
+            if fence:
+                await fence()
+            if await self.reseed(doc["_id"]) is not None:
+                result["reseeded"] += 1
+
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=RESERVATION_TTL_SECONDS)).isoformat()
+        stale = await self.collection.update_many(
+            {"reserved": {"$ne": 0}, "reservedAt": {"$lt": cutoff}},
+            {"$set": {"reserved": 0}},
+        )
+        result["staleReservations"] = stale.modified_count
+        return result
@@ -0,0 +1,362 @@
+"""
+Sharded monthly payment generation (the daily generate_monthly_payments job).
+
+Auto-billing tenants are partitioned by propertyId and the shards are
+processed by PAYMENT_GENERATION_WORKERS concurrent workers. Payments are
+written as unordered bulk upserts keyed on the unique (tenantId, dueDate)
+index, so a payment that already exists is a no-op instead of failing its
+batch.
+
+Tenants carry a precomputed `nextDueDate` (ISO date) maintained by
+TenantService and by this job, so a run only reads tenants whose next payment
+falls within BILLING_HORIZON_DAYS, plus tenants not scheduled yet
+(nextDueDate null). Writing a payment advances the tenant's nextDueDate by a
+month. Tenants the job cannot bill (checked out, invalid billing config) get
+the NOT_SCHEDULED sentinel, which sorts after every horizon, so they are not
+re-read every day; TenantService re-derives the date when they change.
+
+Each run is recorded in `job_runs` under "<job>:<date>". Finished shards and
+the last tenant of every successfully written batch are checkpointed there,
+so re-running the job on the same day after a crash or a failed batch resumes
+where the last good write stopped.
+"""
+import asyncio
+import logging
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+from dateutil.relativedelta import relativedelta
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.config import settings
+from app.database.job_locks import LeaseLost
+from app.database.mongodb import getCollection
+from app.models.payment_schema import PaymentMethod
+from app.models.tenant_schema import BillingCycle, BillingStatus
+from app.services.property_stats_service import PropertyStatsService
+from app.utils.money import to_paise
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = "generate_monthly_payments"
+DUPLICATE_KEY_ERROR = 11000
+# nextDueDate of tenants the job cannot bill; later than any horizon
+NOT_SCHEDULED = "9999-12-31"
+
+property_stats_service = PropertyStatsService()
+
+TENANT_PROJECTION = {
+    "propertyId": 1,
+    "bedId": 1,
+    "rent": 1,
+    "rentPaise": 1,
+    "billingConfig": 1,
+    "checkoutDate": 1,
+    "nextDueDate": 1,
+}
+
+
+def monthly_due_date(anchor_day: int, today: date) -> date:
+    """anchorDay of this month, or of next month once it has passed"""
+    # relativedelta clamps short months (e.g. day 31 in February -> 28/29)
+    due_date = today + relativedelta(day=anchor_day)
+    if due_date < today:
+        due_date = due_date + relativedelta(months=1, day=anchor_day)
+    return due_date
+
+
+def next_due_after(due_date: date, anchor_day: int) -> date:
+    """The due date one billing month after `due_date`"""
+    return due_date + relativedelta(months=1, day=anchor_day)
+
+
+def _valid_billing_config(billing_config) -> bool:
+    # Same constraints as the BillingConfig model, without building one per tenant
+    if not isinstance(billing_config, dict):
+        return False
+    anchor_day = billing_config.get("anchorDay", 1)
+    return (
+        billing_config.get("status") in (BillingStatus.PAID.value, BillingStatus.DUE.value)
+        and isinstance(anchor_day, int)
+        and 1 <= anchor_day <= 31
+    )
+
+
+def billing_anchor_day(tenant: dict) -> Optional[int]:
+    """anchorDay when the generator bills this tenant monthly, otherwise None"""
+    billing_config = tenant.get("billingConfig")
+    if hasattr(billing_config, "model_dump"):
+        billing_config = billing_config.model_dump()
+    if (
+        tenant.get("autoGeneratePayments") is not True
+        or not _valid_billing_config(billing_config)
+        or billing_config.get("billingCycle") != BillingCycle.MONTHLY.value
+    ):
+        return None
+    return billing_config.get("anchorDay", 1)
+
+
+def initial_next_due_date(tenant: dict, today: Optional[date] = None) -> Optional[str]:
+    """Upcoming due date for a tenant whose schedule is (re)set, or None if not billed"""
+    anchor_day = billing_anchor_day(tenant)
+    if anchor_day is None:
+        return None
+    return monthly_due_date(anchor_day, today or datetime.now(timezone.utc).date()).isoformat()
+
+
+async def _no_fence():
+    pass
+
+
+class PaymentGenerationJob:
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        fence: Optional[Callable[[], Awaitable[None]]] = None,
+    ):
+        # `fence` (the job lease's check) raises LeaseLost once the lock is lost;
+        # it is awaited before every batch is written
+        self.fence = fence or _no_fence
+        self.workers = max(1, workers or settings.PAYMENT_GENERATION_WORKERS)
+        self.batch_size = max(1, batch_size or settings.PAYMENT_GENERATION_BATCH_SIZE)
+        self.tenants = getCollection("tenants")
+        self.payments = getCollection("payments")
+        self.job_runs = getCollection("job_runs")
+
+    def _tenant_filter(self, horizon: date) -> dict:
+        return {
+            "autoGeneratePayments": True,
+            "billingConfig": {"$exists": True},
+            "billingConfig.billingCycle": BillingCycle.MONTHLY.value,
+            "$or": [
+                {"nextDueDate": {"$lte": horizon.isoformat()}},
+                {"nextDueDate": None},
+            ],
+        }
+
+    def _plan_tenant(self, tenant_doc: dict, today: date, horizon: date, now: datetime) -> tuple[Optional[dict], Optional[str]]:
+        """
+        (payment to write or None, nextDueDate to store) for one tenant.
+        No payment is written for skipped tenants or ones not due within the horizon.
+        """
+        billing_config = tenant_doc.get("billingConfig")
+        if not _valid_billing_config(billing_config):
+            return None, NOT_SCHEDULED
+
+        # Skip if tenant has checked out
+        checkout_date_str = tenant_doc.get("checkoutDate")
+        if checkout_date_str:
+            try:
+                checkout_date = datetime.fromisoformat(checkout_date_str).date()
+            except (TypeError, ValueError):
+                return None, NOT_SCHEDULED
+            if today > checkout_date:
+                return None, NOT_SCHEDULED
+
+        anchor_day = billing_config.get("anchorDay", 1)
+        due_date = None
+        if tenant_doc.get("nextDueDate"):
+            try:
+                due_date = date.fromisoformat(tenant_doc["nextDueDate"])
+            except (TypeError, ValueError):
+                pass
+        if due_date is None:
+            due_date = monthly_due_date(anchor_day, today)
+        if due_date > horizon:
+            # Not due yet: only record the schedule
+            return None, due_date.isoformat()
+
+        payment = {
+            "tenantId": str(tenant_doc["_id"]),
+            "propertyId": tenant_doc.get("propertyId"),
+            "bed": tenant_doc.get("bedId", ""),
+            "amount": tenant_doc.get("rent", "0"),  # Keep as string
+            "amountPaise": tenant_doc.get("rentPaise", to_paise(tenant_doc.get("rent"))),
+            "status": billing_config["status"],
+            "dueDate": due_date.isoformat(),
+            "method": billing_config.get("method") or PaymentMethod.CASH.value,
+            "createdAt": now,
+            "updatedAt": now,
+        }
+        return payment, next_due_after(due_date, anchor_day).isoformat()
+
+    async def _write_batch(self, payments: list[dict]) -> int:
+        """Upsert a batch; returns how many payments were actually created"""
+        operations = [
+            UpdateOne(
+                {"tenantId": payment["tenantId"], "dueDate": payment["dueDate"]},
+                {"$setOnInsert": payment},
+                upsert=True,
+            )
+            for payment in payments
+        ]
+        try:
+            result = await self.payments.bulk_write(operations, ordered=False)
+            upserted = result.upserted_ids.keys()
+        except BulkWriteError as bulk_error:
+            # Two upserts racing on the unique index: the loser's payment exists already
+            details = bulk_error.details
+            if any(err.get("code") != DUPLICATE_KEY_ERROR for err in details.get("writeErrors", [])):
+                raise
+            upserted = {item["index"] for item in details.get("upserted", [])}
+
+        created = [payments[i] for i in upserted]
+        await property_stats_service.record_inserted("payments", created)
+        return len(created)
+
+    async def _checkpoint(self, run_id: str, property_id: str, shard: dict):
+        await self.job_runs.update_one({"_id": run_id}, {"$set": {f"shards.{property_id}": shard}})
+
+    async def _advance_schedules(self, schedule: list[tuple]):
+        operations = [
+            UpdateOne({"_id": tenant_id}, {"$set": {"nextDueDate": next_due}})
+            for tenant_id, next_due in schedule
+        ]
+        if operations:
+            await self.tenants.bulk_write(operations, ordered=False)
+
+    async def _run_shard(self, run_id: str, property_id: str, checkpoint: dict, today: date, horizon: date) -> dict:
+        start_time = time.perf_counter()
+        shard = {
+            "created": checkpoint.get("created", 0),
+            "skipped": checkpoint.get("skipped", 0),
+            "errors": checkpoint.get("errors", 0),
+            "lastTenantId": checkpoint.get("lastTenantId"),
+            "done": False,
+        }
+
+        query = {**self._tenant_filter(horizon), "propertyId": property_id}
+        if shard["lastTenantId"] is not None:
+            query["_id"] = {"$gt": shard["lastTenantId"]}
+        cursor = self.tenants.find(query, TENANT_PROJECTION).sort("_id", 1)
+
+        batch: list[dict] = []
+        # (tenant _id, nextDueDate) updates, applied once the batch's payments are written
+        schedule: list[tuple] = []
+        last_seen = shard["lastTenantId"]
+        # Shard state as of the last successful write
+        committed = dict(shard)
+
+        async def flush():
+            nonlocal batch, schedule
+            await self.fence()
+            if batch or schedule:
+                try:
+                    if batch:
+                        created = await self._write_batch(batch)
+                        shard["created"] += created
+                        shard["skipped"] += len(batch) - created
+                    await self._advance_schedules(schedule)
+                except Exception as e:
+                    # Keep the checkpoint before this batch so the next run retries
+                    # it; the upserts make re-writing its payments a no-op
+                    committed["errors"] += len(batch)
+                    await self._checkpoint(run_id, property_id, committed)
+                    logger.error(f"[CRON] Payment batch failed for property {property_id}: {e}")
+                    raise
+                batch, schedule = [], []
+            shard["lastTenantId"] = last_seen
+            await self._checkpoint(run_id, property_id, shard)
+            committed.update(shard)
+
+        now = datetime.now(timezone.utc)
+        async for tenant_doc in cursor:
+            last_seen = tenant_doc["_id"]
+            payment, next_due = self._plan_tenant(tenant_doc, today, horizon, now)
+            if payment is None:
+                shard["skipped"] += 1
+            else:
+                batch.append(payment)
+            if next_due != tenant_doc.get("nextDueDate"):
+                schedule.append((tenant_doc["_id"], next_due))
+            if len(batch) + len(schedule) >= self.batch_size:
+                await flush()
+        await flush()
+
+        shard["done"] = True
+        shard["durationMs"] = int((time.perf_counter() - start_time) * 1000) + checkpoint.get("durationMs", 0)
+        await self._checkpoint(run_id, property_id, shard)
+        return shard
+
+    async def run(self, today: Optional[date] = None) -> dict:
+        """
+        Generate payments for every shard not finished today.
+
+        Returns: {"created": int, "skipped": int, "errors": list, "duration_ms": int,
+                  "shards": int, "runId": str}
+        """
+        start_time = time.perf_counter()
+        today = today or datetime.now(timezone.utc).date()
+        horizon = today + timedelta(days=settings.BILLING_HORIZON_DAYS)
+        run_id = f"{JOB_NAME}:{today.isoformat()}"
+
+        run_doc = await self.job_runs.find_one_and_update(
+            {"_id": run_id},
+            {
+                "$set": {"job": JOB_NAME, "runDate": today.isoformat(), "status": "running"},
+                "$setOnInsert": {"startedAt": datetime.now(timezone.utc), "shards": {}},
+                "$inc": {"attempts": 1},
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        checkpoints = run_doc.get("shards", {})
+
+        property_ids = [
+            pid for pid in await self.tenants.distinct("propertyId", self._tenant_filter(horizon))
+            if pid and not checkpoints.get(pid, {}).get("done")
+        ]
+        logger.info(f"[CRON] Payment generation {run_id}: {len(property_ids)} shard(s), {self.workers} worker(s)")
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for pid in property_ids:
+            queue.put_nowait(pid)
+        errors: list[dict] = []
+
+        async def worker():
+            while True:
+                try:
+                    pid = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    checkpoints[pid] = await self._run_shard(run_id, pid, checkpoints.get(pid, {}), today, horizon)
+                except LeaseLost:
+                    raise
+                except Exception as e:
+                    logger.error(f"[CRON] Shard {pid} failed: {e}")
+                    errors.append({"propertyId": pid, "error": str(e)})
+
+        await asyncio.gather(*(worker() for _ in range(min(self.workers, len(property_ids)) or 1)))
+
+        shards = checkpoints.values()
+        result = {
+            "created": sum(shard.get("created", 0) for shard in shards),
+            "skipped": sum(shard.get("skipped", 0) for shard in shards),
+            "errors": errors,
+            "duration_ms": int((time.perf_counter() - start_time) * 1000),
+            "shards": len(checkpoints),
+            "runId": run_id,
+        }
+        await self.job_runs.update_one(
+            {"_id": run_id},
+            {"$set": {
+                "status": "failed" if errors else "completed",
+                "completedAt": datetime.now(timezone.utc),
+                "totals": {
+                    "created": result["created"],
+                    "skipped": result["skipped"],
+                    "failedPayments": sum(shard.get("errors", 0) for shard in shards),
+                    "failedShards": len(errors),
+                },
+                "durationMs": result["duration_ms"],
+            }},
+        )
+        logger.info(
+            f"[CRON] Completed {run_id}: created={result['created']}, skipped={result['skipped']}, "
+            f"errors={len(errors)}, duration={result['duration_ms']}ms"
+        )
+        return result
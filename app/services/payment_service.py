@@ -1,8 +1,36 @@
 from typing import List, Optional
 from datetime import datetime, timezone
 from bson import ObjectId
+from pymongo import ReturnDocument
 from ..models.payment_schema import Payment, PaymentCreate, PaymentStatus
 from app.database.mongodb import getCollection
+from app.services.property_stats_service import PropertyStatsService, STATS_PROJECTIONS
+from app.utils.money import to_paise, format_rupees
+from app.utils.ttl_cache import TTLCache
+from app.config import settings
+
+property_stats_service = PropertyStatsService()
+
+# amountPaise, or for payments written before it existed (not yet migrated by
+# migrate_money_paise.py) the display string parsed like to_paise() does
+AMOUNT_PAISE_EXPR = {"$ifNull": ["$amountPaise", {"$round": [{"$multiply": [
+    {"$convert": {
+        "input": {"$trim": {"input": {"$replaceAll": {
+            "input": {"$replaceAll": {"input": {"$toString": "$amount"}, "find": "₹", "replacement": ""}},
+            "find": ",",
+            "replacement": "",
+        }}}},
+        "to": "double",
+        "onError": 0,
+        "onNull": 0,
+    }},
+    100,
+]}, 0]}]}
+# Per-user payment stats; short TTL, so no write-side invalidation
+_payment_stats_cache = TTLCache(
+    ttl_seconds=settings.PAYMENT_STATS_CACHE_TTL_SECONDS,
+    max_entries=settings.PAYMENT_STATS_CACHE_MAX_ENTRIES,
+)
 
 class PaymentService:
     def __init__(self):
@@ -15,9 +43,8 @@ class PaymentService:
             return Payment(**payment)
         return None
 
-    async def create_payment(self, payment_data: PaymentCreate) -> Payment:
-        from pymongo.errors import DuplicateKeyError
-        
+    def build_payment_doc(self, payment_data: PaymentCreate) -> dict:
+        """Document stored for a new payment"""
         now = datetime.now(timezone.utc)
         payment_dict = payment_data.model_dump()
         
@@ -29,11 +56,19 @@ class PaymentService:
         if payment_dict.get("status") == "paid" and not payment_dict.get("paidDate"):
             payment_dict["paidDate"] = now.date().isoformat()
         
+        payment_dict["amountPaise"] = to_paise(payment_dict.get("amount"))
         payment_dict["createdAt"] = now
         payment_dict["updatedAt"] = now
+        return payment_dict
+
+    async def create_payment(self, payment_data: PaymentCreate) -> Payment:
+        from pymongo.errors import DuplicateKeyError
+        
+        payment_dict = self.build_payment_doc(payment_data)
         
         try:
             result = await self.collection.insert_one(payment_dict)
+            await property_stats_service.record_change("payments", after=payment_dict)
             payment_dict["id"] = str(result.inserted_id)
             return Payment(**payment_dict)
         except DuplicateKeyError:
@@ -48,50 +83,82 @@ class PaymentService:
                 return Payment(**existing)
             raise
 
-    async def get_payment_stats(self):
-        payments = await self.collection.find().to_list(length=100)
-        
-        def parse_amount(amount_str):
-            """Parse amount string that may contain currency symbols and commas"""
-            if not amount_str:
-                return 0.0
-            try:
-                # Remove currency symbols and commas, then convert to float
-                cleaned = str(amount_str).replace('₹', '').replace(',', '').strip()
-                return float(cleaned) if cleaned else 0.0
-            except (ValueError, TypeError):
-                return 0.0
-        
-        collected = sum(
-            parse_amount(p["amount"])
-            for p in payments if p["status"] == PaymentStatus.PAID.value
-        )
-        pending = sum(
-            parse_amount(p["amount"])
-            for p in payments if p["status"] == PaymentStatus.DUE.value
-        )
-        return {
-            'collected': f'₹{collected:,.0f}',
-            'pending': f'₹{pending:,.0f}',
+    async def get_payment_stats(
+        self,
+        property_ids: List[str],
+        user_id: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+    ) -> dict:
+        """
+        Collected/pending totals over the given properties, optionally limited
+        to payments due within [start_date, end_date] (ISO dates).
+        """
+        cache_key = (user_id, tuple(sorted(property_ids)), start_date, end_date)
+        if user_id:
+            cached = _payment_stats_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        def empty_totals():
+            return {"collectedPaise": 0, "pendingPaise": 0, "paidCount": 0, "dueCount": 0}
+
+        overall = empty_totals()
+        by_property = {property_id: empty_totals() for property_id in property_ids}
+
+        if property_ids:
+            # propertyId + status lead the match so the (propertyId, status) index is used
+            match = {
+                "propertyId": {"$in": list(property_ids)},
+                "status": {"$in": [PaymentStatus.PAID.value, PaymentStatus.DUE.value]},
+            }
+            if start_date or end_date:
+                match["dueDate"] = {}
+                if start_date:
+                    match["dueDate"]["$gte"] = start_date
+                if end_date:
+                    match["dueDate"]["$lte"] = end_date
+
+            groups = await self.collection.aggregate([
+                {"$match": match},
+                {"$group": {
+                    "_id": {"propertyId": "$propertyId", "status": "$status"},
+                    "total": {"$sum": AMOUNT_PAISE_EXPR},
+                    "count": {"$sum": 1},
+                }},
+            ]).to_list(None)
+
+            for group in groups:
+                totals = by_property.setdefault(group["_id"]["propertyId"], empty_totals())
+                if group["_id"]["status"] == PaymentStatus.PAID.value:
+                    amount_key, count_key = "collectedPaise", "paidCount"
+                else:
+                    amount_key, count_key = "pendingPaise", "dueCount"
+                for target in (totals, overall):
+                    target[amount_key] += int(group["total"])
+                    target[count_key] += group["count"]
+
+        def render(totals):
+            return {
+                'collected': format_rupees(totals["collectedPaise"]),
+                'pending': format_rupees(totals["pendingPaise"]),
+                **totals,
+            }
+
+        result = {
+            **render(overall),
+            'byProperty': {property_id: render(totals) for property_id, totals in by_property.items()},
         }
+        if user_id:
+            _payment_stats_cache.set(cache_key, result)
+        return result
 
     async def update_payment(self, payment_id: str, payment_update) -> Optional[Payment]:
         from datetime import date as date_type
         
-        payment = await self.collection.find_one({"_id": ObjectId(payment_id)})
-        if not payment:
-            return None
         update_data = {k: v for k, v in payment_update.model_dump().items() if v is not None}
-        
-        # Auto-set paidDate when status changes to "paid" and paidDate is not provided
-        # This handles the case where user changes status to paid but hasn't edited the date
-        if update_data.get("status") == "paid" and "paidDate" not in update_data:
-            # Only auto-set if there's no existing paidDate or user is changing status
-            if not payment.get("paidDate"):
-                update_data["paidDate"] = date_type.today().isoformat()
-        
-        # If status is changing from paid to due, keep the paidDate as reference
-        # User can edit it if needed
+        if "amount" in update_data:
+            update_data["amountPaise"] = to_paise(update_data["amount"])
         
         # Convert date objects to ISO string for MongoDB storage
         if update_data.get("dueDate") and hasattr(update_data["dueDate"], 'isoformat'):
@@ -99,19 +166,61 @@ class PaymentService:
         if update_data.get("paidDate") and hasattr(update_data["paidDate"], 'isoformat'):
             update_data["paidDate"] = update_data["paidDate"].isoformat()
         
-
         update_data["updatedAt"] = datetime.now(timezone.utc)
-        await self.collection.update_one({"_id": ObjectId(payment_id)}, {"$set": update_data})
-        payment.update(update_data)
+        
+        # Pipeline update so the whole change is one atomic write; values are
+        # wrapped in $literal so strings such as "$100" are not read as fields
+        stage = {field: {"$literal": value} for field, value in update_data.items()}
+        
+        # Auto-set paidDate when status changes to "paid" and paidDate is not provided
+        # This handles the case where user changes status to paid but hasn't edited the date
+        # Only auto-set if there's no existing paidDate (checked against the stored document)
+        default_paid_date = None
+        if update_data.get("status") == "paid" and "paidDate" not in update_data:
+            default_paid_date = date_type.today().isoformat()
+            stage["paidDate"] = {"$cond": [
+                {"$in": [{"$ifNull": ["$paidDate", None]}, [None, ""]]},
+                default_paid_date,
+                "$paidDate",
+            ]}
+        
+        # If status is changing from paid to due, keep the paidDate as reference
+        # User can edit it if needed
+        
+        # The stats delta is computed from the atomic pre-image, so two
+        # concurrent updates (e.g. a double "mark paid") apply it only once each
+        before = await self.collection.find_one_and_update(
+            {"_id": ObjectId(payment_id)},
+            [{"$set": stage}],
+            return_document=ReturnDocument.BEFORE,
+        )
+        if not before:
+            return None
+        payment = {**before, **update_data}
+        if default_paid_date and not before.get("paidDate"):
+            payment["paidDate"] = default_paid_date
+        await property_stats_service.record_change("payments", before, payment)
         payment["id"] = str(payment["_id"])
         return Payment(**payment)
 
     async def delete_payment(self, payment_id: str) -> bool:
         """Delete a single payment by ID"""
-        result = await self.collection.delete_one({"_id": ObjectId(payment_id)})
-        return result.deleted_count > 0
+        deleted = await self.collection.find_one_and_delete({"_id": ObjectId(payment_id)})
+        if not deleted:
+            return False
+        await property_stats_service.record_change("payments", before=deleted)
+        return True
 
-    async def delete_payments_by_tenant(self, tenant_id: str) -> int:
-        """Delete all payments for a specific tenant. Returns count of deleted payments."""
-        result = await self.collection.delete_many({"tenantId": tenant_id})
+    async def delete_payments_by_tenant(self, tenant_id: str, session=None, pending_stats=None) -> int:
+        """
+        Delete all payments for a specific tenant. Returns count of deleted payments.
+        Inside a transaction pass the session and a PendingStats collector.
+        """
+        query = {"tenantId": tenant_id}
+        payments = await self.collection.find(query, STATS_PROJECTIONS["payments"], session=session).to_list(None)
+        result = await self.collection.delete_many(query, session=session)
+        if pending_stats is not None:
+            pending_stats.deleted("payments", payments)
+        else:
+            await property_stats_service.record_deleted("payments", payments)
         return result.deleted_count
\ No newline at end of file
@@ -0,0 +1,79 @@
+"""
+In-memory catalog of subscription plans.
+
+The plans collection holds a handful of documents that only change through
+the admin endpoints, yet quota checks, subscription changes and the renewal
+job used to read it on every call. The catalog keeps all plans in a dict
+keyed by name and serves lookups from memory.
+
+Every plan write bumps a version counter in `schema_meta`. The worker that
+made the write drops its copy at once; other workers compare the counter at
+most every PLAN_CATALOG_REFRESH_SECONDS and reload when it moved.
+"""
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from app.config import settings
+from app.database.mongodb import db
+
+META_COLLECTION = "schema_meta"
+META_ID = "plan_catalog"
+
+
+class PlanCatalog:
+    def __init__(self, refresh_seconds: Optional[float] = None):
+        self.refresh_seconds = refresh_seconds if refresh_seconds is not None else settings.PLAN_CATALOG_REFRESH_SECONDS
+        self._plans: Optional[Dict[str, dict]] = None
+        self._version: Optional[int] = None
+        self._next_check = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def _ensure_fresh(self) -> Dict[str, dict]:
+        if self._plans is not None and time.monotonic() < self._next_check:
+            return self._plans
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            # Another request may have refreshed while we waited
+            if self._plans is not None and time.monotonic() < self._next_check:
+                return self._plans
+
+            meta = await db[META_COLLECTION].find_one({"_id": META_ID}, {"version": 1})
+            version = meta.get("version", 0) if meta else 0
+            if self._plans is None or version != self._version:
+                # Read the version first: a write landing in between only causes one extra reload
+                self._plans = {plan["name"]: plan async for plan in db.plans.find({})}
+                self._version = version
+            self._next_check = time.monotonic() + self.refresh_seconds
+            return self._plans
+
+    async def load(self) -> int:
+        """Force a reload (used at startup); returns the number of plans"""
+        self._plans = None
+        return len(await self._ensure_fresh())
+
+    async def get(self, name: str, active_only: bool = False) -> Optional[dict]:
+        """Plan document by name (case-insensitive), or None"""
+        plan = (await self._ensure_fresh()).get(name.lower())
+        if plan is None or (active_only and not plan.get("is_active")):
+            return None
+        # Shallow copy so callers can add fields (e.g. "id") without touching the cache
+        return dict(plan)
+
+    async def all(self, active_only: bool = False) -> List[dict]:
+        """All plans sorted by sort_order"""
+        plans = (await self._ensure_fresh()).values()
+        return [
+            dict(plan) for plan in sorted(plans, key=lambda p: p.get("sort_order", 0))
+            if not active_only or plan.get("is_active")
+        ]
+
+    async def invalidate(self):
+        """Call after any write to the plans collection"""
+        self._plans = None
+        await db[META_COLLECTION].update_one({"_id": META_ID}, {"$inc": {"version": 1}}, upsert=True)
+
+
+plan_catalog = PlanCatalog()
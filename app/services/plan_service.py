@@ -2,14 +2,17 @@
 Plan Service
 Manages subscription plan CRUD operations for admin.
 Plans are stored in MongoDB and used by all property owners.
+Reads are served from plan_catalog; every write here invalidates it.
 """
 
 from datetime import datetime
 from typing import Dict, List, Optional
 from bson import ObjectId
+from pymongo import ReturnDocument
 
 from app.database.mongodb import db
 from app.models.plan_schema import Plan, PlanCreate, PlanUpdate
+from app.services.plan_catalog import plan_catalog
 
 
 class PlanService:
@@ -41,12 +44,10 @@ class PlanService:
         
         # Insert into database
         result = await db.plans.insert_one(plan_dict)
+        await plan_catalog.invalidate()
         
-        # Fetch and return created plan
-        created_plan = await db.plans.find_one({"_id": result.inserted_id})
-        created_plan['id'] = str(created_plan['_id'])
-        
-        return Plan(**created_plan)
+        plan_dict['id'] = str(result.inserted_id)
+        return Plan(**plan_dict)
 
     @staticmethod
     async def get_plan_by_name(name: str) -> Optional[Plan]:
@@ -59,7 +60,7 @@ class PlanService:
         Returns:
             Plan if found, None otherwise
         """
-        plan = await db.plans.find_one({"name": name.lower()})
+        plan = await plan_catalog.get(name)
         if plan:
             plan['id'] = str(plan['_id'])
             return Plan(**plan)
@@ -76,13 +77,12 @@ class PlanService:
         Returns:
             Plan if found, None otherwise
         """
-        try:
-            plan = await db.plans.find_one({"_id": ObjectId(plan_id)})
-            if plan:
+        if not ObjectId.is_valid(plan_id):
+            return None
+        for plan in await plan_catalog.all():
+            if plan['_id'] == ObjectId(plan_id):
                 plan['id'] = str(plan['_id'])
                 return Plan(**plan)
-        except Exception:
-            pass
         return None
 
     @staticmethod
@@ -96,11 +96,8 @@ class PlanService:
         Returns:
             List of plans sorted by sort_order
         """
-        query = {"is_active": True} if active_only else {}
-        cursor = db.plans.find(query).sort("sort_order", 1)
-        
         plans = []
-        async for plan in cursor:
+        for plan in await plan_catalog.all(active_only=active_only):
             plan['id'] = str(plan['_id'])
             plans.append(Plan(**plan))
         
@@ -118,23 +115,19 @@ class PlanService:
         Returns:
             Updated plan if found, None otherwise
         """
-        # Get existing plan
-        existing = await db.plans.find_one({"name": plan_name.lower()})
-        if not existing:
-            return None
-        
         # Prepare update dict (exclude None values)
         update_dict = update_data.model_dump(exclude_none=True)
         update_dict['updated_at'] = datetime.utcnow()
         
-        # Update in database
-        await db.plans.update_one(
+        # Update in database and return the updated plan (None if it does not exist)
+        updated_plan = await db.plans.find_one_and_update(
             {"name": plan_name.lower()},
-            {"$set": update_dict}
+            {"$set": update_dict},
+            return_document=ReturnDocument.AFTER
         )
-        
-        # Fetch and return updated plan
-        updated_plan = await db.plans.find_one({"name": plan_name.lower()})
+        await plan_catalog.invalidate()
+        if not updated_plan:
+            return None
         updated_plan['id'] = str(updated_plan['_id'])
         
         return Plan(**updated_plan)
@@ -165,6 +158,7 @@ class PlanService:
             )
         
         result = await db.plans.delete_one({"name": plan_name.lower()})
+        await plan_catalog.invalidate()
         return result.deleted_count > 0
 
     @staticmethod
@@ -187,6 +181,7 @@ class PlanService:
                 }
             }
         )
+        await plan_catalog.invalidate()
         
         if result.modified_count > 0 or result.matched_count > 0:
             return await PlanService.get_plan_by_name(plan_name)
@@ -216,6 +211,7 @@ class PlanService:
                 }
             }
         )
+        await plan_catalog.invalidate()
         
         if result.modified_count > 0 or result.matched_count > 0:
             return await PlanService.get_plan_by_name(plan_name)
@@ -338,6 +334,7 @@ class PlanService:
         ]
         
         result = await db.plans.insert_many(default_plans)
+        await plan_catalog.invalidate()
         return len(result.inserted_ids)
 
     @staticmethod
@@ -348,8 +345,9 @@ class PlanService:
         Returns:
             Dict with plan statistics
         """
-        total = await db.plans.count_documents({})
-        active = await db.plans.count_documents({"is_active": True})
+        plans = await plan_catalog.all()
+        total = len(plans)
+        active = sum(1 for plan in plans if plan.get("is_active"))
         
         # Get subscription counts per plan
         pipeline = [
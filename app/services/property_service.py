@@ -3,15 +3,21 @@ import uuid
 from app.database.mongodb import db
 from app.models.property_schema import PropertyOut
 from app.utils.ownership import build_owner_query, normalize_property_owners
-from typing import List
+from app.utils.auth_context import invalidate_auth_context
+from app.services.owner_usage_service import OwnerUsageService
+from app.services.property_stats_service import PropertyStatsService, QuotaReservation, consume_reservation
+from typing import List, Optional
 from datetime import datetime, timezone
 from bson import ObjectId
 
+property_stats_service = PropertyStatsService()
+owner_usage_service = OwnerUsageService()
+
 class PropertyService:
     def __init__(self):
         self.db = db
 
-    async def create_property(self, property_data: dict, owner_id: str) -> PropertyOut:
+    async def create_property(self, property_data: dict, owner_id: str, quota_reserved: Optional[QuotaReservation] = None) -> PropertyOut:
         now = datetime.now(timezone.utc).isoformat()
         doc = dict(property_data)
         doc["ownerIds"] = [owner_id]
@@ -19,6 +25,8 @@ class PropertyService:
         doc["createdAt"] = now
         doc["updatedAt"] = now
         result = await self.db["properties"].insert_one(doc)
+        # The property exists from here on, so its reservation is used up
+        await owner_usage_service.record_property_created(owner_id, reserved=consume_reservation(quota_reserved))
         doc["id"] = str(result.inserted_id)
         normalize_property_owners(doc, fallback_owner_id=owner_id)
         # Update user document to add propertyId
@@ -26,6 +34,7 @@ class PropertyService:
             {"_id": ObjectId(owner_id)},
             {"$addToSet": {"propertyIds": doc["id"]}}
         )
+        invalidate_auth_context(doc.get("ownerIds", []))
         return PropertyOut(**doc)
 
     async def list_properties(self, user_id: str) -> List[PropertyOut]:
@@ -110,10 +119,16 @@ class PropertyService:
         # 5. Delete all staff for this property
         await self.db["staff"].delete_many({"propertyId": property_id})
 
-        # Delete the property itself
-        await self.db["properties"].delete_one({"_id": ObjectId(property_id)})
+        # 6. Drop the materialized dashboard counters
+        await property_stats_service.delete(property_id)
+
+        # Delete the property itself and free its owners' property quota
+        deleted = await self.db["properties"].delete_one({"_id": ObjectId(property_id)})
+        if deleted.deleted_count:
+            await owner_usage_service.release_property(normalize_property_owners(dict(existing)).get("ownerIds", []))
         
         # Remove property ID from all users
         await self.db["users"].update_many({}, {"$pull": {"propertyIds": property_id}})
+        invalidate_auth_context(normalize_property_owners(dict(existing)).get("ownerIds", []))
         
         return {"success": True, "propertyId": property_id}
\ No newline at end of file
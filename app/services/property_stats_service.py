@@ -0,0 +1,461 @@
+"""
+Materialized per-property dashboard counters.
+
+One document per property in `property_stats` (_id = propertyId) holds the
+numbers the dashboard shows, plus the per-property resource counts that
+subscription quotas are checked against. Tenant, room, bed, payment and
+staff writes call record_change() with the document before and after the
+write, and the difference between the two is applied with a single $inc. rebuild()
+recomputes a property from the source collections and is used for lazy
+initialisation, bulk operations and the reconciliation job.
+
+Every $inc also bumps a `seq` field. rebuild() only writes its result if
+`seq` is unchanged since it started counting, and counts again otherwise,
+so an increment that lands while the source collections are scanned is
+never overwritten. What `seq` cannot see is a source write that committed
+before the scan but whose $inc lands after rebuild's write (record_change
+runs after the write, after the commit for transactions): that document is
+counted twice until the next rebuild. Counters can therefore run slightly
+high; reserve() treats a refusal as advisory and recounts before refusing.
+
+Quota counters can also be reserved ahead of an insert. reserve() is a
+conditional $inc of `reserved.<counter>` that only succeeds while the
+counter plus its reservations is below the plan limit, so concurrent
+creations cannot overshoot it. The insert is then recorded with
+reserved=True, which moves the unit from the reservation to the counter.
+Reservations are not derived from the source collections, so rebuild()
+leaves them alone; the reconciliation job clears any older than
+RESERVATION_TTL_SECONDS, which a crashed request left behind.
+"""
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from app.database.mongodb import getCollection
+from app.utils.money import to_paise
+from app.utils.query_plan import QueryPlan
+
+logger = logging.getLogger(__name__)
+
+STATS_COLLECTION = "property_stats"
+# Bump when counter definitions change; older documents are rebuilt on read
+STATS_VERSION = 3
+
+# Counters that are plain integers (maps like paidByMonthPaise are keyed by date)
+COUNTER_FIELDS = (
+    "activeTenants",
+    "vacatedTenants",
+    "totalBeds",
+    "occupiedBeds",
+    "pendingPayments",
+    "pendingAmountPaise",
+    "totalStaff",
+    "availableStaff",
+    # Quota counters (see SubscriptionEnforcement)
+    "tenantCount",
+    "roomCount",
+    "staffCount",
+)
+
+# Quota counter per source collection (see SubscriptionEnforcement)
+QUOTA_FIELDS = {"tenants": "tenantCount", "rooms": "roomCount", "staff": "staffCount"}
+# Conditional $inc attempts before a reservation gives up
+RESERVE_ATTEMPTS = 3
+# Reservations are held for the length of one create request; older ones were abandoned
+RESERVATION_TTL_SECONDS = 10 * 60
+# Recounts before rebuild() gives up on a property that keeps changing
+REBUILD_ATTEMPTS = 5
+# History kept in the date-keyed maps; older keys are dropped on rebuild
+PAID_MONTHS_KEPT = 12
+CHECK_IN_DAYS_KEPT = 90
+
+# Fields each source collection needs to compute its counters
+STATS_PROJECTIONS = {
+    "tenants": {"propertyId": 1, "archived": 1, "tenantStatus": 1, "joinDate": 1},
+    "beds": {"propertyId": 1, "status": 1},
+    "payments": {"propertyId": 1, "status": 1, "amount": 1, "amountPaise": 1, "paidDate": 1},
+    "staff": {"propertyId": 1, "active": 1, "status": 1, "archived": 1},
+    "rooms": {"propertyId": 1},
+}
+
+
+def _amount_paise(doc: dict) -> int:
+    # Payments written before amountPaise existed fall back to the display string
+    paise = doc.get("amountPaise")
+    return paise if isinstance(paise, int) else to_paise(doc.get("amount"))
+
+
+def _date_key(value, length: int) -> Optional[str]:
+    """First `length` chars of an ISO date string ("2024-05-17" -> "2024-05" for 7)"""
+    if not isinstance(value, str) or len(value) < length:
+        return None
+    return value[:length]
+
+
+def _tenant_counters(doc: dict) -> dict:
+    # Every tenant counts against the plan's per-property quota
+    counters = {"tenantCount": 1}
+    if doc.get("archived") is not True:
+        # Tenants created before tenantStatus existed count as active
+        if "tenantStatus" not in doc or doc["tenantStatus"] == "active":
+            counters["activeTenants"] = 1
+        elif doc["tenantStatus"] == "vacated":
+            counters["vacatedTenants"] = 1
+    join_day = _date_key(doc.get("joinDate"), 10)
+    if join_day:
+        counters[f"checkInsByDate.{join_day}"] = 1
+    return counters
+
+
+def _bed_counters(doc: dict) -> dict:
+    counters = {"totalBeds": 1}
+    if doc.get("status") == "occupied":
+        counters["occupiedBeds"] = 1
+    return counters
+
+
+def _payment_counters(doc: dict) -> dict:
+    counters = {}
+    status = doc.get("status")
+    if status == "due":
+        counters["pendingPayments"] = 1
+        counters["pendingAmountPaise"] = _amount_paise(doc)
+    elif status == "paid":
+        paid_month = _date_key(doc.get("paidDate"), 7)
+        if paid_month:
+            counters[f"paidByMonthPaise.{paid_month}"] = _amount_paise(doc)
+    return counters
+
+
+def _room_counters(doc: dict) -> dict:
+    return {"roomCount": 1}
+
+
+def _staff_counters(doc: dict) -> dict:
+    counters = {}
+    # Same as the quota's {"archived": False} filter: documents without the field do not count
+    if doc.get("archived") is False:
+        counters["staffCount"] = 1
+    if doc.get("active") is True:
+        counters["totalStaff"] = 1
+        if doc.get("status") == "available":
+            counters["availableStaff"] = 1
+    return counters
+
+
+class QuotaReservation:
+    """
+    Handle for one reserved quota unit, yielded by SubscriptionEnforcement.reserve().
+    The create marks it consumed once the resource exists; only an unconsumed
+    reservation is given back when the block fails.
+    """
+
+    def __init__(self):
+        self.consumed = False
+
+
+def consume_reservation(reservation: Optional[QuotaReservation]) -> bool:
+    """Mark a reservation as used by the insert just made; returns whether there was one"""
+    if reservation is None:
+        return False
+    reservation.consumed = True
+    return True
+
+
+_COUNTERS = {
+    "tenants": _tenant_counters,
+    "beds": _bed_counters,
+    "payments": _payment_counters,
+    "staff": _staff_counters,
+    "rooms": _room_counters,
+}
+
+
+class PropertyStatsService:
+    def __init__(self):
+        self.collection = getCollection(STATS_COLLECTION)
+
+    async def record_change(
+        self, kind: str, before: Optional[dict] = None, after: Optional[dict] = None, reserved: bool = False
+    ):
+        """
+        Apply the counter difference between two versions of a document.
+
+        `kind` is the source collection name. Pass before=None for an insert
+        and after=None for a delete; reserved=True for an insert whose quota
+        counter was already taken with reserve(). Errors are logged rather
+        than raised so a stats hiccup never fails the write itself; the
+        reconciliation job repairs any drift.
+        """
+        await self._apply(kind, [(before, after)], reserved=reserved)
+
+    async def record_inserted(self, kind: str, docs: Iterable[dict]):
+        """Apply the counters of several newly inserted documents"""
+        await self._apply(kind, [(None, doc) for doc in docs])
+
+    async def record_deleted(self, kind: str, docs: Iterable[dict]):
+        """Remove the counters of several deleted documents"""
+        await self._apply(kind, [(doc, None) for doc in docs])
+
+    def pending(self) -> "PendingStats":
+        """Collector for changes made inside a transaction (see PendingStats)"""
+        return PendingStats(self)
+
+    async def _apply(self, kind: str, changes: Iterable[tuple], reserved: bool = False):
+        counters = _COUNTERS[kind]
+        # Inserts made under a reservation consume it as they are counted
+        reserved_field = QUOTA_FIELDS.get(kind) if reserved else None
+        # Merge everything into a single $inc per property
+        deltas: dict[str, dict[str, int]] = {}
+        for before, after in changes:
+            for doc, sign in ((before, -1), (after, 1)):
+                if not doc or not doc.get("propertyId"):
+                    continue
+                property_deltas = deltas.setdefault(doc["propertyId"], {})
+                for field, value in counters(doc).items():
+                    property_deltas[field] = property_deltas.get(field, 0) + sign * value
+                    if field == reserved_field and before is None:
+                        key = f"reserved.{field}"
+                        property_deltas[key] = property_deltas.get(key, 0) - value
+
+        for property_id, inc in deltas.items():
+            inc = {field: value for field, value in inc.items() if value}
+            if not inc:
+                continue
+            try:
+                await self.collection.update_one(
+                    {"_id": property_id},
+                    {"$inc": {**inc, "seq": 1}, "$set": {"updatedAt": datetime.now(timezone.utc).isoformat()}},
+                    upsert=True,
+                )
+            except Exception as e:
+                logger.error(f"Failed to update property stats for {property_id}: {e}")
+
+    async def get_stats(self, property_id: str, timings: Optional[dict] = None) -> dict:
+        """
+        Return the stats document, building it on first access.
+        Query timings (ms) are added to `timings` when given.
+        """
+        start = time.perf_counter()
+        doc = await self.collection.find_one({"_id": property_id})
+        if timings is not None:
+            timings["property_stats"] = (time.perf_counter() - start) * 1000
+        if doc is None or doc.get("version") != STATS_VERSION:
+            doc = await self.rebuild(property_id, timings=timings)
+        return doc
+
+    async def get_counters(self, property_id: str, fields: Iterable[str]) -> dict:
+        """A few counters of a property, read with a projection (built on first access)"""
+        fields = list(fields)
+        doc = await self.collection.find_one({"_id": property_id}, {**{field: 1 for field in fields}, "version": 1})
+        if doc is None or doc.get("version") != STATS_VERSION:
+            doc = await self.rebuild(property_id)
+        return {field: doc.get(field, 0) for field in fields}
+
+    async def reserve(self, property_id: str, field: str, limit: int) -> bool:
+        """
+        Reserve one unit of a quota counter if the counter plus the units
+        already reserved is below `limit`.
+
+        The limit check and the increment are one conditional update. A miss
+        means the quota is used up or the document is missing or outdated;
+        the latter is rebuilt and the update retried. The counter may run
+        high after a rebuild raced a write, so an apparent "at the limit" is
+        confirmed with one fresh rebuild before the reservation is refused.
+        """
+        reserved_field = f"reserved.{field}"
+        recounted = False
+        for _ in range(RESERVE_ATTEMPTS):
+            now = datetime.now(timezone.utc).isoformat()
+            result = await self.collection.update_one(
+                {
+                    "_id": property_id,
+                    "version": STATS_VERSION,
+                    "$expr": {"$lt": [
+                        {"$add": [{"$ifNull": [f"${field}", 0]}, {"$ifNull": [f"${reserved_field}", 0]}]},
+                        limit,
+                    ]},
+                },
+                {"$inc": {reserved_field: 1}, "$set": {"reservedAt": now, "updatedAt": now}},
+            )
+            if result.modified_count:
+                return True
+            doc = await self.collection.find_one({"_id": property_id}, {field: 1, "reserved": 1, "version": 1})
+            if doc is None or doc.get("version") != STATS_VERSION:
+                await self.rebuild(property_id)
+                continue
+            if doc.get(field, 0) + doc.get("reserved", {}).get(field, 0) >= limit:
+                if recounted:
+                    return False
+                # The counter may be high after a racing rebuild; confirm before refusing
+                recounted = True
+                await self.rebuild(property_id)
+        logger.warning(f"Could not reserve {field} for property {property_id} after {RESERVE_ATTEMPTS} attempts")
+        return False
+
+    async def release(self, property_id: str, field: str):
+        """Give back a reservation whose insert failed"""
+        await self.collection.update_one(
+            {"_id": property_id, f"reserved.{field}": {"$gt": 0}},
+            {"$inc": {f"reserved.{field}": -1}, "$set": {"updatedAt": datetime.now(timezone.utc).isoformat()}},
+        )
+
+    async def clear_stale_reservations(self) -> int:
+        """Drop reservations abandoned by crashed requests; returns how many properties had some"""
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=RESERVATION_TTL_SECONDS)).isoformat()
+        result = await self.collection.update_many(
+            {"reservedAt": {"$lt": cutoff}},
+            {"$unset": {"reserved": "", "reservedAt": ""}},
+        )
+        return result.modified_count
+
+    async def _scan(self, kind: str, property_id: str) -> dict:
+        counters = _COUNTERS[kind]
+        totals: dict[str, int] = {}
+        async for doc in getCollection(kind).find({"propertyId": property_id}, STATS_PROJECTIONS[kind]):
+            for field, value in counters(doc).items():
+                totals[field] = totals.get(field, 0) + value
+        return totals
+
+    async def _count(self, property_id: str, timings: Optional[dict] = None) -> dict:
+        stats: dict = {field: 0 for field in COUNTER_FIELDS}
+        stats["paidByMonthPaise"] = {}
+        stats["checkInsByDate"] = {}
+
+        plan = QueryPlan()
+        for kind in _COUNTERS:
+            plan.add(kind, lambda kind=kind: self._scan(kind, property_id))
+        results = await plan.run()
+        if timings is not None:
+            timings.update({f"rebuild_{kind}": duration for kind, duration in plan.timings.items()})
+
+        today = datetime.now(timezone.utc).date()
+        first_month = today.year * 12 + today.month - PAID_MONTHS_KEPT
+        oldest = {
+            "paidByMonthPaise": f"{first_month // 12:04d}-{first_month % 12 + 1:02d}",
+            "checkInsByDate": (today - timedelta(days=CHECK_IN_DAYS_KEPT)).isoformat(),
+        }
+        for totals in results.values():
+            for field, value in totals.items():
+                if "." in field:
+                    group, key = field.split(".", 1)
+                    # Only recent history is shown; this keeps the maps from growing forever
+                    if key >= oldest[group]:
+                        stats[group][key] = stats[group].get(key, 0) + value
+                else:
+                    stats[field] += value
+        return stats
+
+    async def rebuild(self, property_id: str, timings: Optional[dict] = None) -> dict:
+        """
+        Recompute a property's counters from the source collections.
+
+        The result is written only if no $inc touched the document while the
+        collections were scanned (same `seq`); otherwise the property is
+        counted again. A write whose $inc is still in flight when the scan
+        reads its document is counted twice (see the module docstring).
+        Reservations are not part of the result and are kept.
+        """
+        for _ in range(REBUILD_ATTEMPTS):
+            current = await self.collection.find_one({"_id": property_id}, {"seq": 1})
+            stats = await self._count(property_id, timings=timings)
+            now = datetime.now(timezone.utc).isoformat()
+            stats.update({"version": STATS_VERSION, "rebuiltAt": now, "updatedAt": now})
+
+            if current is None:
+                try:
+                    await self.collection.insert_one({"_id": property_id, "seq": 0, **stats})
+                except DuplicateKeyError:
+                    # Created by a concurrent write; count again
+                    continue
+                stats.update({"_id": property_id, "seq": 0})
+                return stats
+
+            # $set rather than replace: fields not derived from the scan are kept
+            result = await self.collection.update_one(
+                {"_id": property_id, "seq": current.get("seq")},
+                {"$set": stats, "$inc": {"seq": 1}},
+            )
+            if result.matched_count:
+                stats["_id"] = property_id
+                return stats
+
+        # Still changing after every attempt: keep the incremental counters,
+        # the next rebuild or reconciliation repairs any drift
+        logger.warning(f"Property stats for {property_id} kept changing during rebuild; left as is")
+        stats["_id"] = property_id
+        return stats
+
+    async def delete(self, property_id: str):
+        await self.collection.delete_one({"_id": property_id})
+
+    async def reconcile_all(self, fence=None) -> dict:
+        """
+        Rebuild every property's counters and drop stats of deleted properties.
+        Run periodically by the scheduler to repair drift. `fence` (the job
+        lease's check) is awaited before each property and before the cleanup.
+        """
+        start_time = time.time()
+        result = {"rebuilt": 0, "removed": 0, "staleReservations": 0, "errors": []}
+        property_ids = set()
+
+        async for prop in getCollection("properties").find({}, {"_id": 1}):
+            property_id = str(prop["_id"])
+            property_ids.add(property_id)
+            if fence:
+                await fence()
+            try:
+                await self.rebuild(property_id)
+                result["rebuilt"] += 1
+            except Exception as e:
+                result["errors"].append({"propertyId": property_id, "error": str(e)})
+
+        orphaned = [
+            doc["_id"] async for doc in self.collection.find({}, {"_id": 1})
+            if doc["_id"] not in property_ids
+        ]
+        if orphaned:
+            if fence:
+                await fence()
+            deleted = await self.collection.delete_many({"_id": {"$in": orphaned}})
+            result["removed"] = deleted.deleted_count
+        result["staleReservations"] = await self.clear_stale_reservations()
+
+        result["duration_ms"] = int((time.time() - start_time) * 1000)
+        logger.info(
+            f"[CRON] Property stats reconciled: rebuilt={result['rebuilt']}, "
+            f"removed={result['removed']}, errors={len(result['errors'])}, duration={result['duration_ms']}ms"
+        )
+        return result
+
+
+class PendingStats:
+    """
+    Counter changes made inside a transaction, applied once it has committed.
+
+    $inc on property_stats is not idempotent, so applying it inside a
+    transaction callback that Motor may retry would double count. Create a
+    fresh collector per attempt and call apply() after the commit.
+    """
+
+    def __init__(self, service: PropertyStatsService):
+        self._service = service
+        # Keyed by (kind, reserved)
+        self._changes: dict[tuple, list[tuple]] = {}
+
+    def change(self, kind: str, before: Optional[dict] = None, after: Optional[dict] = None, reserved: bool = False):
+        self._changes.setdefault((kind, reserved), []).append((before, after))
+
+    def inserted(self, kind: str, docs: Iterable[dict]):
+        self._changes.setdefault((kind, False), []).extend((None, doc) for doc in docs)
+
+    def deleted(self, kind: str, docs: Iterable[dict]):
+        self._changes.setdefault((kind, False), []).extend((doc, None) for doc in docs)
+
+    async def apply(self):
+        for (kind, reserved), changes in self._changes.items():
+            await self._service._apply(kind, changes, reserved=reserved)
+        self._changes = {}
@@ -0,0 +1,192 @@
+"""
+Async Razorpay API client.
+
+The official SDK is built on `requests`, so every call blocked the event
+loop for the whole HTTP round-trip. This gateway talks to the REST API
+through one pooled httpx.AsyncClient with explicit timeouts.
+
+Failed calls are retried a bounded number of times with full-jitter
+backoff. Reads (and calls that are harmless to repeat) are retried on
+connection errors, timeouts, 429 and 5xx responses. Razorpay has no
+documented idempotency key for creating resources, so a POST is only
+retried when it never reached Razorpay: a failed connect or a 429. After a
+timeout or 5xx the order may or may not exist; create_order() then looks
+it up by its receipt instead of posting again.
+
+Point RAZORPAY_API_BASE_URL at a local fake server, or pass an httpx
+transport (e.g. httpx.MockTransport), to exercise it without Razorpay.
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Optional
+
+import httpx
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# Razorpay rejects a rate-limited request before doing anything with it
+NOT_PROCESSED_STATUS_CODES = {429}
+# Allowed clock difference when matching an order found by receipt
+RECEIPT_LOOKUP_SKEW_SECONDS = 300
+
+
+class RazorpayError(Exception):
+    """Razorpay rejected the request or could not be reached"""
+
+    def __init__(
+        self,
+        message: str,
+        status_code: Optional[int] = None,
+        error: Optional[dict] = None,
+        ambiguous: bool = False,
+    ):
+        super().__init__(message)
+        self.status_code = status_code
+        self.error = error or {}
+        # True when the request may have been carried out despite the error
+        self.ambiguous = ambiguous
+
+
+class RazorpayGateway:
+    def __init__(
+        self,
+        key_id: Optional[str] = None,
+        key_secret: Optional[str] = None,
+        base_url: Optional[str] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        backoff_base: float = 0.25,
+        backoff_max: float = 4.0,
+    ):
+        self.key_id = key_id or settings.RAZORPAY_KEY_ID
+        self.key_secret = key_secret or settings.RAZORPAY_KEY_SECRET
+        self.base_url = (base_url or settings.RAZORPAY_API_BASE_URL).rstrip("/")
+        self.timeout = timeout or settings.RAZORPAY_TIMEOUT_SECONDS
+        self.max_retries = max(0, max_retries if max_retries is not None else settings.RAZORPAY_MAX_RETRIES)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Created lazily so the client binds to the running event loop
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                auth=(self.key_id or "", self.key_secret or ""),
+                timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 5.0)),
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                transport=self._transport,
+            )
+        return self._client
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        json: Optional[dict] = None,
+        params: Optional[dict] = None,
+        idempotent: Optional[bool] = None,
+    ) -> dict[str, Any]:
+        """
+        Send one API call. `idempotent` defaults to True for GET only; other
+        calls are retried only when Razorpay cannot have processed them.
+        """
+        if idempotent is None:
+            idempotent = method.upper() == "GET"
+
+        attempt = 0
+        while True:
+            try:
+                response = await self._get_client().request(method, path, json=json, params=params)
+            except httpx.TransportError as e:
+                # A connect failure never reached Razorpay, so it is always safe to retry
+                not_sent = isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+                if not (idempotent or not_sent) or attempt >= self.max_retries:
+                    raise RazorpayError(
+                        f"Razorpay request failed: {method} {path}: {e!r}", ambiguous=not not_sent
+                    ) from e
+            else:
+                if response.status_code < 400:
+                    return response.json()
+
+                retryable = response.status_code in RETRY_STATUS_CODES and (
+                    idempotent or response.status_code in NOT_PROCESSED_STATUS_CODES
+                )
+                if not retryable or attempt >= self.max_retries:
+                    try:
+                        error = response.json().get("error", {})
+                    except ValueError:
+                        error = {}
+                    raise RazorpayError(
+                        error.get("description") or f"Razorpay returned {response.status_code} for {method} {path}",
+                        status_code=response.status_code,
+                        error=error,
+                        ambiguous=response.status_code >= 500,
+                    )
+
+            delay = self._backoff(attempt)
+            attempt += 1
+            logger.warning(f"Retrying Razorpay {method} {path} in {delay:.2f}s (attempt {attempt}/{self.max_retries})")
+            await asyncio.sleep(delay)
+
+    async def find_order_by_receipt(self, receipt: str, created_after: Optional[int] = None) -> Optional[dict]:
+        """Newest order with this receipt (optionally created at or after a unix time), or None"""
+        params = {"receipt": receipt, "count": 1}
+        if created_after is not None:
+            params["from"] = created_after
+        result = await self.request("GET", "/orders", params=params)
+        items = result.get("items") or []
+        return items[0] if items else None
+
+    async def create_order(self, data: dict) -> dict:
+        """
+        Create an order. If the outcome is unknown (timeout or 5xx), an order
+        with the same receipt and amount created since this call started is
+        returned instead of posting a second one.
+        """
+        started = int(time.time()) - RECEIPT_LOOKUP_SKEW_SECONDS
+        try:
+            return await self.request("POST", "/orders", json=data)
+        except RazorpayError as e:
+            receipt = data.get("receipt")
+            if not e.ambiguous or not receipt:
+                raise
+            try:
+                existing = await self.find_order_by_receipt(receipt, created_after=started)
+            except RazorpayError:
+                existing = None
+            if existing is None or existing.get("amount") != data.get("amount"):
+                raise e
+            logger.info(f"Recovered Razorpay order {existing.get('id')} for receipt {receipt} after: {e}")
+            return existing
+
+    async def create_subscription(self, data: dict) -> dict:
+        return await self.request("POST", "/subscriptions", json=data)
+
+    async def fetch_subscription(self, subscription_id: str) -> dict:
+        return await self.request("GET", f"/subscriptions/{subscription_id}")
+
+    async def cancel_subscription(self, subscription_id: str) -> dict:
+        # Cancelling twice leaves the same end state, so the call can be retried
+        return await self.request("POST", f"/subscriptions/{subscription_id}/cancel", json={}, idempotent=True)
+
+    async def pause_subscription(self, subscription_id: str, data: dict) -> dict:
+        return await self.request("POST", f"/subscriptions/{subscription_id}/pause", json=data)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+razorpay_gateway = RazorpayGateway()
@@ -3,18 +3,29 @@ Razorpay Subscription Service
 Handles recurring/automatic billing for subscriptions
 """
 
-import razorpay
+import asyncio
+import time
 from datetime import datetime, timedelta
 from typing import Optional, Dict
 import logging
 
-from app.config.settings import RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from app.config import settings
+from app.database.job_locks import LeaseLost
 from app.database.mongodb import db
+from app.services.plan_catalog import plan_catalog
+from app.services.razorpay_gateway import razorpay_gateway
+from app.utils.auth_context import invalidate_auth_context
 
 logger = logging.getLogger(__name__)
 
-# Initialize Razorpay client
-razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
+
+def renewal_receipt(sub: Dict) -> str:
+    """Receipt identifying one subscription's renewal for one period (Razorpay allows 40 chars)"""
+    period_end = datetime.fromisoformat(sub['currentPeriodEnd']).strftime('%Y%m%d')
+    return f"rnw_{sub['_id']}_{period_end}"
 
 
 class RazorpaySubscriptionService:
@@ -82,7 +93,7 @@ class RazorpaySubscriptionService:
                 subscription_data['token'] = payment_method_id
             
             # Create Razorpay subscription
-            subscription = razorpay_client.subscription.create(subscription_data)
+            subscription = await razorpay_gateway.create_subscription(subscription_data)
             
             logger.info(f"✓ Razorpay subscription created: {subscription['id']} for user {owner_id}")
             return subscription
@@ -103,7 +114,7 @@ class RazorpaySubscriptionService:
             Dict with cancellation details
         """
         try:
-            subscription = razorpay_client.subscription.cancel(razorpay_subscription_id)
+            subscription = await razorpay_gateway.cancel_subscription(razorpay_subscription_id)
             logger.info(f"✓ Razorpay subscription cancelled: {razorpay_subscription_id}")
             return subscription
             
@@ -124,7 +135,7 @@ class RazorpaySubscriptionService:
             Dict with pause details
         """
         try:
-            subscription = razorpay_client.subscription.pause(
+            subscription = await razorpay_gateway.pause_subscription(
                 razorpay_subscription_id,
                 {'pause_at': 'now', 'resume_after': pause_months}
             )
@@ -147,7 +158,7 @@ class RazorpaySubscriptionService:
             Dict with subscription status
         """
         try:
-            subscription = razorpay_client.subscription.fetch(razorpay_subscription_id)
+            subscription = await razorpay_gateway.fetch_subscription(razorpay_subscription_id)
             return subscription
             
         except Exception as e:
@@ -155,10 +166,186 @@ class RazorpaySubscriptionService:
             raise
 
     @staticmethod
-    async def check_and_renew_subscriptions() -> Dict:
+    def _renewal_price(sub: Dict, user: Optional[Dict], plan: Optional[Dict]) -> tuple[int, Optional[str]]:
+        """(price, None) for a renewable subscription, or (0, reason) when it cannot be renewed"""
+        if not user or not user.get('razorpayCustomerId'):
+            return 0, f"User {sub['ownerId']} missing Razorpay customer ID"
+        if not plan:
+            return 0, f"Plan {sub['plan']} not found"
+
+        period_str = str(sub['period'])
+        price = plan['periods'].get(period_str, 0)
+        if price == 0:
+            return 0, f"Invalid price for {sub['plan']} {period_str}m"
+        return price, None
+
+    @staticmethod
+    async def _renew_one(
+        sub: Dict,
+        user: Dict,
+        price: int,
+        existing: Optional[Dict],
+        semaphore: asyncio.Semaphore,
+    ) -> Dict:
+        """
+        Create (or recover) the renewal order for one subscription.
+
+        `existing` is the renewal record a previous run left for this period, if
+        any: its order is reused, or looked up by receipt when that run stopped
+        between calling Razorpay and recording the order.
+
+        Returns {'sub', 'error'} on failure or {'sub', 'order', 'price', 'period'} on success;
+        database writes are left to the caller so they can be batched.
+        """
+        receipt = renewal_receipt(sub)
+        try:
+            new_period_start = datetime.fromisoformat(sub['currentPeriodEnd'])
+            new_period_end = new_period_start + timedelta(days=sub['period'] * 30)
+            async with semaphore:
+                order = None
+                if existing and existing.get('orderId'):
+                    order = {'id': existing['orderId']}
+                elif existing:
+                    order = await razorpay_gateway.find_order_by_receipt(receipt)
+                if order is None:
+                    # Create renewal via Razorpay subscription or order
+                    # For now, we'll create an order and track it. The receipt is fixed
+                    # per billing period so an order whose creation timed out is found
+                    # again instead of being created twice.
+                    order = await razorpay_gateway.create_order({
+                        'amount': price,
+                        'currency': 'INR',
+                        'receipt': receipt,
+                        'customer_id': user['razorpayCustomerId'],
+                        'description': f'Auto-renewal: {sub["plan"].title()} ({sub["period"]} months)',
+                        'notes': {
+                            'owner_id': sub['ownerId'],
+                            'plan': sub['plan'],
+                            'period': sub['period'],
+                            'renewal': 'true'
+                        }
+                    })
+        except Exception as e:
+            return {'sub': sub, 'error': str(e), 'record': True}
+        return {'sub': sub, 'order': order, 'price': price, 'period': (new_period_start, new_period_end)}
+
+    @staticmethod
+    async def _renew_batch(subs: list, plans: Dict, semaphore: asyncio.Semaphore, stats: Dict):
+        """
+        Renew a batch of subscriptions: one user query, concurrent orders, bulk writes.
+
+        A renewal record (_id = the period's receipt) is written for every
+        renewable subscription before any order is created. If the run dies
+        after Razorpay created an order but before it was recorded, the next
+        run finds the record and recovers the order instead of creating
+        another one.
+        """
+        owner_oids = [ObjectId(sub['ownerId']) for sub in subs if ObjectId.is_valid(sub['ownerId'])]
+        users = {
+            str(user['_id']): user
+            async for user in db.users.find({'_id': {'$in': owner_oids}}, {'razorpayCustomerId': 1})
+        }
+
+        now = datetime.now().isoformat()
+        outcomes = []
+        renewable = []
+        for sub in subs:
+            price, error = RazorpaySubscriptionService._renewal_price(sub, users.get(sub['ownerId']), plans.get(sub['plan']))
+            if error:
+                outcomes.append({'sub': sub, 'error': error, 'record': False})
+            else:
+                renewable.append((sub, price))
+
+        existing = {}
+        if renewable:
+            result = await db.renewal_orders.bulk_write([
+                UpdateOne(
+                    {'_id': renewal_receipt(sub)},
+                    {'$setOnInsert': {
+                        'ownerId': sub['ownerId'],
+                        'subscriptionId': sub['_id'],
+                        'receipt': renewal_receipt(sub),
+                        'plan': sub['plan'],
+                        'period': sub['period'],
+                        'amount': price,
+                        'orderId': None,
+                        'createdAt': now,
+                        'status': 'creating'
+                    }},
+                    upsert=True
+                )
+                for sub, price in renewable
+            ], ordered=False)
+            # Records that were not inserted now were left by an earlier run
+            earlier = [renewal_receipt(sub) for i, (sub, _) in enumerate(renewable) if i not in result.upserted_ids]
+            if earlier:
+                existing = {doc['_id']: doc async for doc in db.renewal_orders.find({'_id': {'$in': earlier}})}
+
+        outcomes.extend(await asyncio.gather(*(
+            RazorpaySubscriptionService._renew_one(
+                sub, users[sub['ownerId']], price, existing.get(renewal_receipt(sub)), semaphore
+            )
+            for sub, price in renewable
+        )))
+
+        subscription_updates = []
+        renewal_updates = []
+        renewed_owners = []
+        for outcome in outcomes:
+            sub = outcome['sub']
+            if 'error' in outcome:
+                stats['failed'] += 1
+                stats['errors'].append(outcome['error'])
+                if outcome['record']:
+                    logger.error(f"✗ Renewal failed for subscription {sub.get('_id')}: {outcome['error']}")
+                    # Update subscription with error
+                    subscription_updates.append(UpdateOne(
+                        {'_id': sub['_id']},
+                        {'$set': {'renewalError': outcome['error'], 'updatedAt': now}}
+                    ))
+                continue
+
+            order = outcome['order']
+            new_period_start, new_period_end = outcome['period']
+            subscription_updates.append(UpdateOne(
+                {'_id': sub['_id']},
+                {
+                    '$set': {
+                        'currentPeriodStart': new_period_start.isoformat(),
+                        'currentPeriodEnd': new_period_end.isoformat(),
+                        'renewalError': None,
+                        'updatedAt': now
+                    }
+                }
+            ))
+            # Record the order on the renewal record for payment verification
+            renewal_updates.append(UpdateOne(
+                {'_id': renewal_receipt(sub), 'status': 'creating'},
+                {'$set': {'orderId': order['id'], 'status': 'pending', 'updatedAt': now}}
+            ))
+            renewed_owners.append(sub['ownerId'])
+            stats['renewed'] += 1
+            logger.info(f"✓ Auto-renewal initiated for user {sub['ownerId']}: order {order['id']}")
+
+        # Orders are recorded before the periods move on, so a failure in
+        # between leaves records the next run can recover from
+        if renewal_updates:
+            await db.renewal_orders.bulk_write(renewal_updates, ordered=False)
+        if subscription_updates:
+            await db.subscriptions.bulk_write(subscription_updates, ordered=False)
+        for owner_id in renewed_owners:
+            invalidate_auth_context(owner_id)
+
+    @staticmethod
+    async def check_and_renew_subscriptions(fence=None) -> Dict:
         """
         Check for subscriptions expiring within 7 days and attempt renewal
         This is called by a scheduled job
+
+        Subscriptions are processed in batches of RENEWAL_BATCH_SIZE: owners are
+        prefetched with one $in query per batch, plans once per run, and
+        Razorpay orders run with at most RENEWAL_CONCURRENCY in flight.
+        `fence` (the job lease's check) is awaited before every batch.
         
         Returns:
             Dict with renewal statistics
@@ -169,6 +356,7 @@ class RazorpaySubscriptionService:
             'failed': 0,
             'errors': []
         }
+        start_time = time.perf_counter()
         
         try:
             # Find all active subscriptions expiring within 7 days
@@ -176,7 +364,10 @@ class RazorpaySubscriptionService:
             renewal_window_start = now.isoformat()
             renewal_window_end = (now + timedelta(days=7)).isoformat()
             
-            expiring_subs = await db.subscriptions.find({
+            plans = {plan['name']: plan for plan in await plan_catalog.all()}
+            semaphore = asyncio.Semaphore(max(1, settings.RENEWAL_CONCURRENCY))
+
+            expiring_subs = db.subscriptions.find({
                 'status': 'active',
                 'autoRenewal': True,
                 'plan': {'$ne': 'free'},  # Don't renew free plan
@@ -184,103 +375,37 @@ class RazorpaySubscriptionService:
                     '$gte': renewal_window_start,
                     '$lte': renewal_window_end
                 }
-            }).to_list(None)
-            
-            stats['checked'] = len(expiring_subs)
-            
-            for sub in expiring_subs:
-                try:
-                    # Get user and payment method info
-                    user = await db.users.find_one({'_id': sub['ownerId']})
-                    if not user or not user.get('razorpayCustomerId'):
-                        stats['failed'] += 1
-                        stats['errors'].append(f"User {sub['ownerId']} missing Razorpay customer ID")
-                        continue
-                    
-                    # Create renewal order via Razorpay API
-                    plan = await db.plans.find_one({'name': sub['plan']})
-                    if not plan:
-                        stats['failed'] += 1
-                        stats['errors'].append(f"Plan {sub['plan']} not found")
-                        continue
-                    
-                    period_str = str(sub['period'])
-                    price = plan['periods'].get(period_str, 0)
-                    
-                    if price == 0:
-                        stats['failed'] += 1
-                        stats['errors'].append(f"Invalid price for {sub['plan']} {period_str}m")
-                        continue
-                    
-                    # Create renewal via Razorpay subscription or order
-                    # For now, we'll create an order and track it
-                    order = razorpay_client.order.create({
-                        'amount': price,
-                        'currency': 'INR',
-                        'customer_id': user['razorpayCustomerId'],
-                        'description': f'Auto-renewal: {sub["plan"].title()} ({sub["period"]} months)',
-                        'notes': {
-                            'owner_id': sub['ownerId'],
-                            'plan': sub['plan'],
-                            'period': sub['period'],
-                            'renewal': 'true'
-                        }
-                    })
-                    
-                    # Update subscription with new order
-                    new_period_start = datetime.fromisoformat(sub['currentPeriodEnd'])
-                    new_period_end = new_period_start + timedelta(days=sub['period'] * 30)
-                    
-                    await db.subscriptions.update_one(
-                        {'_id': sub['_id']},
-                        {
-                            '$set': {
-                                'currentPeriodStart': new_period_start.isoformat(),
-                                'currentPeriodEnd': new_period_end.isoformat(),
-                                'renewalError': None,
-                                'updatedAt': datetime.now().isoformat()
-                            }
-                        }
-                    )
-                    
-                    # Store renewal order for payment verification
-                    await db.renewal_orders.insert_one({
-                        'ownerId': sub['ownerId'],
-                        'orderId': order['id'],
-                        'plan': sub['plan'],
-                        'period': sub['period'],
-                        'amount': price,
-                        'createdAt': datetime.now().isoformat(),
-                        'status': 'pending'
-                    })
-                    
-                    stats['renewed'] += 1
-                    logger.info(f"✓ Auto-renewal initiated for user {sub['ownerId']}: order {order['id']}")
-                    
-                except Exception as e:
-                    stats['failed'] += 1
-                    error_msg = str(e)
-                    stats['errors'].append(error_msg)
-                    logger.error(f"✗ Renewal failed for subscription {sub.get('_id')}: {error_msg}")
-                    
-                    # Update subscription with error
-                    await db.subscriptions.update_one(
-                        {'_id': sub['_id']},
-                        {
-                            '$set': {
-                                'renewalError': error_msg,
-                                'updatedAt': datetime.now().isoformat()
-                            }
-                        }
-                    )
-            
-            logger.info(f"Auto-renewal job completed: {stats['renewed']}/{stats['checked']} renewed, {stats['failed']} failed")
-            return stats
-            
+            }).sort('_id', 1)
+
+            batch = []
+            async for sub in expiring_subs:
+                batch.append(sub)
+                if len(batch) >= settings.RENEWAL_BATCH_SIZE:
+                    if fence:
+                        await fence()
+                    stats['checked'] += len(batch)
+                    await RazorpaySubscriptionService._renew_batch(batch, plans, semaphore, stats)
+                    batch = []
+            if batch:
+                if fence:
+                    await fence()
+                stats['checked'] += len(batch)
+                await RazorpaySubscriptionService._renew_batch(batch, plans, semaphore, stats)
+
+        except LeaseLost:
+            raise
         except Exception as e:
             logger.error(f"✗ Auto-renewal job failed: {str(e)}")
             stats['errors'].append(str(e))
-            return stats
+
+        elapsed = time.perf_counter() - start_time
+        stats['duration_ms'] = int(elapsed * 1000)
+        stats['per_second'] = round(stats['checked'] / elapsed, 1) if elapsed > 0 else 0.0
+        logger.info(
+            f"Auto-renewal job completed: {stats['renewed']}/{stats['checked']} renewed, {stats['failed']} failed "
+            f"in {stats['duration_ms']}ms ({stats['per_second']}/s)"
+        )
+        return stats
 
     @staticmethod
     async def handle_subscription_payment_success(order_id: str, payment_id: str) -> bool:
@@ -1,12 +1,16 @@
 from app.models.room_schema import Room
-from app.database.mongodb import getCollection
+from app.database.mongodb import getCollection, run_in_transaction
 from datetime import datetime,timezone
+from typing import Optional
 from bson import ObjectId
+from pymongo import DeleteMany, UpdateOne
 from app.services.bed_service import BedService
-from app.models.bed_schema import BedCreate
+from app.services.property_stats_service import PropertyStatsService, QuotaReservation, consume_reservation
+from app.utils.room_helpers import bed_number_value, displaced_tenant_count, plan_bed_reduction
 
 
 bed_service = BedService()
+property_stats_service = PropertyStatsService()
 class RoomService:
 
     def __init__(self):
@@ -30,7 +34,7 @@ class RoomService:
             return Room(**doc)
         return None
 
-    async def create_room(self, room_data: dict):
+    async def create_room(self, room_data: dict, quota_reserved: Optional[QuotaReservation] = None):
         now = datetime.now(timezone.utc).isoformat()
         if not room_data.get("createdAt"):
             room_data["createdAt"] = now
@@ -49,20 +53,16 @@ class RoomService:
             raise ValueError(f"Room number '{room_data['roomNumber']}' already exists for this property")
         
         result = await self.collection.insert_one(room_data)
+        # The room exists from here on, so its reservation is used up
+        await property_stats_service.record_change("rooms", after=room_data, reserved=consume_reservation(quota_reserved))
         room_data["id"] = str(result.inserted_id)
         # Auto-create beds for this room
         number_of_beds = room_data.get("numberOfBeds", 0)
-        property_id = room_data["propertyId"]
-        room_id = room_data["id"]
-        for i in range(1, number_of_beds + 1):
-            bed = BedCreate(
-                propertyId=property_id,
-                roomId=room_id,
-                bedNumber=str(i),
-                status="available",
-                ownerId=room_data.get("ownerId")
-            )
-            await bed_service.create_bed(bed)
+        await bed_service.create_beds_bulk(
+            room_data["propertyId"],
+            room_data["id"],
+            [str(i) for i in range(1, number_of_beds + 1)],
+        )
         return Room(**room_data)
 
     async def update_room(self, room_id: str, room_data: dict):
@@ -92,9 +92,6 @@ class RoomService:
     
     async def _handle_bed_count_change(self, room_id: str, room_data: dict):
         """Handle changes in number of beds - relocate or vacate tenants as needed"""
-        beds_collection = getCollection("beds")
-        tenants_collection = getCollection("tenants")
-        
         # Get current room to compare
         current_room = await self.collection.find_one({"_id": ObjectId(room_id)})
         if not current_room:
@@ -105,87 +102,87 @@ class RoomService:
         property_id = room_data.get("propertyId") or current_room.get("propertyId")
         
         if new_bed_count < current_bed_count:
-            # Reducing beds - handle affected tenants
-            # Get beds that will be removed (bed numbers > new_bed_count)
-            beds_to_remove = await beds_collection.find({
-                "roomId": room_id,
-                "bedNumber": {"$gt": str(new_bed_count)}
-            }).to_list(None)
-            
-            for bed in beds_to_remove:
-                tenant_id = bed.get("tenantId")
-                if tenant_id:
-                    # First, try to find an available bed in the SAME ROOM
-                    available_bed = await beds_collection.find_one({
-                        "roomId": room_id,
-                        "status": "available",
-                        "bedNumber": {"$lte": str(new_bed_count)},
-                        "_id": {"$ne": bed["_id"]}
-                    })
-                    
-                    # If no available bed in same room, try same property
-                    if not available_bed:
-                        available_bed = await beds_collection.find_one({
-                            "propertyId": property_id,
-                            "roomId": {"$ne": room_id},
-                            "status": "available",
-                            "_id": {"$ne": bed["_id"]}
-                        })
-                    
-                    if available_bed:
-                        # Move tenant to available bed
-                        await beds_collection.update_one(
-                            {"_id": available_bed["_id"]},
-                            {
-                                "$set": {
-                                    "status": "occupied",
-                                    "tenantId": tenant_id,
-                                    "updatedAt": datetime.now(timezone.utc).isoformat()
-                                }
-                            }
-                        )
-                        # Update tenant's bedId and roomId if relocated to different room
-                        update_data = {
-                            "bedId": str(available_bed["_id"]),
-                            "updatedAt": datetime.now(timezone.utc).isoformat()
-                        }
-                        if str(available_bed.get("roomId")) != room_id:
-                            update_data["roomId"] = str(available_bed["roomId"])
-                        
-                        await tenants_collection.update_one(
-                            {"_id": ObjectId(tenant_id)},
-                            {"$set": update_data}
-                        )
-                    else:
-                        # No available bed - mark tenant as vacated
-                        await tenants_collection.update_one(
-                            {"_id": ObjectId(tenant_id)},
-                            {
-                                "$set": {
-                                    "tenantStatus": "vacated",
-                                    "checkoutDate": datetime.now(timezone.utc).isoformat(),
-                                    "billingConfig": None,
-                                    "updatedAt": datetime.now(timezone.utc).isoformat()
-                                }
-                            }
-                        )
-                
-                # Delete the bed
-                await beds_collection.delete_one({"_id": bed["_id"]})
+            # Reducing beds - relocate or vacate affected tenants in one go.
+            # Planning reads inside the transaction too, so a bed taken
+            # concurrently surfaces as a write conflict and the whole resize retries.
+            async def reduce(session):
+                plan = await self._plan_bed_reduction(room_id, property_id, new_bed_count, session)
+                await self._apply_bed_reduction(room_id, plan, session)
+
+            await run_in_transaction(reduce)
+
+            # Beds and tenants were moved with direct writes
+            await property_stats_service.rebuild(property_id)
         
         elif new_bed_count > current_bed_count:
             # Increasing beds - create new beds
-            owner_id = current_room.get("ownerId")
-            for i in range(current_bed_count + 1, new_bed_count + 1):
-                bed = BedCreate(
-                    propertyId=property_id,
-                    roomId=room_id,
-                    bedNumber=str(i),
-                    status="available",
-                    ownerId=owner_id
-                )
-                await bed_service.create_bed(bed)
+            await bed_service.create_beds_bulk(
+                property_id,
+                room_id,
+                [str(i) for i in range(current_bed_count + 1, new_bed_count + 1)],
+            )
     
+    async def _plan_bed_reduction(self, room_id: str, property_id: str, new_bed_count: int, session=None) -> dict:
+        """Load the free beds a reduction can use and plan it (see plan_bed_reduction)"""
+        beds_collection = getCollection("beds")
+        room_beds = await beds_collection.find({"roomId": room_id}, session=session).to_list(None)
+
+        # Only look at other rooms for tenants the room itself cannot absorb
+        free_in_room = sum(
+            1 for bed in room_beds
+            if bed.get("status") == "available" and (bed_number_value(bed) or 0) <= new_bed_count
+        )
+        needed = displaced_tenant_count(room_beds, new_bed_count) - free_in_room
+        other_free_beds = []
+        if needed > 0:
+            other_free_beds = await beds_collection.find({
+                "propertyId": property_id,
+                "roomId": {"$ne": room_id},
+                "status": "available"
+            }, session=session).sort([("roomId", 1), ("_id", 1)]).limit(needed).to_list(None)
+
+        return plan_bed_reduction(room_id, new_bed_count, room_beds, other_free_beds)
+
+    async def _apply_bed_reduction(self, room_id: str, plan: dict, session=None):
+        """Write a reduction plan with one bulk_write per collection"""
+        now = datetime.now(timezone.utc).isoformat()
+        bed_ops = []
+        tenant_ops = []
+        for move in plan["moves"]:
+            target = move["toBed"]
+            bed_ops.append(UpdateOne(
+                {"_id": target["_id"]},
+                {"$set": {"status": "occupied", "tenantId": move["tenantId"], "updatedAt": now}}
+            ))
+            # Update tenant's bedId and roomId if relocated to different room
+            update_data = {"bedId": str(target["_id"]), "updatedAt": now}
+            if str(target.get("roomId")) != room_id:
+                update_data["roomId"] = str(target["roomId"])
+            if ObjectId.is_valid(move["tenantId"]):
+                tenant_ops.append(UpdateOne({"_id": ObjectId(move["tenantId"])}, {"$set": update_data}))
+
+        for vacate in plan["vacates"]:
+            # No available bed - mark tenant as vacated
+            if ObjectId.is_valid(vacate["tenantId"]):
+                tenant_ops.append(UpdateOne(
+                    {"_id": ObjectId(vacate["tenantId"])},
+                    {"$set": {
+                        "tenantStatus": "vacated",
+                        "checkoutDate": now,
+                        "billingConfig": None,
+                        "nextDueDate": None,
+                        "updatedAt": now
+                    }}
+                ))
+
+        if plan["bedsToRemove"]:
+            bed_ops.append(DeleteMany({"_id": {"$in": [bed["_id"] for bed in plan["bedsToRemove"]]}}))
+
+        if bed_ops:
+            await getCollection("beds").bulk_write(bed_ops, ordered=True, session=session)
+        if tenant_ops:
+            await getCollection("tenants").bulk_write(tenant_ops, ordered=False, session=session)
+
     async def preview_bed_count_change(self, room_id: str, new_bed_count: int):
         """Preview what will happen if bed count is changed"""
         beds_collection = getCollection("beds")
@@ -206,60 +203,39 @@ class RoomService:
         }
         
         if new_bed_count < current_bed_count:
-            # Count available beds in same room first
-            available_beds_same_room = await beds_collection.count_documents({
-                "roomId": room_id,
-                "status": "available",
-                "bedNumber": {"$lte": str(new_bed_count)}
-            })
+            # Same planner as the actual resize, so preview and apply agree
+            plan = await self._plan_bed_reduction(room_id, property_id, new_bed_count)
             
+            result["availableBedsInSameRoom"] = plan["availableBedsInSameRoom"]
             # Count available beds in other rooms of same property
-            available_beds_other_rooms = await beds_collection.count_documents({
+            result["availableBedsInProperty"] = await beds_collection.count_documents({
                 "propertyId": property_id,
                 "status": "available",
                 "roomId": {"$ne": room_id}
             })
             
-            result["availableBedsInSameRoom"] = available_beds_same_room
-            result["availableBedsInProperty"] = available_beds_other_rooms
+            affected = [
+                (move["tenantId"], move["fromBed"], "relocate", move["location"]) for move in plan["moves"]
+            ] + [
+                (vacate["tenantId"], vacate["fromBed"], "vacate", None) for vacate in plan["vacates"]
+            ]
+            affected.sort(key=lambda item: bed_number_value(item[1]) or 0)
+            tenant_ids = [ObjectId(tenant_id) for tenant_id, *_ in affected if ObjectId.is_valid(tenant_id)]
+            tenants = {
+                str(doc["_id"]): doc
+                async for doc in tenants_collection.find({"_id": {"$in": tenant_ids}}, {"name": 1})
+            }
             
-            # Get beds that will be removed
-            beds_to_remove = await beds_collection.find({
-                "roomId": room_id,
-                "bedNumber": {"$gt": str(new_bed_count)}
-            }).to_list(None)
-            
-            available_same_room_index = 0
-            available_other_room_index = 0
-            
-            for bed in beds_to_remove:
-                tenant_id = bed.get("tenantId")
-                if tenant_id:
-                    tenant = await tenants_collection.find_one({"_id": ObjectId(tenant_id)})
-                    if tenant:
-                        # Determine action: try same room first, then other rooms
-                        will_relocate_same_room = available_same_room_index < available_beds_same_room
-                        will_relocate_other_room = not will_relocate_same_room and available_other_room_index < available_beds_other_rooms
-                        
-                        action = "vacate"
-                        location = None
-                        
-                        if will_relocate_same_room:
-                            action = "relocate"
-                            location = "same_room"
-                            available_same_room_index += 1
-                        elif will_relocate_other_room:
-                            action = "relocate"
-                            location = "other_room"
-                            available_other_room_index += 1
-                        
-                        result["affectedTenants"].append({
-                            "id": str(tenant["_id"]),
-                            "name": tenant.get("name"),
-                            "bedNumber": bed.get("bedNumber"),
-                            "action": action,
-                            "location": location
-                        })
+            for tenant_id, bed, action, location in affected:
+                tenant = tenants.get(tenant_id)
+                if tenant:
+                    result["affectedTenants"].append({
+                        "id": tenant_id,
+                        "name": tenant.get("name"),
+                        "bedNumber": bed.get("bedNumber"),
+                        "action": action,
+                        "location": location
+                    })
         
         return result
 
@@ -303,5 +279,7 @@ class RoomService:
             )
         
         # Delete the room
-        await self.collection.delete_one({"_id": ObjectId(room_id)})
+        room = await self.collection.find_one_and_delete({"_id": ObjectId(room_id)})
+        if room and room.get("propertyId"):
+            await property_stats_service.rebuild(room["propertyId"])
         return {"success": True, "roomId": room_id}
@@ -1,7 +1,13 @@
 from app.models.staff_schema import Staff, StaffOut, StaffCreate, StaffUpdate
 from app.database.mongodb import getCollection
+from app.services.property_stats_service import PropertyStatsService, QuotaReservation, consume_reservation
 from datetime import datetime, timezone
+from typing import Optional
 from bson import ObjectId
+from pymongo import ReturnDocument
+from app.utils.pagination import DESCENDING, apply_cursor, next_cursor, sort_spec
+
+property_stats_service = PropertyStatsService()
 
 
 class StaffService:
@@ -15,8 +21,13 @@ class StaffService:
         role: str = None,
         skip: int = 0,
         limit: int = 50,
+        cursor: str = None,
+        with_total: bool = True,
     ):
-        """Get list of staff with optional filtering"""
+        """
+        Get list of staff with optional filtering, newest first.
+        Returns (staff, total, next_cursor); see TenantService.get_tenants.
+        """
         query = {}
         
         if property_id:
@@ -35,15 +46,20 @@ class StaffService:
         # Filter out archived by default
         query["archived"] = False
 
-        total = await self.collection.count_documents(query)
+        total = await self.collection.count_documents(query) if with_total else None
 
-        staff_list = await self.collection.find(query).skip(skip).limit(limit).sort(
-            "_id", -1
-        ).to_list(length=limit)
+        find_cursor = self.collection.find(apply_cursor(query, "_id", DESCENDING, cursor)).sort(
+            sort_spec("_id", DESCENDING)
+        )
+        if not cursor:
+            find_cursor = find_cursor.skip(skip)
+        staff_list = await find_cursor.limit(limit + 1).to_list(length=limit + 1)
+        has_more = len(staff_list) > limit
+        staff_list = staff_list[:limit]
 
         return [
             self._convert_to_out(staff) for staff in staff_list
-        ], total
+        ], total, next_cursor(staff_list[-1], "_id") if has_more else None
 
     async def get_staff(self, staff_id: str) -> StaffOut:
         """Get single staff by ID"""
@@ -53,14 +69,16 @@ class StaffService:
         except Exception:
             return None
 
-    async def create_staff(self, staff_data: dict) -> StaffOut:
-        """Create new staff member"""
+    async def create_staff(self, staff_data: dict, quota_reserved: Optional[QuotaReservation] = None) -> StaffOut:
+        """Create new staff member (quota_reserved: the staff quota reservation taken by the caller)"""
         staff_data["createdAt"] = datetime.now(timezone.utc).isoformat()
         staff_data["updatedAt"] = datetime.now(timezone.utc).isoformat()
         staff_data["archived"] = False
 
         result = await self.collection.insert_one(staff_data)
+        reserved = consume_reservation(quota_reserved)
         created_staff = await self.collection.find_one({"_id": result.inserted_id})
+        await property_stats_service.record_change("staff", after=created_staff, reserved=reserved)
         return self._convert_to_out(created_staff)
 
     async def update_staff(self, staff_id: str, staff_data: dict) -> StaffOut:
@@ -68,27 +86,37 @@ class StaffService:
         staff_data["updatedAt"] = datetime.now(timezone.utc).isoformat()
 
         try:
-            result = await self.collection.find_one_and_update(
+            before = await self.collection.find_one_and_update(
                 {"_id": ObjectId(staff_id)},
                 {"$set": staff_data},
-                return_document=True,
+                return_document=ReturnDocument.BEFORE,
             )
-            return self._convert_to_out(result) if result else None
+            if not before:
+                return None
+            result = {**before, **staff_data}
+            await property_stats_service.record_change("staff", before, result)
+            return self._convert_to_out(result)
         except Exception:
             return None
 
     async def delete_staff(self, staff_id: str) -> bool:
-        """Delete staff member (soft delete by archiving)"""
+        """Delete staff member (soft delete by archiving); False if missing or already archived"""
         try:
             update_data = {
                 "archived": True,
                 "archivedAt": datetime.now(timezone.utc).isoformat(),
                 "updatedAt": datetime.now(timezone.utc).isoformat(),
             }
-            result = await self.collection.update_one(
-                {"_id": ObjectId(staff_id)}, {"$set": update_data}
+            # Only an actual transition counts: re-archiving would neither
+            # change the counters nor keep the original archivedAt
+            before = await self.collection.find_one_and_update(
+                {"_id": ObjectId(staff_id), "archived": {"$ne": True}}, {"$set": update_data},
+                return_document=ReturnDocument.BEFORE,
             )
-            return result.modified_count > 0
+            if not before:
+                return False
+            await property_stats_service.record_change("staff", before, {**before, **update_data})
+            return True
         except Exception:
             return False
 
@@ -101,10 +129,15 @@ class StaffService:
                 "archivedAt": None,
                 "updatedAt": datetime.now(timezone.utc).isoformat(),
             }
-            result = await self.collection.find_one_and_update(
-                {"_id": ObjectId(staff_id)}, {"$set": update_data}, return_document=True
+            before = await self.collection.find_one_and_update(
+                {"_id": ObjectId(staff_id)}, {"$set": update_data},
+                return_document=ReturnDocument.BEFORE,
             )
-            return self._convert_to_out(result) if result else None
+            if not before:
+                return None
+            result = {**before, **update_data}
+            await property_stats_service.record_change("staff", before, result)
+            return self._convert_to_out(result)
         except Exception:
             return None
 
@@ -4,16 +4,134 @@ Checks quota limits and subscription status before allowing resource creation
 Also enforces archival status to prevent modification of suspended resources
 """
 
-from fastapi import HTTPException, status
+from contextlib import asynccontextmanager
+from fastapi import HTTPException, Request, status
 from app.services.subscription_service import SubscriptionService
+from app.services.owner_usage_service import OwnerUsageService
+from app.services.property_stats_service import QUOTA_FIELDS, PropertyStatsService, QuotaReservation
 from app.database.mongodb import db
 from bson import ObjectId
-from typing import Literal
+from typing import List, Optional
 from app.utils.ownership import build_owner_query, property_belongs_to_owner
 import logging
 
 logger = logging.getLogger(__name__)
 
+property_stats_service = PropertyStatsService()
+owner_usage_service = OwnerUsageService()
+
+# Used when the subscription's plan is missing from the catalog
+FALLBACK_LIMITS = {"properties": 1, "tenants": 80, "rooms": 30, "staff": 3}
+
+# Per resource: what an expired subscription may not do, and the quota exceeded message
+QUOTA_RULES = {
+    "properties": (
+        "create properties",
+        "You've reached the limit of {limit} properties on {plan} plan. Upgrade your subscription to add more properties.",
+    ),
+    "tenants": (
+        "create tenants",
+        "You've reached the limit of {limit} tenants per property on {plan} plan. Upgrade your subscription to add more tenants.",
+    ),
+    "rooms": (
+        "create rooms",
+        "You've reached the limit of {limit} rooms per property. Delete some rooms or upgrade your subscription.",
+    ),
+    "staff": (
+        "add staff members",
+        "You've reached the limit of {limit} staff members on {plan} plan. Upgrade your subscription to add more staff.",
+    ),
+}
+
+
+class EnforcementContext:
+    """
+    What quota checks need to know about one owner, loaded once.
+
+    Built from request.state it costs no database reads: the middleware
+    already loaded the subscription and the owned property ids, and plan
+    limits come from the in-memory plan catalog. A per-property check then
+    reads a single property_stats counter.
+    """
+
+    def __init__(self, owner_id: str, subscription, property_ids: List[str], limits: dict):
+        self.owner_id = owner_id
+        self.subscription = subscription
+        self.property_ids = property_ids
+        self.limits = limits
+
+    @classmethod
+    async def for_owner(cls, owner_id: str, subscription=None, property_ids: Optional[List[str]] = None) -> "EnforcementContext":
+        """Load whatever the caller did not already have"""
+        if subscription is None:
+            subscription = await SubscriptionService.get_subscription(owner_id)
+        if property_ids is None:
+            owned_properties = await db["properties"].find(
+                build_owner_query(owner_id),
+                {"_id": 1}
+            ).to_list(length=None)
+            property_ids = [str(doc["_id"]) for doc in owned_properties]
+
+        limits = await SubscriptionService.get_plan_limits(subscription.plan)
+        if not limits:
+            logger.warning(f"Plan {subscription.plan} not found in database, using fallback limits")
+            limits = FALLBACK_LIMITS
+        return cls(owner_id, subscription, property_ids, limits)
+
+    @classmethod
+    async def from_request(cls, request: Request) -> "EnforcementContext":
+        """Context for the authenticated user, reusing what UserContextMiddleware loaded"""
+        return await cls.for_owner(
+            request.state.user_id,
+            subscription=getattr(request.state, "subscription", None),
+            property_ids=getattr(request.state, "property_ids", None),
+        )
+
+    @property
+    def plan(self) -> str:
+        return self.subscription.plan
+
+    async def ensure_owns(self, property_id: str) -> None:
+        """
+        Allow properties in the (possibly cached) owned list at no cost. A
+        miss is re-checked in the database, because the list can predate a
+        property that was just created or shared: 404 if the property does
+        not exist, 403 if it belongs to someone else.
+        """
+        if property_id in self.property_ids:
+            return
+
+        property_doc = None
+        if ObjectId.is_valid(property_id):
+            property_doc = await db["properties"].find_one(
+                {"_id": ObjectId(property_id)},
+                {"ownerIds": 1, "ownerId": 1}
+            )
+        if not property_doc:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Property not found"
+            )
+        if not property_belongs_to_owner(property_doc, self.owner_id):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="This property does not belong to you"
+            )
+        self.property_ids = [*self.property_ids, property_id]
+
+    def ensure_active(self, action: str) -> None:
+        if self.subscription.status == "expired":
+            raise HTTPException(
+                status_code=status.HTTP_402_PAYMENT_REQUIRED,
+                detail=f"Subscription expired on {self.subscription.currentPeriodEnd}. Please renew to {action}."
+            )
+
+    async def property_usage(self, property_id: str, resource: str) -> int:
+        """Current number of `resource` (tenants, rooms, staff) in a property"""
+        field = QUOTA_FIELDS[resource]
+        counters = await property_stats_service.get_counters(property_id, [field])
+        return counters[field]
+
 
 class SubscriptionEnforcement:
     """
@@ -34,266 +152,131 @@ class SubscriptionEnforcement:
     """
 
     @staticmethod
-    async def ensure_can_create_property(owner_id: str) -> None:
+    async def _check(resource: str, owner_id: str, property_id: Optional[str], context: Optional[EnforcementContext], reserve: bool) -> EnforcementContext:
         """
-        Check if owner can create a new property.
-        
-        Raises:
-            HTTPException 402: If subscription is expired or quota exceeded
+        Verify ownership, subscription status and quota for one new `resource`.
+        With reserve=True the quota slot is taken atomically (see reserve()).
         """
+        action, message = QUOTA_RULES[resource]
         try:
-            # Get subscription
-            sub = await SubscriptionService.get_subscription(owner_id)
-
-            # Check subscription status
-            if sub.status == "expired":
+            ctx = context or await EnforcementContext.for_owner(owner_id)
+            if property_id is not None:
+                await ctx.ensure_owns(property_id)
+            ctx.ensure_active(action)
+
+            limit = ctx.limits[resource]
+            if reserve:
+                if resource == "properties":
+                    allowed = await owner_usage_service.reserve_property(owner_id, limit)
+                else:
+                    allowed = await property_stats_service.reserve(property_id, QUOTA_FIELDS[resource], limit)
+                current = None
+            else:
+                if resource == "properties":
+                    # Owned properties are already known
+                    current = len(ctx.property_ids)
+                else:
+                    current = await ctx.property_usage(property_id, resource)
+                allowed = current < limit
+
+            if not allowed:
                 raise HTTPException(
                     status_code=status.HTTP_402_PAYMENT_REQUIRED,
-                    detail=f"Subscription expired on {sub.currentPeriodEnd}. Please renew to create properties."
+                    detail=message.format(limit=limit, plan=ctx.plan.title())
                 )
 
-            # Get plan limits
-            limits = await SubscriptionService.get_plan_limits(sub.plan)
-            
-            # If plan not found in database, use fallback limits
-            if not limits:
-                logger.warning(f"Plan {sub.plan} not found in database, using fallback limits")
-                limits = {"properties": 1, "tenants": 80, "rooms": 30, "staff": 3}
-
-            # Count existing properties using string owner_id
-            current = await db["properties"].count_documents(build_owner_query(owner_id))
-
-            # Check quota
-            if current >= limits["properties"]:
-                raise HTTPException(
-                    status_code=status.HTTP_402_PAYMENT_REQUIRED,
-                    detail=f"You've reached the limit of {limits['properties']} properties on {sub.plan.title()} plan. "
-                            f"Upgrade your subscription to add more properties."
-                )
-
-            logger.info(
-                f"Property creation allowed for {owner_id} ({sub.plan} plan, {current}/{limits['properties']} used)"
-            )
+            usage = "reserved" if current is None else f"{current}/{limit} used"
+            logger.info(f"{resource.title()} creation allowed for {owner_id} ({ctx.plan} plan, {usage})")
+            return ctx
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error checking property quota: {str(e)}")
+            logger.error(f"Error checking {resource} quota: {str(e)}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Error checking subscription quota. Please try again."
             )
 
     @staticmethod
-    async def ensure_can_create_tenant(owner_id: str, property_id: str) -> None:
+    @asynccontextmanager
+    async def reserve(resource: str, owner_id: str, property_id: Optional[str] = None, context: Optional[EnforcementContext] = None):
         """
-        Check if owner can create a new tenant under this property.
-        
+        Reserve quota for one new resource ("properties", "tenants", "rooms" or "staff")
+        around its creation:
+
+            async with SubscriptionEnforcement.reserve("tenants", owner_id, property_id) as reservation:
+                await tenant_service.create_tenant(data, quota_reserved=reservation)
+
+        The limit check and the counter increment are a single conditional
+        $inc, so concurrent creations at limit-1 cannot both pass. The create
+        marks the yielded QuotaReservation consumed once the resource exists,
+        turning the reservation into the count. If the block raises before
+        that, the reservation is given back; after it, a failing later step
+        (e.g. creating a room's beds) leaves it alone.
+
         Raises:
-            HTTPException 402: If subscription is expired or tenant quota exceeded per property
+            HTTPException 402: If subscription is expired or quota exceeded
             HTTPException 403: If property doesn't belong to this owner
+            HTTPException 404: If property doesn't exist
         """
+        await SubscriptionEnforcement._check(resource, owner_id, property_id, context, reserve=True)
+        reservation = QuotaReservation()
         try:
-            # Verify property ownership
-            property_doc = await db["properties"].find_one(
-                {"_id": ObjectId(property_id)}
-            )
-
-            if not property_doc:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Property not found"
-                )
-
-            if not property_belongs_to_owner(property_doc, owner_id):
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="This property does not belong to you"
-                )
-
-            # Get subscription
-            sub = await SubscriptionService.get_subscription(owner_id)
-
-            # Check subscription status
-            if sub.status == "expired":
-                raise HTTPException(
-                    status_code=status.HTTP_402_PAYMENT_REQUIRED,
-                    detail=f"Subscription expired on {sub.currentPeriodEnd}. Please renew to create tenants."
-                )
-
-            # Get plan limits
-            limits = await SubscriptionService.get_plan_limits(sub.plan)
-            
-            # If plan not found in database, use fallback limits
-            if not limits:
-                logger.warning(f"Plan {sub.plan} not found in database, using fallback limits")
-                limits = {"properties": 1, "tenants": 80, "rooms": 30, "staff": 3}
-
-            # Count existing tenants in THIS property only (not across all properties)
-            current = await db["tenants"].count_documents(
-                {"propertyId": property_id}
-            )
+            yield reservation
+        except BaseException:
+            if reservation.consumed:
+                raise
+            if resource == "properties":
+                await owner_usage_service.release_reservation(owner_id)
+            else:
+                await property_stats_service.release(property_id, QUOTA_FIELDS[resource])
+            raise
 
-            # Check quota (max tenants per property)
-            if current >= limits["tenants"]:
-                raise HTTPException(
-                    status_code=status.HTTP_402_PAYMENT_REQUIRED,
-                    detail=f"You've reached the limit of {limits['tenants']} tenants per property on {sub.plan.title()} plan. "
-                            f"Upgrade your subscription to add more tenants."
-                )
+    @staticmethod
+    async def ensure_can_create_property(owner_id: str, context: Optional[EnforcementContext] = None) -> None:
+        """
+        Check if owner can create a new property (without reserving it; see reserve()).
+        
+        Raises:
+            HTTPException 402: If subscription is expired or quota exceeded
+        """
+        await SubscriptionEnforcement._check("properties", owner_id, None, context, reserve=False)
 
-            logger.info(
-                f"Tenant creation allowed for {owner_id} ({sub.plan} plan, {current}/{limits['tenants']} tenants in this property)"
-            )
-        except HTTPException:
-            raise
-        except Exception as e:
-            logger.error(f"Error checking tenant quota: {str(e)}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Error checking subscription quota. Please try again."
-            )
+    @staticmethod
+    async def ensure_can_create_tenant(owner_id: str, property_id: str, context: Optional[EnforcementContext] = None) -> None:
+        """
+        Check if owner can create a new tenant under this property (without reserving it).
+        
+        Raises:
+            HTTPException 402: If subscription is expired or tenant quota exceeded per property
+            HTTPException 403: If property doesn't belong to this owner
+            HTTPException 404: If property doesn't exist
+        """
+        await SubscriptionEnforcement._check("tenants", owner_id, property_id, context, reserve=False)
 
     @staticmethod
-    async def ensure_can_create_room(owner_id: str, property_id: str) -> None:
+    async def ensure_can_create_room(owner_id: str, property_id: str, context: Optional[EnforcementContext] = None) -> None:
         """
-        Check if owner can create a new room in this property.
+        Check if owner can create a new room in this property (without reserving it).
         
         Raises:
             HTTPException 402: If subscription is expired or room quota exceeded per property
             HTTPException 403: If property doesn't belong to this owner
+            HTTPException 404: If property doesn't exist
         """
-        try:
-            # Verify property ownership
-            property_doc = await db["properties"].find_one(
-                {"_id": ObjectId(property_id)}
-            )
-
-            if not property_doc:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Property not found"
-                )
-
-            if not property_belongs_to_owner(property_doc, owner_id):
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="This property does not belong to you"
-                )
-
-            # Get subscription
-            sub = await SubscriptionService.get_subscription(owner_id)
-
-            # Check subscription status
-            if sub.status == "expired":
-                raise HTTPException(
-                    status_code=status.HTTP_402_PAYMENT_REQUIRED,
-                    detail=f"Subscription expired on {sub.currentPeriodEnd}. Please renew to create rooms."
-                )
-
-            # Get plan limits
-            limits = await SubscriptionService.get_plan_limits(sub.plan)
-            
-            # If plan not found in database, use fallback limits
-            if not limits:
-                logger.warning(f"Plan {sub.plan} not found in database, using fallback limits")
-                limits = {"properties": 1, "tenants": 80, "rooms": 30, "staff": 3}
-
-            # Count existing rooms in THIS property
-            current = await db["rooms"].count_documents(
-                {"propertyId": property_id}
-            )
-
-            # Check quota (30 rooms per property)
-            room_limit = limits["rooms"]
-            if current >= room_limit:
-                raise HTTPException(
-                    status_code=status.HTTP_402_PAYMENT_REQUIRED,
-                    detail=f"You've reached the limit of {room_limit} rooms per property. "
-                            f"Delete some rooms or upgrade your subscription."
-                )
-
-            logger.info(
-                f"Room creation allowed for {owner_id} ({sub.plan} plan, {current}/{room_limit} rooms in property)"
-            )
-        except HTTPException:
-            raise
-        except Exception as e:
-            logger.error(f"Error checking room quota: {str(e)}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Error checking subscription quota. Please try again."
-            )
+        await SubscriptionEnforcement._check("rooms", owner_id, property_id, context, reserve=False)
 
     @staticmethod
-    async def ensure_can_create_staff(owner_id: str, property_id: str) -> None:
+    async def ensure_can_create_staff(owner_id: str, property_id: str, context: Optional[EnforcementContext] = None) -> None:
         """
-        Check if owner can create a new staff member in this property.
+        Check if owner can create a new staff member in this property (without reserving it).
         
         Raises:
             HTTPException 402: If subscription is expired or staff quota exceeded
             HTTPException 403: If property doesn't belong to this owner
+            HTTPException 404: If property doesn't exist
         """
-        try:
-            # Verify property ownership
-            property_doc = await db["properties"].find_one(
-                {"_id": ObjectId(property_id)}
-            )
-
-            if not property_doc:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Property not found"
-                )
-
-            if not property_belongs_to_owner(property_doc, owner_id):
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="This property does not belong to you"
-                )
-
-            # Get subscription
-            sub = await SubscriptionService.get_subscription(owner_id)
-
-            # Check subscription status
-            if sub.status == "expired":
-                raise HTTPException(
-                    status_code=status.HTTP_402_PAYMENT_REQUIRED,
-                    detail=f"Subscription expired on {sub.currentPeriodEnd}. Please renew to add staff members."
-                )
-
-            # Get plan limits
-            limits = await SubscriptionService.get_plan_limits(sub.plan)
-            
-            # If plan not found in database, use fallback limits
-            if not limits:
-                logger.warning(f"Plan {sub.plan} not found in database, using fallback limits")
-                limits = {"properties": 1, "tenants": 80, "rooms": 30, "staff": 3}
-
-            # Count existing staff in THIS property (not archived)
-            current = await db["staff"].count_documents(
-                {"propertyId": property_id, "archived": False}
-            )
-
-            # Check quota
-            staff_limit = limits["staff"]
-            if current >= staff_limit:
-                raise HTTPException(
-                    status_code=status.HTTP_402_PAYMENT_REQUIRED,
-                    detail=f"You've reached the limit of {staff_limit} staff members on {sub.plan.title()} plan. "
-                            f"Upgrade your subscription to add more staff."
-                )
-
-            logger.info(
-                f"Staff creation allowed for {owner_id} ({sub.plan} plan, {current}/{staff_limit} staff in property)"
-            )
-        except HTTPException:
-            raise
-        except Exception as e:
-            logger.error(f"Error checking staff quota: {str(e)}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Error checking subscription quota. Please try again."
-            )
+        await SubscriptionEnforcement._check("staff", owner_id, property_id, context, reserve=False)
 
     @staticmethod
     async def get_usage_warning(owner_id: str) -> dict | None:
@@ -310,7 +293,7 @@ class SubscriptionEnforcement:
             # If plan not found in database, use fallback limits
             if not limits:
                 logger.warning(f"Plan {sub.plan} not found in database, using fallback limits")
-                limits = {"properties": 1, "tenants": 80, "rooms": 30, "staff": 3}
+                limits = FALLBACK_LIMITS
 
             # Get actual usage
             owned_properties = await db["properties"].find(
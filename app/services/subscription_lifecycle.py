@@ -5,15 +5,20 @@ Handles subscription downgrades, upgrades, and resource archival with grace peri
 
 from app.database.mongodb import db
 from app.services.subscription_service import SubscriptionService
+from app.services.owner_usage_service import OwnerUsageService
+from app.services.property_stats_service import PropertyStatsService
 from datetime import datetime, timedelta
 from bson import ObjectId
-from app.utils.ownership import build_owner_query
+from app.utils.ownership import build_owner_query, normalize_property_owners
 import logging
 
 logger = logging.getLogger(__name__)
 
 ARCHIVAL_GRACE_PERIOD_DAYS = 30  # User has 30 days to upgrade before deletion
 
+property_stats_service = PropertyStatsService()
+owner_usage_service = OwnerUsageService()
+
 
 class SubscriptionLifecycle:
     """
@@ -61,6 +66,7 @@ class SubscriptionLifecycle:
             archived_properties = []
             archived_rooms = []
             archived_tenants = []
+            stale_property_ids = set()
             
             # STEP 1: Archive excess properties if needed
             if current_properties > target_limits["properties"]:
@@ -83,6 +89,7 @@ class SubscriptionLifecycle:
                     )
                     if result.modified_count > 0:
                         archived_properties.append(str(prop["_id"]))
+                        stale_property_ids.add(str(prop["_id"]))
                         
                         # Archive all rooms in this property
                         archived_room_result = await db["rooms"].update_many(
@@ -139,6 +146,11 @@ class SubscriptionLifecycle:
                     )
                     if result.modified_count > 0:
                         archived_tenants.append(str(tenant["_id"]))
+                        stale_property_ids.add(tenant.get("propertyId"))
+
+            # Tenants were archived in bulk, recount the affected properties
+            for property_id in filter(None, stale_property_ids):
+                await property_stats_service.rebuild(property_id)
 
             logger.info(
                 f"Downgrade for {owner_id}: archived {len(archived_properties)} properties, "
@@ -216,6 +228,10 @@ class SubscriptionLifecycle:
                 }
             )
             
+            if restore_tenants.modified_count:
+                for property_id in property_ids:
+                    await property_stats_service.rebuild(property_id)
+
             logger.info(
                 f"Upgrade for {owner_id}: restored {restore_prop.modified_count} properties, "
                 f"{restore_rooms.modified_count} rooms, {restore_tenants.modified_count} tenants"
@@ -310,24 +326,37 @@ class SubscriptionLifecycle:
         """
         try:
             cutoff_date = (datetime.now() - timedelta(days=ARCHIVAL_GRACE_PERIOD_DAYS)).isoformat()
+            property_query = {"active": False, "archivedAt": {"$lt": cutoff_date}}
+            room_query = {"active": False, "archivedAt": {"$lt": cutoff_date}}
+            tenant_query = {"archived": True, "archivedAt": {"$lt": cutoff_date}}
+            
+            # Properties whose counters change once the deletes below are done
+            deleted_properties = await db["properties"].find(property_query, {"ownerIds": 1, "ownerId": 1}).to_list(length=None)
+            deleted_property_ids = {str(doc["_id"]) for doc in deleted_properties}
+            affected_owner_ids = {
+                owner_id for doc in deleted_properties
+                for owner_id in normalize_property_owners(doc).get("ownerIds", [])
+            }
+            stale_property_ids = set(await db["rooms"].distinct("propertyId", room_query))
+            stale_property_ids.update(await db["tenants"].distinct("propertyId", tenant_query))
             
             # Delete expired archived properties
-            props = await db["properties"].delete_many({
-                "active": False,
-                "archivedAt": {"$lt": cutoff_date}
-            })
+            props = await db["properties"].delete_many(property_query)
             
             # Delete expired archived rooms
-            rooms = await db["rooms"].delete_many({
-                "active": False,
-                "archivedAt": {"$lt": cutoff_date}
-            })
+            rooms = await db["rooms"].delete_many(room_query)
             
             # Delete expired archived tenants
-            tenants = await db["tenants"].delete_many({
-                "archived": True,
-                "archivedAt": {"$lt": cutoff_date}
-            })
+            tenants = await db["tenants"].delete_many(tenant_query)
+            
+            # Keep the materialized counters in step with the bulk deletes
+            for property_id in deleted_property_ids:
+                await property_stats_service.delete(property_id)
+            for property_id in filter(None, stale_property_ids - deleted_property_ids):
+                await property_stats_service.rebuild(property_id)
+            # ...and the owners' property quota usage
+            for owner_id in affected_owner_ids:
+                await owner_usage_service.reseed(owner_id)
             
             logger.info(
                 f"Cleanup completed: deleted {props.deleted_count} properties, "
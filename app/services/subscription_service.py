@@ -6,12 +6,16 @@ from datetime import datetime, timedelta
 from app.utils.ownership import build_owner_query
 import logging
 from app.config.default_plans import get_default_plan
+from app.utils.auth_context import invalidate_auth_context
+from app.utils.query_plan import QueryPlan
+from app.services.plan_catalog import plan_catalog
 
 logger = logging.getLogger(__name__)
 
 # Plans are now stored in the database 'plans' collection
 # Use PlanService to manage plans (create, update, delete)
 # This allows admin to dynamically manage plans without code changes
+# Reads go through plan_catalog, which keeps them in memory
 
 def format_price_text(price_paise: int) -> str:
     """Convert price in paise to formatted rupee text (e.g., 999 -> ₹9.99, 2499 -> ₹24.99)"""
@@ -41,7 +45,7 @@ class SubscriptionService:
         now = datetime.now().isoformat()
         
         # Fetch free plan from database
-        free_plan = await db.plans.find_one({"name": "free"})
+        free_plan = await plan_catalog.get("free")
         if not free_plan:
             free_plan = get_default_plan("free")
             if not free_plan:
@@ -89,7 +93,7 @@ class SubscriptionService:
             now = datetime.now().isoformat()
             
             # Fetch plan from database
-            plan_doc = await db.plans.find_one({"name": plan.lower()})
+            plan_doc = await plan_catalog.get(plan)
             if not plan_doc:
                 plan_doc = get_default_plan(plan)
                 if not plan_doc:
@@ -137,6 +141,7 @@ class SubscriptionService:
             )
             
             if result:
+                invalidate_auth_context(owner_id)
                 return Subscription(**result)
             
             # If subscription doesn't exist, create it
@@ -157,6 +162,7 @@ class SubscriptionService:
                 updatedAt=now
             )
             await db["subscriptions"].insert_one(sub.model_dump())
+            invalidate_auth_context(owner_id)
             return sub
         except Exception as e:
             logger.error(f"Error updating subscription: {str(e)}")
@@ -174,9 +180,14 @@ class SubscriptionService:
             property_ids = [str(doc["_id"]) for doc in owned_properties]
 
             properties = len(property_ids)
-            tenants = await db["tenants"].count_documents({"propertyId": {"$in": property_ids}}) if property_ids else 0
-            rooms = await db["rooms"].count_documents({"propertyId": {"$in": property_ids}}) if property_ids else 0
-            staff = await db["staff"].count_documents({"propertyId": {"$in": property_ids}}) if property_ids else 0
+            tenants = rooms = staff = 0
+            if property_ids:
+                query = {"propertyId": {"$in": property_ids}}
+                plan = QueryPlan()
+                for collection in ("tenants", "rooms", "staff"):
+                    plan.add(collection, lambda collection=collection: db[collection].count_documents(query))
+                counts = await plan.run()
+                tenants, rooms, staff = counts["tenants"], counts["rooms"], counts["staff"]
             now = datetime.now().isoformat()
             return Usage(
                 ownerId=owner_id,
@@ -202,7 +213,7 @@ class SubscriptionService:
     @staticmethod
     async def get_plan_limits(plan: str):
         """Get features/limits for a plan from database"""
-        plan_doc = await db.plans.find_one({"name": plan.lower()})
+        plan_doc = await plan_catalog.get(plan)
         if not plan_doc:
             plan_doc = get_default_plan(plan)
             if not plan_doc:
@@ -217,10 +228,9 @@ class SubscriptionService:
     @staticmethod
     async def get_all_plans():
         """Get all available plans with their pricing tiers from database"""
-        cursor = db.plans.find({"is_active": True}).sort("sort_order", 1)
         result = []
         
-        async for plan_doc in cursor:
+        for plan_doc in await plan_catalog.all(active_only=True):
             plan_info = {
                 'name': plan_doc['name'],
                 'properties': plan_doc['properties'],
@@ -253,7 +263,7 @@ class SubscriptionService:
             now = datetime.now().isoformat()
             
             # Fetch free plan from database
-            free_plan = await db.plans.find_one({"name": "free"})
+            free_plan = await plan_catalog.get("free")
             if not free_plan:
                 free_plan = get_default_plan("free")
                 if not free_plan:
@@ -291,6 +301,7 @@ class SubscriptionService:
                 }},
                 return_document=True
             )
+            invalidate_auth_context(owner_id)
             if result:
                 return Subscription(**result)
         except Exception as e:
@@ -309,7 +320,10 @@ class SubscriptionService:
             property_ids = [str(doc["_id"]) for doc in owned_properties]
 
             property_count = len(property_ids)
-            tenant_count = await db["tenants"].count_documents({"propertyId": {"$in": property_ids}}) if property_ids else 0
+            tenant_count = 0
+            if property_ids:
+                tenant_count = await db["tenants"].count_documents({"propertyId": {"$in": property_ids}})
+            free_plan = await plan_catalog.get("free")
         except Exception as e:
             logger.error(f"Error counting resources: {str(e)}")
             return {
@@ -321,13 +335,12 @@ class SubscriptionService:
             }
         
         # Free tier limits from database
-        free_plan = await db.plans.find_one({"name": "free"})
         if not free_plan:
             free_plan = get_default_plan("free")
-            if not free_plan:
-                free_limits = {'properties': 1, 'tenants': 80}
-            else:
-                free_limits = {'properties': free_plan['properties'], 'tenants': free_plan['tenants']}
+        if not free_plan:
+            free_limits = {'properties': 1, 'tenants': 80}
+        else:
+            free_limits = {'properties': free_plan['properties'], 'tenants': free_plan['tenants']}
         
         # Calculate excess
         excess_properties = max(0, property_count - free_limits["properties"])
@@ -367,7 +380,7 @@ class SubscriptionService:
             now = datetime.now().isoformat()
             
             # Fetch free plan from database
-            free_plan = await db.plans.find_one({"name": "free", "is_active": True})
+            free_plan = await plan_catalog.get("free", active_only=True)
             if not free_plan:
                 free_plan = get_default_plan("free")
                 if not free_plan:
@@ -442,6 +455,7 @@ class SubscriptionService:
                     "updatedAt": datetime.now().isoformat()
                 }}
             )
+            invalidate_auth_context(owner_id)
             return result.modified_count > 0
         except Exception as e:
             logger.error(f"Error enabling auto-renewal for {owner_id}: {str(e)}")
@@ -466,6 +480,7 @@ class SubscriptionService:
                     "updatedAt": datetime.now().isoformat()
                 }}
             )
+            invalidate_auth_context(owner_id)
             return result.modified_count > 0
         except Exception as e:
             logger.error(f"Error disabling auto-renewal for {owner_id}: {str(e)}")
@@ -507,7 +522,7 @@ class SubscriptionService:
             now = datetime.now().isoformat()
             period_end = (datetime.now() + timedelta(days=365)).isoformat()
             
-            free_plan = await db.plans.find_one({"name": "free"})
+            free_plan = await plan_catalog.get("free")
             if not free_plan:
                 raise ValueError("Free plan not found")
             
@@ -531,6 +546,7 @@ class SubscriptionService:
                     "updatedAt": now
                 }}
             )
+            invalidate_auth_context(owner_id)
             
             logger.info(f"✓ Subscription cancelled for user {owner_id}")
             
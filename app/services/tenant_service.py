@@ -1,89 +1,86 @@
-from app.models.tenant_schema import Tenant, TenantOut, BillingStatus, BillingCycle
-from app.models.bed_schema import BedUpdate, BedStatus
+from app.models.tenant_schema import Tenant, TenantOut, BillingStatus
+from typing import Optional
+from app.models.bed_schema import BedClaimStatus, BedStatus
 from app.models.payment_schema import PaymentMethod
 from app.services.bed_service import BedService
-from app.database.mongodb import getCollection
+from app.database.mongodb import getCollection, run_in_transaction
 from datetime import datetime, timezone, timedelta
-from dateutil.relativedelta import relativedelta
 from bson import ObjectId
+from pymongo import ReturnDocument
 from app.models.payment_schema import PaymentCreate
 from app.services.payment_service import PaymentService
+from app.services.payment_generation import (
+    NOT_SCHEDULED,
+    PaymentGenerationJob,
+    billing_anchor_day,
+    initial_next_due_date,
+    monthly_due_date,
+    next_due_after,
+)
 from app.models.tenant_schema import BillingConfig
+from app.services.property_stats_service import PropertyStatsService, QuotaReservation, consume_reservation
+from app.utils.money import to_paise
+from app.utils.lookups import lookup_by_object_id
+from app.utils.pagination import ASCENDING, apply_cursor, next_cursor, sort_spec
+from app.utils.tenant_search import build_tenant_search
 
 
 
 bed_service = BedService()
 payment_service = PaymentService()
+property_stats_service = PropertyStatsService()
+
+
 class TenantService:
 
     def __init__(self):
         self.collection = getCollection("tenants")
 
-    async def get_tenants(self, property_id: str = None, search: str = None, status: str = None, skip: int = 0, limit: int = 50, include_room_bed: bool = True):
+    async def get_tenants(self, property_id: str = None, search: str = None, status: str = None, skip: int = 0, limit: int = 50, include_room_bed: bool = True, cursor: str = None, with_total: bool = True):
+        """
+        Returns (tenants, total, has_more, next_cursor). With `cursor` the page
+        starts after that cursor and `skip` is ignored; total is None when
+        with_total is False. Text searches are ranked by relevance and page by
+        offset only, so they never return a cursor.
+        """
         query = {}
+        text_search = False
         if property_id:
             query["propertyId"] = property_id
-        if search:
+        if search and search.strip():
             # Search in name, phone, documentId
-            query["$or"] = [
-                {"name": {"$regex": search, "$options": "i"}},
-                {"phone": {"$regex": search, "$options": "i"}},
-                {"documentId": {"$regex": search, "$options": "i"}}
-            ]
+            search_clause, text_search = build_tenant_search(search)
+            query.update(search_clause)
+            if text_search and cursor:
+                raise ValueError("Cursor pagination is not supported for name search; use page instead")
         if status:
             # Filter by billingConfig.status
             query["billingConfig.status"] = status
         
         # Get total count
-        total = await self.collection.count_documents(query)
+        total = await self.collection.count_documents(query) if with_total else None
         
-        # Build aggregation pipeline to replace N+1 queries
-        pipeline = [{"$match": query}]
+        # Page first (keyset seek or offset on _id order), then enrich only the page.
+        # One extra document tells whether another page exists.
+        if text_search:
+            pipeline = [
+                {"$match": query},
+                {"$sort": {"score": {"$meta": "textScore"}, "_id": ASCENDING}},
+            ]
+        else:
+            pipeline = [
+                {"$match": apply_cursor(query, "_id", ASCENDING, cursor)},
+                {"$sort": dict(sort_spec("_id", ASCENDING))},
+            ]
+        if not cursor and skip:
+            pipeline.append({"$skip": skip})
+        pipeline.append({"$limit": limit + 1})
         
         if include_room_bed:
             pipeline.extend([
-                # Lookup room info
-                {
-                    "$lookup": {
-                        "from": "rooms",
-                        "let": {"roomId": "$roomId"},
-                        "as": "room_info",
-                        "pipeline": [
-                            {
-                                "$match": {
-                                    "$expr": {
-                                        "$eq": [
-                                            {"$toString": "$_id"},
-                                            {"$toString": "$$roomId"}
-                                        ]
-                                    }
-                                }
-                            },
-                            {"$project": {"roomNumber": 1}}
-                        ]
-                    }
-                },
-                # Lookup bed info
-                {
-                    "$lookup": {
-                        "from": "beds",
-                        "let": {"bedId": "$bedId"},
-                        "as": "bed_info",
-                        "pipeline": [
-                            {
-                                "$match": {
-                                    "$expr": {
-                                        "$eq": [
-                                            {"$toString": "$_id"},
-                                            {"$toString": "$$bedId"}
-                                        ]
-                                    }
-                                }
-                            },
-                            {"$project": {"bedNumber": 1}}
-                        ]
-                    }
-                },
+                # Lookup room and bed info through the _id index
+                *lookup_by_object_id("rooms", "roomId", "room_info", project={"roomNumber": 1}),
+                *lookup_by_object_id("beds", "bedId", "bed_info", project={"bedNumber": 1}),
                 # Project enriched fields
                 {
                     "$project": {
@@ -110,20 +107,18 @@ class TenantService:
                 }
             ])
         
-        pipeline.extend([
-            {"$skip": skip},
-            {"$limit": limit}
-        ])
-        
         # Execute aggregation pipeline
-        cursor = self.collection.aggregate(pipeline)
+        docs = await self.collection.aggregate(pipeline).to_list(limit + 1)
+        has_more = len(docs) > limit
+        docs = docs[:limit]
         tenants = []
         
-        async for doc in cursor:
+        for doc in docs:
             doc["id"] = str(doc["_id"])
             tenants.append(TenantOut(**doc))
         
-        return tenants, total
+        page_cursor = next_cursor(docs[-1], "_id") if has_more and not text_search else None
+        return tenants, total, has_more, page_cursor
 
     async def get_tenant(self, tenant_id: str):
         doc = await self.collection.find_one({"_id": ObjectId(tenant_id)})
@@ -132,19 +127,14 @@ class TenantService:
             return Tenant(**doc)
         return None
 
-    async def create_tenant(self, tenant_data: dict):
+    async def create_tenant(self, tenant_data: dict, quota_reserved: Optional[QuotaReservation] = None):
         now = datetime.now(timezone.utc).isoformat()
         if not tenant_data.get("createdAt"):
             tenant_data["createdAt"] = now
         if not tenant_data.get("updatedAt"):
             tenant_data["updatedAt"] = now
-        
-        # Validate bed is available if provided
-        bed_id = tenant_data.get("bedId")
-        if bed_id:
-            bed = await bed_service.get_bed(bed_id)
-            if bed and bed.status == BedStatus.OCCUPIED.value:
-                raise ValueError(f"Bed is already occupied")
+        if "rent" in tenant_data:
+            tenant_data["rentPaise"] = to_paise(tenant_data["rent"])
         
         # Get autoGeneratePayments flag
         auto_generate = tenant_data.get("autoGeneratePayments", True)
@@ -162,149 +152,212 @@ class TenantService:
             # Remove billingConfig if auto-generate is disabled
             tenant_data.pop("billingConfig", None)
         
-        result = await self.collection.insert_one(tenant_data)
-        tenant_data["id"] = str(result.inserted_id)
-        
-        # Update bed with tenantId and occupied status after tenant is created
-        if tenant_data.get("bedId"):
-            await bed_service.update_bed(tenant_data["bedId"], BedUpdate(status=BedStatus.OCCUPIED.value, tenantId=tenant_data["id"]))
-
-        # Create payment only if autoGeneratePayments is True and billingConfig exists
+        # The first payment is created below; the daily job takes over from the month after
+        first_due_date = None
+        tenant_data["nextDueDate"] = None
         if auto_generate and billing_config:
-            # Calculate dueDate from anchorDay and billingCycle
-            # anchorDay is just the day of month (e.g., 2 means the 2nd of every month)
-            anchor_day = billing_config.anchorDay
-            today = datetime.now(timezone.utc)
+            first_due_date = monthly_due_date(billing_config.anchorDay, datetime.now(timezone.utc).date())
+            if billing_anchor_day(tenant_data) is not None:
+                tenant_data["nextDueDate"] = next_due_after(first_due_date, billing_config.anchorDay).isoformat()
+        
+        # Tenant, bed claim and first payment commit together or not at all
+        tenant_data["_id"] = ObjectId()
+        tenant_data["id"] = str(tenant_data["_id"])
+        bed_id = tenant_data.get("bedId")
+        pending = None
+        
+        async def create(session):
+            nonlocal pending
+            pending = property_stats_service.pending()
             
-            # Set dueDate to anchorDay of current or next month
-            # Use relativedelta to handle months with fewer days (e.g., Feb 30 becomes Feb 28)
-            due_date = today + relativedelta(day=anchor_day)
-            # If the anchor day has already passed this month, use next month
-            if due_date < today:
-                due_date = due_date + relativedelta(months=1)
+            # Occupy the bed first; the availability check is part of the write
+            if bed_id:
+                claim = await bed_service.claim_bed(bed_id, tenant_data["id"], session=session)
+                if claim.status == BedClaimStatus.NOT_FOUND:
+                    raise ValueError(f"Bed {bed_id} not found")
+                if not claim.ok:
+                    raise ValueError("Bed is already occupied")
+                pending.change("beds", claim.before, {**claim.before, "status": BedStatus.OCCUPIED.value})
             
-            payment = PaymentCreate(
-                tenantId=tenant_data["id"],
-                propertyId=tenant_data["propertyId"],
-                bed=tenant_data.get("bedId", ""),
-                amount=tenant_data["rent"],
-                status=billing_config.status,
-                dueDate=due_date.date(),
-                method=billing_config.method or PaymentMethod.CASH.value
-            )
-            await payment_service.create_payment(payment)
-
+            await self.collection.insert_one({k: v for k, v in tenant_data.items() if k != "id"}, session=session)
+            pending.change("tenants", after=tenant_data, reserved=quota_reserved is not None)
+            
+            # Create payment only if autoGeneratePayments is True and billingConfig exists
+            if first_due_date:
+                # dueDate is the anchorDay of the current month, or of next month if it has passed
+                payment_doc = payment_service.build_payment_doc(PaymentCreate(
+                    tenantId=tenant_data["id"],
+                    propertyId=tenant_data["propertyId"],
+                    bed=tenant_data.get("bedId", ""),
+                    amount=tenant_data["rent"],
+                    status=billing_config.status,
+                    dueDate=first_due_date,
+                    method=billing_config.method or PaymentMethod.CASH.value
+                ))
+                await payment_service.collection.insert_one(payment_doc, session=session)
+                pending.change("payments", after=payment_doc)
+        
+        await run_in_transaction(create)
+        # Committed: the tenant now holds the reserved quota unit
+        consume_reservation(quota_reserved)
+        await pending.apply()
+        
         return Tenant(**tenant_data)
 
     async def update_tenant(self, tenant_id: str, tenant_data: dict):
         tenant_data["updatedAt"] = datetime.now(timezone.utc).isoformat()
+        if "rent" in tenant_data:
+            tenant_data["rentPaise"] = to_paise(tenant_data["rent"])
         
-        # Get original tenant data
-        orig_doc = await self.collection.find_one({"_id": ObjectId(tenant_id)})
-        if not orig_doc:
-            return None
-            
-        orig_bed_id = orig_doc.get("bedId")
-        orig_room_id = orig_doc.get("roomId")
-        orig_status = orig_doc.get("tenantStatus", "active")
-        
-        new_bed_id = tenant_data.get("bedId")
-        new_room_id = tenant_data.get("roomId")
-        new_status = tenant_data.get("tenantStatus", orig_status)
-        
-        # Validate new bed is available (if different from current bed)
-        if new_bed_id and new_bed_id != orig_bed_id:
-            bed = await bed_service.get_bed(new_bed_id)
-            if bed and bed.status == BedStatus.OCCUPIED.value and bed.tenantId != tenant_id:
-                raise ValueError(f"Bed {new_bed_id} is already occupied by another tenant")
+        pending = None
         
-        # Handle tenant status change to vacated
-        if new_status == "vacated" and orig_status != "vacated":
-            # Free up current bed if assigned
-            if orig_bed_id:
-                await bed_service.update_bed(orig_bed_id, BedUpdate(status=BedStatus.AVAILABLE.value, tenantId=None))
+        async def update(session):
+            nonlocal pending
+            pending = property_stats_service.pending()
+            # Work on a copy so a retried attempt starts from the caller's data
+            changes = dict(tenant_data)
             
-            # Clear roomId and bedId
-            tenant_data["roomId"] = None
-            tenant_data["bedId"] = None
+            # Get original tenant data
+            orig_doc = await self.collection.find_one({"_id": ObjectId(tenant_id)}, session=session)
+            if not orig_doc:
+                return None
             
-            # Set checkout date if not already set
-            if not tenant_data.get("checkoutDate"):
-                tenant_data["checkoutDate"] = datetime.now(timezone.utc).isoformat()
+            orig_bed_id = orig_doc.get("bedId")
+            orig_status = orig_doc.get("tenantStatus", "active")
             
-            # Clear billingConfig for vacated tenant
-            tenant_data["billingConfig"] = None
-        
-        # Handle tenant reactivation (vacated -> active)
-        elif new_status == "active" and orig_status == "vacated":
-            # Room and bed are mandatory when reactivating a tenant
-            if not new_bed_id or not new_room_id:
-                raise ValueError("Room and bed are mandatory when reactivating a vacated tenant")
-            
-            # Occupy the new bed
-            await bed_service.update_bed(new_bed_id, BedUpdate(status=BedStatus.OCCUPIED.value, tenantId=tenant_id))
+            new_bed_id = changes.get("bedId")
+            new_room_id = changes.get("roomId")
+            new_status = changes.get("tenantStatus", orig_status)
             
-            # Clear checkout date when reactivating
-            if "checkoutDate" not in tenant_data:
-                tenant_data["checkoutDate"] = None
-        
-        # Handle bed changes for active tenants
-        elif new_status == "active":
-            # Room and bed are mandatory for active tenants
-            if not new_bed_id or not new_room_id:
-                raise ValueError("Room and bed are mandatory for active tenants")
+            async def release(bed_id):
+                # A bed no longer held by this tenant is left alone
+                result = await bed_service.release_bed(bed_id, tenant_id, session=session)
+                if result.ok:
+                    pending.change("beds", result.before, {**result.before, "status": BedStatus.AVAILABLE.value})
             
-            bed_changed = orig_bed_id != new_bed_id
+            async def claim(bed_id):
+                result = await bed_service.claim_bed(bed_id, tenant_id, session=session)
+                if result.status == BedClaimStatus.NOT_FOUND:
+                    raise ValueError(f"Bed {bed_id} not found")
+                if not result.ok:
+                    raise ValueError(f"Bed {bed_id} is already occupied by another tenant")
+                pending.change("beds", result.before, {**result.before, "status": BedStatus.OCCUPIED.value})
             
-            if bed_changed:
-                # Free up old bed if it existed
+            # Handle tenant status change to vacated
+            if new_status == "vacated" and orig_status != "vacated":
+                # Free up current bed if assigned
                 if orig_bed_id:
-                    await bed_service.update_bed(orig_bed_id, BedUpdate(status=BedStatus.AVAILABLE.value, tenantId=None))
+                    await release(orig_bed_id)
                 
-                # Occupy new bed if it's being assigned
-                if new_bed_id:
-                    await bed_service.update_bed(new_bed_id, BedUpdate(status=BedStatus.OCCUPIED.value, tenantId=tenant_id))
-        
-        # Ensure billingConfig is handled properly
-        if "billingConfig" in tenant_data:
-            tenant_data["billingConfig"] = tenant_data["billingConfig"] or None
-        
-        # Update the tenant document
-        await self.collection.update_one({"_id": ObjectId(tenant_id)}, {"$set": tenant_data})
+                # Clear roomId and bedId
+                changes["roomId"] = None
+                changes["bedId"] = None
+                
+                # Set checkout date if not already set
+                if not changes.get("checkoutDate"):
+                    changes["checkoutDate"] = datetime.now(timezone.utc).isoformat()
+                
+                # Clear billingConfig for vacated tenant
+                changes["billingConfig"] = None
+            
+            # Handle tenant reactivation (vacated -> active)
+            elif new_status == "active" and orig_status == "vacated":
+                # Room and bed are mandatory when reactivating a tenant
+                if not new_bed_id or not new_room_id:
+                    raise ValueError("Room and bed are mandatory when reactivating a vacated tenant")
+                
+                # Occupy the new bed
+                await claim(new_bed_id)
+                
+                # Clear checkout date when reactivating
+                if "checkoutDate" not in changes:
+                    changes["checkoutDate"] = None
+            
+            # Handle bed changes for active tenants
+            elif new_status == "active":
+                # Room and bed are mandatory for active tenants
+                if not new_bed_id or not new_room_id:
+                    raise ValueError("Room and bed are mandatory for active tenants")
+                
+                if orig_bed_id != new_bed_id:
+                    # Occupy the new bed first so a conflict leaves the old one untouched
+                    await claim(new_bed_id)
+                    # Free up old bed if it existed
+                    if orig_bed_id:
+                        await release(orig_bed_id)
+            
+            # Ensure billingConfig is handled properly
+            if "billingConfig" in changes:
+                changes["billingConfig"] = changes["billingConfig"] or None
+            
+            # Re-derive the billing schedule when anything it depends on changes
+            if {"billingConfig", "autoGeneratePayments", "tenantStatus", "checkoutDate"} & changes.keys():
+                merged = {**orig_doc, **changes}
+                new_anchor = billing_anchor_day(merged)
+                if new_anchor is None:
+                    changes["nextDueDate"] = None
+                elif (
+                    new_anchor != billing_anchor_day(orig_doc)
+                    or orig_doc.get("nextDueDate") in (None, NOT_SCHEDULED)
+                ):
+                    # An existing payment for that date makes the job's upsert a no-op
+                    changes["nextDueDate"] = initial_next_due_date(merged)
+            
+            # Update the tenant document and return the new version
+            doc = await self.collection.find_one_and_update(
+                {"_id": ObjectId(tenant_id)},
+                {"$set": changes},
+                return_document=ReturnDocument.AFTER,
+                session=session,
+            )
+            pending.change("tenants", orig_doc, doc)
+            return doc
         
-        # Fetch and return updated tenant
-        doc = await self.collection.find_one({"_id": ObjectId(tenant_id)})
+        doc = await run_in_transaction(update)
+        await pending.apply()
         if doc:
             doc["id"] = str(doc["_id"])
             return Tenant(**doc)
         return None
 
     async def delete_tenant(self, tenant_id: str):
-        # Find the tenant to get the bedId
-        doc = await self.collection.find_one({"_id": ObjectId(tenant_id)})
-        bed_id = doc.get("bedId") if doc else None
-        if bed_id:
-            # Set bed to available and clear tenantId
-            await bed_service.update_bed(bed_id, BedUpdate(status=BedStatus.AVAILABLE.value, tenantId=None))
+        pending = None
         
-        # Delete all payments associated with this tenant
-        payments_collection = getCollection("payments")
-        await payments_collection.delete_many({"tenantId": tenant_id})
+        async def delete(session):
+            nonlocal pending
+            pending = property_stats_service.pending()
+            # Find the tenant to get the bedId
+            doc = await self.collection.find_one({"_id": ObjectId(tenant_id)}, session=session)
+            bed_id = doc.get("bedId") if doc else None
+            if bed_id:
+                # Set bed to available and clear tenantId
+                result = await bed_service.release_bed(bed_id, tenant_id, session=session)
+                if result.ok:
+                    pending.change("beds", result.before, {**result.before, "status": BedStatus.AVAILABLE.value})
+            
+            # Delete all payments associated with this tenant
+            await payment_service.delete_payments_by_tenant(tenant_id, session=session, pending_stats=pending)
+            
+            # Delete the tenant
+            result = await self.collection.delete_one({"_id": ObjectId(tenant_id)}, session=session)
+            if result.deleted_count:
+                pending.change("tenants", before=doc)
         
-        # Delete the tenant
-        await self.collection.delete_one({"_id": ObjectId(tenant_id)})
+        await run_in_transaction(delete)
+        await pending.apply()
         return {
             "success": True, 
             "tenantId": tenant_id,
             "message": "Tenant and all associated payment records deleted successfully."
         }
 
-    async def generate_monthly_payments(self):
+    async def generate_monthly_payments(self, fence=None):
         """
-        Optimized cron job: generates recurring monthly payments.
-        Uses cursor iteration (memory-efficient), batch inserts, and logging.
+        Cron job: generates recurring monthly payments, sharded by property.
+        See app/services/payment_generation.py. `fence` is the job lock's
+        lease check (see app/database/job_locks.py).
         
-        Returns: {"created": int, "skipped": int, "errors": list, "duration_ms": int}
+        Returns: {"created": int, "skipped": int, "errors": list, "duration_ms": int, ...}
         """
         import time
         import logging
@@ -313,107 +366,7 @@ class TenantService:
         start_time = time.time()
         
         try:
-            result = {"created": 0, "skipped": 0, "errors": []}
-            payments_collection = getCollection("payments")
-            today = datetime.now(timezone.utc).date()
-            
-            logger.info(f"[CRON] Starting payment generation at {today.isoformat()}")
-            
-            # Use cursor iteration instead of .to_list(None) - memory efficient
-            tenant_cursor = self.collection.find({
-                "autoGeneratePayments": True,
-                "billingConfig": {"$exists": True},
-                "billingConfig.billingCycle": BillingCycle.MONTHLY.value
-            })
-            
-            payments_to_insert = []
-            batch_size = 100  # Insert 100 at a time
-            
-            async for tenant_doc in tenant_cursor:
-                try:
-                    tenant_id = str(tenant_doc["_id"])
-                    billing_config_dict = tenant_doc.get("billingConfig", {})
-                    
-                    if not billing_config_dict:
-                        result["skipped"] += 1
-                        continue
-                    
-                    # Parse billing config
-                    try:
-                        billing_config = BillingConfig(**billing_config_dict)
-                    except Exception:
-                        result["skipped"] += 1
-                        continue
-                    
-                    # Skip if tenant has checked out
-                    checkout_date_str = tenant_doc.get("checkoutDate")
-                    if checkout_date_str:
-                        checkout_date = datetime.fromisoformat(checkout_date_str).date()
-                        if today > checkout_date:
-                            result["skipped"] += 1
-                            continue
-                    
-                    # Determine due date based on billing cycle
-                    due_date = None
-                    
-                    # Calculate due date for monthly billing
-                    due_date = today + relativedelta(day=billing_config.anchorDay)
-                    if due_date < today:
-                        due_date = due_date + relativedelta(months=1)
-                    
-                    if not due_date:
-                        result["skipped"] += 1
-                        continue
-                    
-                    # Build payment data
-                    payment_data = {
-                        "tenantId": tenant_id,
-                        "propertyId": tenant_doc.get("propertyId"),
-                        "bed": tenant_doc.get("bedId", ""),
-                        "amount": tenant_doc.get("rent", "0"),  # Keep as string
-                        "status": billing_config.status,
-                        "dueDate": due_date.isoformat(),
-                        "method": billing_config.method or PaymentMethod.CASH.value,
-                        "createdAt": datetime.now(timezone.utc),
-                        "updatedAt": datetime.now(timezone.utc)
-                    }
-                    
-                    payments_to_insert.append(payment_data)
-                    result["created"] += 1
-                    
-                    # Batch insert when reaching batch size
-                    if len(payments_to_insert) >= batch_size:
-                        try:
-                            await payments_collection.insert_many(payments_to_insert, ordered=False)
-                            logger.info(f"[CRON] Inserted batch of {len(payments_to_insert)} payments")
-                            payments_to_insert = []
-                        except Exception as batch_error:
-                            logger.error(f"[CRON] Batch insert failed: {str(batch_error)}")
-                            result["errors"].append({"error": f"batch_insert: {str(batch_error)}"})
-                            payments_to_insert = []  # Clear batch and continue
-                
-                except Exception as e:
-                    result["errors"].append({
-                        "tenantId": str(tenant_doc.get("_id", "unknown")),
-                        "error": str(e)
-                    })
-            
-            # Insert remaining payments
-            if payments_to_insert:
-                try:
-                    await payments_collection.insert_many(payments_to_insert, ordered=False)
-                    logger.info(f"[CRON] Inserted final batch of {len(payments_to_insert)} payments")
-                except Exception as batch_error:
-                    logger.error(f"[CRON] Final batch insert failed: {str(batch_error)}")
-                    result["errors"].append({"error": f"final_batch: {str(batch_error)}"})
-            
-            duration_ms = int((time.time() - start_time) * 1000)
-            result["duration_ms"] = duration_ms
-            
-            logger.info(f"[CRON] Completed: created={result['created']}, skipped={result['skipped']}, errors={len(result['errors'])}, duration={duration_ms}ms")
-            
-            return result
-            
+            return await PaymentGenerationJob(fence=fence).run()
         except Exception as e:
             duration_ms = int((time.time() - start_time) * 1000)
             logger.error(f"[CRON] Failed: {str(e)}, duration={duration_ms}ms")
@@ -0,0 +1,124 @@
+"""
+Per-user authentication context cache used by UserContextMiddleware.
+
+Holds the sanitized user document, the owned property id list and the
+subscription so authenticated requests do not hit MongoDB three times
+before the route runs. Services that change any of these must call
+invalidate_auth_context() for the affected user.
+
+The cache is per worker process. invalidate_auth_context() clears the local
+entry at once and also records the user ids in `auth_context_invalidations`;
+every worker reads that log at most every AUTH_CONTEXT_SYNC_SECONDS
+(sync_auth_context(), called by the middleware) and drops the same entries,
+so a write on one worker is seen by the others within that interval rather
+than after the full TTL.
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
+
+from app.config import settings
+from app.database.mongodb import db
+from app.utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+INVALIDATIONS_COLLECTION = "auth_context_invalidations"
+# The log is re-read with this much overlap so an entry inserted late (or
+# stamped by a worker with a slightly different clock) is not missed
+SYNC_OVERLAP_SECONDS = 5
+
+# Identifies this process so it skips its own invalidations
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+_auth_context_cache = TTLCache(
+    ttl_seconds=settings.AUTH_CONTEXT_CACHE_TTL_SECONDS,
+    max_entries=settings.AUTH_CONTEXT_CACHE_MAX_ENTRIES,
+)
+_last_sync: Optional[datetime] = None
+_next_sync = 0.0
+# Keeps fire-and-forget publish tasks alive until they finish
+_publish_tasks: set = set()
+
+
+def get_auth_context(user_id: str) -> Optional[dict]:
+    """Return cached {user, property_ids, subscription} for user_id, or None"""
+    return _auth_context_cache.get(user_id)
+
+
+def set_auth_context(user_id: str, user: dict, property_ids: list[str], subscription) -> None:
+    _auth_context_cache.set(user_id, {
+        "user": user,
+        "property_ids": property_ids,
+        "subscription": subscription,
+    })
+
+
+async def _publish(user_ids: list[str]):
+    try:
+        await db[INVALIDATIONS_COLLECTION].insert_one({
+            "userIds": user_ids,
+            "origin": WORKER_ID,
+            "at": datetime.now(timezone.utc),
+        })
+    except Exception as e:
+        logger.warning(f"Failed to publish auth context invalidation for {user_ids}: {e}")
+
+
+def invalidate_auth_context(*user_ids: str | Iterable[str]) -> None:
+    """Drop cached context for one or more users (accepts ids or iterables of ids) on every worker"""
+    dropped = []
+    for item in user_ids:
+        if not item:
+            continue
+        for user_id in ([item] if isinstance(item, str) else item):
+            if user_id:
+                _auth_context_cache.invalidate(str(user_id))
+                dropped.append(str(user_id))
+
+    if not dropped or settings.AUTH_CONTEXT_CACHE_TTL_SECONDS <= 0:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # No event loop (scripts): nothing else can hold a cached context
+        return
+    task = loop.create_task(_publish(dropped))
+    _publish_tasks.add(task)
+    task.add_done_callback(_publish_tasks.discard)
+
+
+async def sync_auth_context() -> None:
+    """Apply invalidations made by other workers; at most one query per AUTH_CONTEXT_SYNC_SECONDS"""
+    global _last_sync, _next_sync
+    if settings.AUTH_CONTEXT_CACHE_TTL_SECONDS <= 0 or time.monotonic() < _next_sync:
+        return
+    _next_sync = time.monotonic() + settings.AUTH_CONTEXT_SYNC_SECONDS
+
+    now = datetime.now(timezone.utc)
+    if _last_sync is None:
+        # Nothing was cached before the first sync
+        _last_sync = now
+        return
+
+    try:
+        async for doc in db[INVALIDATIONS_COLLECTION].find(
+            {"at": {"$gte": _last_sync - timedelta(seconds=SYNC_OVERLAP_SECONDS)}, "origin": {"$ne": WORKER_ID}},
+            {"userIds": 1},
+        ):
+            for user_id in doc.get("userIds", []):
+                _auth_context_cache.invalidate(user_id)
+    except Exception as e:
+        # Cached entries are still bounded by the TTL; try again next interval
+        logger.warning(f"Failed to sync auth context invalidations: {e}")
+        return
+    _last_sync = now
+
+
+def clear_auth_context() -> None:
+    _auth_context_cache.clear()
@@ -0,0 +1,195 @@
+"""
+Durable outbound mail queue.
+
+queue_email() stores the message in the `email_outbox` collection and
+returns immediately; worker tasks started with the app deliver it through
+email_service.deliver_email(). A worker claims a message by flipping it to
+"sending" with a lease, so several workers (and several API processes) never
+send the same message twice, and a message held by a crashed worker is
+picked up again once its lease expires.
+
+Transient failures are retried with exponential backoff. Messages that were
+rejected permanently or ran out of attempts move to `email_dead_letters`.
+
+Short-lived messages (OTPs) carry an `expiresAt`. They are dead-lettered,
+with the code redacted, once it passes or once the next retry would land
+after it, so an OTP is never mailed after it stopped working and never
+sits in the outbox in plaintext longer than it is valid.
+"""
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from pymongo import ReturnDocument
+
+from app.config import settings
+from app.database.mongodb import db
+from app.utils.email_service import EmailDeliveryError, deliver_email, is_email_configured
+from app.utils.otp_memory_store import OTP_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_COLLECTION = "email_outbox"
+DEAD_LETTER_COLLECTION = "email_dead_letters"
+LEASE_SECONDS = 60
+IDLE_POLL_SECONDS = 5.0
+# Parameters that must not be kept once a message is dead
+REDACTED_PARAMS = {"otp"}
+# Lifetime of messages that are useless after a while, by kind
+EXPIRES_IN_SECONDS = {"otp": OTP_TTL_SECONDS}
+
+
+async def queue_email(kind: str, to: str, params: dict, expires_in: Optional[float] = None) -> bool:
+    """
+    Store a message for background delivery; False when mail is not configured.
+    `expires_in` (seconds) defaults to the kind's lifetime in EXPIRES_IN_SECONDS.
+    """
+    if not is_email_configured():
+        return False
+
+    now = datetime.now(timezone.utc)
+    message = {
+        "kind": kind,
+        "to": to,
+        "params": params,
+        "status": "pending",
+        "attempts": 0,
+        "nextAttemptAt": now,
+        "createdAt": now,
+    }
+    if expires_in is None:
+        expires_in = EXPIRES_IN_SECONDS.get(kind)
+    if expires_in is not None:
+        message["expiresAt"] = now + timedelta(seconds=expires_in)
+    await db[OUTBOX_COLLECTION].insert_one(message)
+    email_outbox.notify()
+    return True
+
+
+class EmailOutbox:
+    def __init__(self, workers: Optional[int] = None, max_attempts: Optional[int] = None):
+        self.workers = max(1, workers or settings.EMAIL_OUTBOX_WORKERS)
+        self.max_attempts = max(1, max_attempts or settings.EMAIL_MAX_ATTEMPTS)
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    def notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self):
+        if self._tasks:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._worker(i), name=f"email-outbox-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"✓ Email outbox started with {self.workers} worker(s)")
+
+    async def stop(self):
+        self._stopping = True
+        self.notify()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _claim(self) -> Optional[dict]:
+        now = datetime.now(timezone.utc)
+        return await db[OUTBOX_COLLECTION].find_one_and_update(
+            {"$or": [
+                {"status": "pending", "nextAttemptAt": {"$lte": now}},
+                # Expired messages are claimed at once so they get dead-lettered
+                {"status": "pending", "expiresAt": {"$lte": now}},
+                {"status": "sending", "leaseExpiresAt": {"$lte": now}},
+            ]},
+            {
+                "$set": {"status": "sending", "leaseExpiresAt": now + timedelta(seconds=LEASE_SECONDS)},
+                "$inc": {"attempts": 1},
+            },
+            sort=[("nextAttemptAt", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def _backoff_seconds(self, attempts: int) -> float:
+        base = min(600, 5 * (2 ** (attempts - 1)))
+        return base * random.uniform(0.8, 1.2)
+
+    async def _dead_letter(self, message: dict, error: str):
+        params = {k: v for k, v in message.get("params", {}).items() if k not in REDACTED_PARAMS}
+        await db[DEAD_LETTER_COLLECTION].insert_one({
+            "kind": message["kind"],
+            "to": message["to"],
+            "params": params,
+            "attempts": message["attempts"],
+            "error": error,
+            "queuedAt": message.get("createdAt"),
+            "createdAt": datetime.now(timezone.utc),
+        })
+        await db[OUTBOX_COLLECTION].delete_one({"_id": message["_id"]})
+        logger.error(f"✗ {message['kind']} email to {message['to']} moved to dead letters: {error}")
+
+    async def _process(self, message: dict):
+        expires_at = message.get("expiresAt")
+        if expires_at is not None and expires_at.tzinfo is None:
+            # Motor returns naive UTC datetimes unless the client is tz-aware
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        if expires_at is not None and expires_at <= datetime.now(timezone.utc):
+            await self._dead_letter(message, message.get("lastError") or "expired before delivery")
+            return
+
+        try:
+            await deliver_email(message["kind"], message["to"], message.get("params", {}))
+        except EmailDeliveryError as e:
+            if not e.retryable or message["attempts"] >= self.max_attempts:
+                await self._dead_letter(message, str(e))
+                return
+            delay = self._backoff_seconds(message["attempts"])
+            if expires_at is not None and datetime.now(timezone.utc) + timedelta(seconds=delay) >= expires_at:
+                # The retry would deliver a code that no longer works
+                await self._dead_letter(message, f"{e} (expires before next retry)")
+                return
+            await db[OUTBOX_COLLECTION].update_one(
+                {"_id": message["_id"]},
+                {
+                    "$set": {
+                        "status": "pending",
+                        "nextAttemptAt": datetime.now(timezone.utc) + timedelta(seconds=delay),
+                        "lastError": str(e),
+                    },
+                    "$unset": {"leaseExpiresAt": ""},
+                },
+            )
+            logger.warning(f"{message['kind']} email to {message['to']} failed (attempt {message['attempts']}), retrying in {delay:.0f}s: {e}")
+            return
+
+        await db[OUTBOX_COLLECTION].delete_one({"_id": message["_id"]})
+        logger.info(f"✓ {message['kind']} email sent to {message['to']}")
+
+    async def _worker(self, index: int):
+        while not self._stopping:
+            # Cleared before claiming so a message queued meanwhile still wakes us
+            self._wakeup.clear()
+            try:
+                message = await self._claim()
+                if message is not None:
+                    await self._process(message)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"✗ Email outbox worker {index} error: {e}")
+
+            # Nothing due: sleep until a new message is queued or the poll interval passes
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=IDLE_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+
+email_outbox = EmailOutbox()
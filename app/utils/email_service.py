@@ -1,44 +1,48 @@
-"""Email service for sending OTP and other notifications via Zoho Zepto Mail"""
-import asyncio
-import httpx
+"""
+Email service for sending OTP and other notifications via Zoho Zepto Mail
+
+All mail goes through one pooled httpx client that lives as long as the
+app (close_email_client() on shutdown). Request handlers normally do not
+send directly: they enqueue a message in the outbox (app/utils/email_outbox.py)
+and background workers deliver it.
+"""
+import logging
+from functools import lru_cache
+from string import Template
 from typing import Optional
-from app.config.settings import ZEPTO_MAIL_API_KEY, FROM_EMAIL
+
+import httpx
+
+from app.config.settings import ZEPTO_MAIL_API_KEY, FROM_EMAIL, EMAIL_SEND_TIMEOUT_SECONDS
+
+logger = logging.getLogger(__name__)
 
 # Zoho Zepto Mail API endpoint - using India region endpoint
 ZEPTO_API_ENDPOINT = "https://api.zeptomail.in/v1.1/email"
+SENDER_NAME = "Hostel Manager"
 
 
-async def send_otp_email(email: str, otp: str, app_name: str = "Hostel Manager") -> bool:
-    """
-    Send OTP to user's email via Zoho Zepto Mail
-    Args:
-        email: User's email address
-        otp: 6-digit OTP code
-        app_name: Application name for email template
-    Returns:
-        True if email sent successfully, False otherwise
-    """
-    if not ZEPTO_MAIL_API_KEY or not FROM_EMAIL:
-        print(f"[WARNING] Zepto Mail not configured. OTP: {otp} for {email}")
-        return False
+class EmailDeliveryError(Exception):
+    """ZeptoMail did not accept the message; `retryable` is False for permanent rejections"""
 
-    try:
-        # Email template content
-        subject = f"Your {app_name} Verification Code: {otp}"
-        
-        html_content = f"""
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+OTP_HTML = Template("""
         <html>
             <body style="font-family: Arial, sans-serif; background-color: #f5f5f5; padding: 20px;">
                 <div style="background-color: #ffffff; padding: 30px; border-radius: 8px; max-width: 400px; margin: 0 auto; box-shadow: 0 2px 4px rgba(0,0,0,0.1);">
                     <h2 style="color: #333; text-align: center; margin-bottom: 20px;">Verify Your Email</h2>
                     
                     <p style="color: #666; font-size: 14px; line-height: 1.6; text-align: center;">
-                        Welcome to {app_name}! Use the verification code below to complete your registration.
+                        Welcome to $app_name! Use the verification code below to complete your registration.
                     </p>
                     
                     <div style="background-color: #f0f0f0; padding: 20px; text-align: center; border-radius: 6px; margin: 25px 0;">
                         <p style="margin: 0; font-size: 12px; color: #999; text-transform: uppercase; letter-spacing: 2px;">Your verification code</p>
-                        <p style="margin: 10px 0 0 0; font-size: 32px; font-weight: bold; color: #007bff; letter-spacing: 5px;">{otp}</p>
+                        <p style="margin: 10px 0 0 0; font-size: 32px; font-weight: bold; color: #007bff; letter-spacing: 5px;">$otp</p>
                     </div>
                     
                     <p style="color: #999; font-size: 13px; text-align: center; margin-bottom: 10px;">
@@ -54,82 +58,26 @@ async def send_otp_email(email: str, otp: str, app_name: str = "Hostel Manager")
                     <div style="background-color: #f9f9f9; padding: 15px; border-radius: 6px; margin-top: 20px;">
                         <p style="margin: 0; color: #666; font-size: 12px; text-align: center;">
                             <strong>Security Note:</strong> Never share your verification code with anyone. 
-                            {app_name} staff will never ask for your code.
+                            $app_name staff will never ask for your code.
                         </p>
                     </div>
                 </div>
             </body>
         </html>
-        """
-
-        # Zepto Mail API payload
-        payload = {
-            "from": {
-                "address": FROM_EMAIL,
-                "name": "Hostel Manager"
-            },
-            "to": [
-                {
-                    "email_address": {
-                        "address": email
-                    }
-                }
-            ],
-            "subject": subject,
-            "htmlbody": html_content
-        }
-
-        headers = {
-            "Authorization": ZEPTO_MAIL_API_KEY,
-            "Content-Type": "application/json"
-        }
-
-        # Send email using httpx for async operation
-        try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(ZEPTO_API_ENDPOINT, json=payload, headers=headers)
-                if response.status_code in [200, 201, 202]:
-                    print(f"[SUCCESS] OTP email sent to {email}")
-                    return True
-                else:
-                    error_text = response.text
-                    print(f"[ERROR] Failed to send OTP email. Status: {response.status_code}. Response: {error_text}")
-                    return False
-        except asyncio.TimeoutError:
-            print(f"[ERROR] Timeout sending OTP email to {email}")
-            return False
-    except Exception as e:
-        print(f"[ERROR] Exception sending OTP email to {email}: {str(e)}")
-        return False
-
-
-async def send_welcome_email(email: str, name: str, app_name: str = "Hostel Manager") -> bool:
-    """
-    Send welcome email after successful registration
-    Args:
-        email: User's email address
-        name: User's full name
-        app_name: Application name
-    Returns:
-        True if email sent successfully, False otherwise
-    """
-    if not ZEPTO_MAIL_API_KEY or not FROM_EMAIL:
-        print(f"[WARNING] Zepto Mail not configured. Welcome email not sent to {email}")
-        return False
+        """)
 
-    try:
-        html_content = f"""
+WELCOME_HTML = Template("""
         <html>
             <body style="font-family: Arial, sans-serif; background-color: #f5f5f5; padding: 20px;">
                 <div style="background-color: #ffffff; padding: 30px; border-radius: 8px; max-width: 500px; margin: 0 auto; box-shadow: 0 2px 4px rgba(0,0,0,0.1);">
-                    <h2 style="color: #333; text-align: center; margin-bottom: 20px;">Welcome to {app_name}! 🎉</h2>
+                    <h2 style="color: #333; text-align: center; margin-bottom: 20px;">Welcome to $app_name! 🎉</h2>
                     
                     <p style="color: #666; font-size: 14px; line-height: 1.6;">
-                        Hi {name.split()[0]},
+                        Hi $first_name,
                     </p>
                     
                     <p style="color: #666; font-size: 14px; line-height: 1.6;">
-                        Thank you for registering with {app_name}. Your account has been successfully created and verified.
+                        Thank you for registering with $app_name. Your account has been successfully created and verified.
                     </p>
                     
                     <p style="color: #666; font-size: 14px; line-height: 1.6;">
@@ -150,43 +98,130 @@ async def send_welcome_email(email: str, name: str, app_name: str = "Hostel Mana
                 </div>
             </body>
         </html>
-        """
-
-        payload = {
-            "from": {
-                "address": FROM_EMAIL,
-                "name": "Hostel Manager"
-            },
-            "to": [
-                {
-                    "email_address": {
-                        "address": email,
-                    }
+        """)
+
+# kind -> subject template, body template, Authorization header prefix
+EMAIL_KINDS = {
+    "otp": (Template("Your $app_name Verification Code: $otp"), OTP_HTML, ""),
+    "welcome": (Template("Welcome to $app_name!"), WELCOME_HTML, "Zoho-enczapikey "),
+}
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(EMAIL_SEND_TIMEOUT_SECONDS, connect=5.0),
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+        )
+    return _client
+
+
+async def close_email_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def is_email_configured() -> bool:
+    return bool(ZEPTO_MAIL_API_KEY and FROM_EMAIL)
+
+
+@lru_cache(maxsize=32)
+def _bound_templates(kind: str, app_name: str) -> tuple[Template, Template]:
+    """Subject and body templates with the app name already filled in"""
+    subject, body, _ = EMAIL_KINDS[kind]
+    return (
+        # Escape "$" so the app name survives the second substitution
+        Template(subject.safe_substitute(app_name=app_name.replace("$", "$$"))),
+        Template(body.safe_substitute(app_name=app_name.replace("$", "$$"))),
+    )
+
+
+def render_email(kind: str, params: dict) -> tuple[str, str]:
+    """Return (subject, html) for an email kind"""
+    params = dict(params)
+    app_name = params.pop("app_name", SENDER_NAME)
+    subject, body = _bound_templates(kind, app_name)
+    return subject.substitute(params), body.substitute(params)
+
+
+async def deliver_email(kind: str, to: str, params: dict):
+    """Send one email now; raises EmailDeliveryError when it was not accepted"""
+    if kind not in EMAIL_KINDS:
+        raise EmailDeliveryError(f"Unknown email kind: {kind}", retryable=False)
+    if not is_email_configured():
+        raise EmailDeliveryError("Zepto Mail not configured", retryable=False)
+
+    try:
+        subject, html_content = render_email(kind, params)
+    except (KeyError, ValueError) as e:
+        raise EmailDeliveryError(f"Cannot render {kind} email: {e!r}", retryable=False) from e
+    payload = {
+        "from": {
+            "address": FROM_EMAIL,
+            "name": SENDER_NAME
+        },
+        "to": [
+            {
+                "email_address": {
+                    "address": to
                 }
-            ],
-            "subject": f"Welcome to {app_name}!",
-            "htmlbody": html_content
-        }
-
-        headers = {
-            "Authorization": f"Zoho-enczapikey {ZEPTO_MAIL_API_KEY}",
-            "Content-Type": "application/json"
-        }
-
-        # Send email using httpx for async operation
-        try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(ZEPTO_API_ENDPOINT, json=payload, headers=headers)
-                if response.status_code in [200, 201, 202]:
-                    print(f"[SUCCESS] Welcome email sent to {email}")
-                    return True
-                else:
-                    error_text = response.text
-                    print(f"[ERROR] Failed to send welcome email. Status: {response.status_code}. Response: {error_text}")
-                    return False
-        except asyncio.TimeoutError:
-            print(f"[ERROR] Timeout sending welcome email to {email}")
-            return False
-    except Exception as e:
-        print(f"[ERROR] Exception sending welcome email to {email}: {str(e)}")
+            }
+        ],
+        "subject": subject,
+        "htmlbody": html_content
+    }
+    headers = {
+        "Authorization": f"{EMAIL_KINDS[kind][2]}{ZEPTO_MAIL_API_KEY}",
+        "Content-Type": "application/json"
+    }
+
+    try:
+        response = await _get_client().post(ZEPTO_API_ENDPOINT, json=payload, headers=headers)
+    except httpx.HTTPError as e:
+        raise EmailDeliveryError(f"{type(e).__name__}: {e}") from e
+
+    if response.status_code not in (200, 201, 202):
+        retryable = response.status_code == 429 or response.status_code >= 500
+        raise EmailDeliveryError(f"Status: {response.status_code}. Response: {response.text}", retryable=retryable)
+
+
+async def send_otp_email(email: str, otp: str, app_name: str = SENDER_NAME) -> bool:
+    """
+    Send OTP to user's email via Zoho Zepto Mail, waiting for the result.
+    Prefer email_outbox.queue_email("otp", ...) in request handlers.
+    Returns:
+        True if email sent successfully, False otherwise
+    """
+    if not is_email_configured():
+        print(f"[WARNING] Zepto Mail not configured. OTP: {otp} for {email}")
+        return False
+    try:
+        await deliver_email("otp", email, {"otp": otp, "app_name": app_name})
+        print(f"[SUCCESS] OTP email sent to {email}")
+        return True
+    except EmailDeliveryError as e:
+        print(f"[ERROR] Failed to send OTP email to {email}: {e}")
+        return False
+
+
+async def send_welcome_email(email: str, name: str, app_name: str = SENDER_NAME) -> bool:
+    """
+    Send welcome email after successful registration, waiting for the result
+    Returns:
+        True if email sent successfully, False otherwise
+    """
+    if not is_email_configured():
+        print(f"[WARNING] Zepto Mail not configured. Welcome email not sent to {email}")
+        return False
+    try:
+        await deliver_email("welcome", email, {"first_name": (name.split() or [""])[0], "app_name": app_name})
+        print(f"[SUCCESS] Welcome email sent to {email}")
+        return True
+    except EmailDeliveryError as e:
+        print(f"[ERROR] Failed to send welcome email to {email}: {e}")
         return False
@@ -4,6 +4,8 @@ from fastapi.exception_handlers import RequestValidationError
 from fastapi.exceptions import HTTPException
 import logging
 
+from app.utils.password_hasher import PasswordHasherBusy
+
 def add_global_exception_handlers(app):
     @app.exception_handler(HTTPException)
     async def http_exception_handler(request: Request, exc: HTTPException):
@@ -13,6 +15,14 @@ def add_global_exception_handlers(app):
     async def validation_exception_handler(request: Request, exc: RequestValidationError):
         return JSONResponse(status_code=422, content={"detail": exc.errors()})
 
+    @app.exception_handler(PasswordHasherBusy)
+    async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Server is busy. Please try again shortly."},
+            headers={"Retry-After": "1"},
+        )
+
     @app.exception_handler(Exception)
     async def unhandled_exception_handler(request: Request, exc: Exception):
         logging.exception("Unhandled exception")
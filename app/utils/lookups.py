@@ -0,0 +1,48 @@
+"""
+Aggregation helpers for joining on string references.
+
+Documents reference each other by the hex string of the target's ObjectId
+(tenant.roomId, tenant.bedId, payment.tenantId, payment.bed). Comparing
+with $toString inside a $lookup pipeline cannot use the _id index, so every
+input document scans the joined collection. Converting the reference once on
+the local side and joining with localField/foreignField turns each join into
+an _id index lookup.
+"""
+from typing import Optional, Union
+
+
+def lookup_by_object_id(
+    from_collection: str,
+    local_field: Union[str, dict],
+    as_field: str,
+    project: Optional[dict] = None,
+) -> list[dict]:
+    """
+    Stages joining `from_collection` on _id == ObjectId(<local_field>).
+
+    `local_field` is a field path ("roomId") or an aggregation expression;
+    invalid or missing ids simply join nothing. The temporary converted field
+    is removed again after the lookup.
+    """
+    if isinstance(local_field, dict) or local_field.startswith("$"):
+        source = local_field
+    else:
+        source = f"${local_field}"
+    converted = f"_{as_field}_oid"
+    lookup = {
+        "from": from_collection,
+        "localField": converted,
+        "foreignField": "_id",
+        "as": as_field,
+    }
+    if project:
+        # Concise localField + pipeline syntax (MongoDB 5.0+)
+        lookup["pipeline"] = [{"$project": project}]
+
+    return [
+        {"$addFields": {converted: {
+            "$convert": {"input": source, "to": "objectId", "onError": None, "onNull": None}
+        }}},
+        {"$lookup": lookup},
+        {"$unset": converted},
+    ]
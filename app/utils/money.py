@@ -0,0 +1,30 @@
+"""Helpers for the string amounts stored on tenants (rent) and payments (amount)"""
+
+
+def parse_amount(amount_str) -> float:
+    """Parse amount string that may contain currency symbols and commas"""
+    if not amount_str:
+        return 0.0
+    try:
+        # Remove currency symbols and commas, then convert to float
+        cleaned = str(amount_str).replace('₹', '').replace(',', '').strip()
+        return float(cleaned) if cleaned else 0.0
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def to_paise(amount) -> int:
+    """Convert a rupee amount ("₹5,000", "4999.50", 5000) to integer paise"""
+    return int(round(parse_amount(amount) * 100))
+
+
+def paise_to_rupees(paise: int):
+    """Integer rupees when the amount is whole, otherwise a float with paise"""
+    if paise % 100 == 0:
+        return paise // 100
+    return paise / 100
+
+
+def format_rupees(paise: int) -> str:
+    """Format paise for display without decimals (e.g. 500000 -> "₹5,000")"""
+    return f"₹{paise / 100:,.0f}"
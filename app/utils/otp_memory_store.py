@@ -6,6 +6,8 @@ from typing import Optional, Tuple
 # In-memory storage structure: {email: {otp, created_at, expires_at, last_sent_at, resend_cooldown_expires_at}}
 otp_store: dict = {}
 
+OTP_TTL_SECONDS = 5 * 60
+
 
 async def generate_and_store_otp(email: str, otp_type: str = "registration") -> Tuple[str, bool]:
     """
@@ -34,7 +36,7 @@ async def generate_and_store_otp(email: str, otp_type: str = "registration") ->
     
     # Generate new OTP
     otp = str(random.randint(100000, 999999))
-    expires_at = now + timedelta(minutes=5)
+    expires_at = now + timedelta(seconds=OTP_TTL_SECONDS)
     resend_cooldown_expires_at = now + timedelta(seconds=45)
     
     otp_store[normalized_email] = {
@@ -0,0 +1,82 @@
+"""
+Keyset (cursor) pagination helpers.
+
+A cursor is an opaque, URL-safe token holding the sort value and _id of the
+last document on the previous page. The next page seeks past that pair
+with an index-friendly range query instead of $skip, so deep pages cost the
+same as the first one.
+"""
+import base64
+from typing import Any, Optional
+
+from bson import json_util
+
+ASCENDING = 1
+DESCENDING = -1
+
+
+def encode_cursor(sort_value: Any, doc_id: Any) -> str:
+    raw = json_util.dumps([sort_value, doc_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> tuple[Any, Any]:
+    """Return (sort_value, _id); raises ValueError for malformed tokens"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        sort_value, doc_id = json_util.loads(base64.urlsafe_b64decode(padded.encode()))
+        return sort_value, doc_id
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def sort_spec(sort_field: str, direction: int) -> list[tuple[str, int]]:
+    """Sort by the key with _id as tie-breaker so the order is total"""
+    if sort_field == "_id":
+        return [("_id", direction)]
+    return [(sort_field, direction), ("_id", direction)]
+
+
+def apply_cursor(query: dict, sort_field: str, direction: int, cursor: Optional[str]) -> dict:
+    """Add the keyset seek condition for `cursor` to `query`"""
+    if not cursor:
+        return query
+
+    sort_value, doc_id = decode_cursor(cursor)
+    op = "$gt" if direction == ASCENDING else "$lt"
+    if sort_field == "_id":
+        seek = {"_id": {op: doc_id}}
+    else:
+        seek = {"$or": [
+            {sort_field: {op: sort_value}},
+            {sort_field: sort_value, "_id": {op: doc_id}},
+        ]}
+
+    if not query:
+        return seek
+    return {"$and": [query, seek]}
+
+
+def next_cursor(last_doc: Optional[dict], sort_field: str) -> Optional[str]:
+    if not last_doc:
+        return None
+    return encode_cursor(last_doc.get(sort_field) if sort_field != "_id" else last_doc["_id"], last_doc["_id"])
+
+
+def page_meta(
+    *,
+    page: int,
+    page_size: int,
+    has_more: bool,
+    next_page_cursor: Optional[str],
+    total: Optional[int] = None,
+) -> dict:
+    """Listing meta block; total is omitted when the count was skipped"""
+    meta = {"total": total} if total is not None else {}
+    meta.update({
+        "page": page,
+        "pageSize": page_size,
+        "hasMore": has_more,
+        "nextCursor": next_page_cursor if has_more else None,
+    })
+    return meta
@@ -0,0 +1,106 @@
+"""
+Argon2 hashing off the event loop.
+
+argon2 spends tens of milliseconds of CPU per hash or verify. Run inline in
+a request handler it stalls every other request on the worker, so the work
+goes to a small thread pool instead (argon2-cffi releases the GIL while
+hashing). The number of operations waiting for a thread is capped: once
+PASSWORD_HASH_MAX_QUEUE is reached new calls fail fast with
+PasswordHasherBusy rather than letting login latency grow without bound.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from app.config import settings
+from app.utils.helpers import pwd_context
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many hash operations are already queued"""
+
+
+class PasswordHasher:
+    def __init__(self, workers: Optional[int] = None, max_queue: Optional[int] = None):
+        self.workers = max(1, workers or settings.PASSWORD_HASH_WORKERS)
+        self.max_queue = max(0, max_queue if max_queue is not None else settings.PASSWORD_HASH_MAX_QUEUE)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._in_flight = 0
+        self._stats = {
+            "hashed": 0,
+            "verified": 0,
+            "rehashed": 0,
+            "rejected": 0,
+            "peakInFlight": 0,
+            "totalMs": 0.0,
+        }
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        return self._executor
+
+    async def _run(self, func: Callable[..., Any], *args) -> Any:
+        if self._in_flight >= self.workers + self.max_queue:
+            self._stats["rejected"] += 1
+            raise PasswordHasherBusy("Password hashing queue is full")
+
+        self._in_flight += 1
+        self._stats["peakInFlight"] = max(self._stats["peakInFlight"], self._in_flight)
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self._in_flight -= 1
+            self._stats["totalMs"] += (time.perf_counter() - start) * 1000
+
+    async def hash(self, password: str) -> str:
+        hashed = await self._run(pwd_context.hash, password)
+        self._stats["hashed"] += 1
+        return hashed
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        valid, _ = await self.verify_and_update(password, hashed)
+        return valid
+
+    async def verify_and_update(self, password: str, hashed: str) -> tuple[bool, Optional[str]]:
+        """
+        Verify `password` and return (valid, new_hash). new_hash is set when
+        the stored hash uses outdated parameters and should be replaced.
+        """
+        if not hashed:
+            return False, None
+        try:
+            valid, new_hash = await self._run(pwd_context.verify_and_update, password, hashed)
+        except ValueError:
+            # Unrecognised or malformed stored hash
+            return False, None
+        self._stats["verified"] += 1
+        if new_hash:
+            self._stats["rehashed"] += 1
+        return valid, new_hash
+
+    def metrics(self) -> dict:
+        completed = self._stats["hashed"] + self._stats["verified"]
+        return {
+            "workers": self.workers,
+            "maxQueue": self.max_queue,
+            "inFlight": self._in_flight,
+            "queued": max(0, self._in_flight - self.workers),
+            "hashed": self._stats["hashed"],
+            "verified": self._stats["verified"],
+            "rehashed": self._stats["rehashed"],
+            "rejected": self._stats["rejected"],
+            "peakInFlight": self._stats["peakInFlight"],
+            "avgMs": round(self._stats["totalMs"] / completed, 1) if completed else 0.0,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
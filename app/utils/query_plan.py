@@ -0,0 +1,53 @@
+"""
+Run independent database queries concurrently.
+
+Motor starts an operation as soon as the method is called, so queries are
+added as zero-argument callables and only invoked once a slot is free. This
+keeps a single request from taking more than `max_concurrency` connections
+from the pool.
+
+    plan = QueryPlan()
+    plan.add("tenants", lambda: db["tenants"].count_documents(query))
+    plan.add("rooms", lambda: db["rooms"].count_documents(query))
+    results = await plan.run()   # {"tenants": 12, "rooms": 4}
+    plan.timings                 # {"tenants": 3.1, "rooms": 2.4} (ms)
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from app.config import settings
+
+
+class QueryPlan:
+    def __init__(self, max_concurrency: Optional[int] = None):
+        self.max_concurrency = max(1, max_concurrency or settings.QUERY_PLAN_MAX_CONCURRENCY)
+        self.timings: dict[str, float] = {}
+        self._queries: dict[str, Callable[[], Awaitable[Any]]] = {}
+
+    def add(self, name: str, query: Callable[[], Awaitable[Any]]) -> "QueryPlan":
+        if name in self._queries:
+            raise ValueError(f"Query '{name}' is already part of this plan")
+        self._queries[name] = query
+        return self
+
+    async def run(self) -> dict[str, Any]:
+        """Run every query and return their results keyed by name (first error is raised)"""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run_one(name: str, query: Callable[[], Awaitable[Any]]):
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    return await query()
+                finally:
+                    self.timings[name] = (time.perf_counter() - start) * 1000
+
+        names = list(self._queries)
+        results = await asyncio.gather(*(run_one(name, self._queries[name]) for name in names))
+        return dict(zip(names, results))
+
+
+def format_server_timing(timings: dict[str, float]) -> str:
+    """Render {name: ms} as a Server-Timing header value"""
+    return ", ".join(f"{name};dur={duration:.1f}" for name, duration in timings.items())
@@ -1,3 +1,74 @@
+from typing import List, Optional
+
+
 def validate_room_data(room_data):
     # Add validation logic for room data
     pass
+
+
+def bed_number_value(bed: dict) -> Optional[int]:
+    """Numeric bed number ("10" > "2"); None for non-numeric numbers"""
+    try:
+        return int(str(bed.get("bedNumber", "")).strip())
+    except ValueError:
+        return None
+
+
+def _bed_order(bed: dict):
+    number = bed_number_value(bed)
+    return (number is None, number if number is not None else 0, str(bed.get("bedNumber", "")))
+
+
+def plan_bed_reduction(room_id: str, new_bed_count: int, room_beds: List[dict], other_free_beds: List[dict]) -> dict:
+    """
+    Work out what shrinking a room to `new_bed_count` beds does, without writing.
+
+    Beds numbered above the new count are removed. Their tenants move, in bed
+    order, to a free bed that stays in the same room, then to a free bed in
+    another room of the property (`other_free_beds`), and are vacated once no
+    free bed is left. Used by both the resize and its preview.
+
+    Returns {"bedsToRemove", "moves", "vacates", "availableBedsInSameRoom"};
+    every move is {"tenantId", "fromBed", "toBed", "location"} and every
+    vacate {"tenantId", "fromBed"}.
+    """
+    beds_to_remove = []
+    free_in_room = []
+    for bed in sorted(room_beds, key=_bed_order):
+        number = bed_number_value(bed)
+        if number is not None and number > new_bed_count:
+            beds_to_remove.append(bed)
+        elif bed.get("status") == "available":
+            free_in_room.append(bed)
+
+    free_elsewhere = [bed for bed in sorted(other_free_beds, key=lambda b: (str(b.get("roomId")), _bed_order(b)))
+                      if bed.get("roomId") != room_id]
+    available_same_room = len(free_in_room)
+
+    moves = []
+    vacates = []
+    for bed in beds_to_remove:
+        tenant_id = bed.get("tenantId")
+        if not tenant_id:
+            continue
+        if free_in_room:
+            moves.append({"tenantId": tenant_id, "fromBed": bed, "toBed": free_in_room.pop(0), "location": "same_room"})
+        elif free_elsewhere:
+            moves.append({"tenantId": tenant_id, "fromBed": bed, "toBed": free_elsewhere.pop(0), "location": "other_room"})
+        else:
+            vacates.append({"tenantId": tenant_id, "fromBed": bed})
+
+    return {
+        "bedsToRemove": beds_to_remove,
+        "moves": moves,
+        "vacates": vacates,
+        "availableBedsInSameRoom": available_same_room,
+    }
+
+
+def displaced_tenant_count(room_beds: List[dict], new_bed_count: int) -> int:
+    """Tenants on beds that a reduction to `new_bed_count` removes"""
+    return sum(
+        1 for bed in room_beds
+        if bed.get("tenantId") and (bed_number_value(bed) or 0) > new_bed_count
+    )
@@ -0,0 +1,68 @@
+"""
+Query clauses for the tenant search box.
+
+Kept free of database imports so the term handling can be tested on its own.
+"""
+import re
+
+# Phone numbers are typed with or without the Indian country code, and with
+# spaces or dashes between the digit groups
+COUNTRY_CODE = "91"
+PHONE_DIGITS = 10
+_PHONE_TERM = re.compile(r"\+?[\d\s\-()]+")
+_SEPARATOR = r"[\s\-()]*"
+
+
+def normalize_phone(term: str) -> str:
+    """Digits of a phone search term with any leading +91 / 0 trunk prefix removed"""
+    raw = re.sub(r"\D", "", term)
+    digits = raw
+    if term.lstrip().startswith("+") or len(raw) > PHONE_DIGITS:
+        if raw.startswith(COUNTRY_CODE):
+            digits = raw[len(COUNTRY_CODE):]
+    elif len(raw) == PHONE_DIGITS + 1 and raw.startswith("0"):
+        digits = raw[1:]
+    # A bare "+91" still searches for those digits
+    return digits or raw
+
+
+def phone_prefix_pattern(digits: str) -> str:
+    """
+    Anchored regex matching stored phones that start with `digits`,
+    with or without a country code and with any separators in between
+    """
+    body = _SEPARATOR.join(re.escape(d) for d in digits)
+    return f"^(\\+?{COUNTRY_CODE}{_SEPARATOR}|0)?{body}"
+
+
+def build_tenant_search(search: str) -> tuple[dict, bool]:
+    """
+    Return (query clause, is_text_search) for a tenant search term.
+
+    Phone-like terms ("98765", "+91 98765 43210") match stored phones by
+    prefix whatever country code or separators either side used. Other
+    single tokens containing a digit (document ids) become anchored prefix
+    regexes, which the (propertyId, documentId) index can serve. Anything
+    else is a $text search on the (name, phone, documentId) text index,
+    OR-ed with a case-insensitive anchored prefix on name so partial names
+    ("Ram" for "Ramesh") still match.
+    """
+    term = " ".join(search.split())
+    if term and _PHONE_TERM.fullmatch(term) and any(ch.isdigit() for ch in term):
+        digits = normalize_phone(term)
+        return {"$or": [
+            {"phone": {"$regex": phone_prefix_pattern(digits)}},
+            {"documentId": {"$regex": f"^{re.escape(term)}"}},
+        ]}, False
+    if term and " " not in term and any(ch.isdigit() for ch in term):
+        # Document ids are usually stored upper-case; a case-insensitive regex
+        # could not use the index bounds, so match both spellings instead
+        return {"$or": [
+            {"documentId": {"$regex": f"^{re.escape(term)}"}},
+            {"documentId": {"$regex": f"^{re.escape(term.upper())}"}},
+        ]}, False
+    return {"$or": [
+        {"$text": {"$search": term}},
+        # Every $or clause must be indexed when one of them is $text
+        {"name": {"$regex": f"^{re.escape(term)}", "$options": "i"}},
+    ]}, True
@@ -0,0 +1,109 @@
+"""
+Backfill integer paise money fields:
+  payments.amount -> payments.amountPaise
+  tenants.rent    -> tenants.rentPaise
+
+Runs in _id order in batches and stores a checkpoint in the `migrations`
+collection after every batch, so an interrupted run resumes where it
+stopped. Documents that already have the paise field are left untouched.
+
+Usage:
+  python migrate_money_paise.py [--batch-size 1000] [--restart]
+"""
+import argparse
+import os
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+
+from app.utils.money import to_paise
+
+load_dotenv()
+MONGO_URI = os.environ.get("MONGO_URL")
+DB_NAME = os.environ.get("MONGO_DB_NAME")
+
+MIGRATION_ID = "money_paise_v1"
+# collection -> (source string field, target paise field)
+FIELDS = {
+    "payments": ("amount", "amountPaise"),
+    "tenants": ("rent", "rentPaise"),
+}
+
+
+def migrate_collection(db, name, source, target, batch_size, checkpoint):
+    state = checkpoint.get(name, {})
+    if state.get("done"):
+        print(f"{name}: already migrated, skipping")
+        return
+
+    last_id = state.get("lastId")
+    updated = state.get("updated", 0)
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        batch = list(
+            db[name].find(query, {source: 1, target: 1}).sort("_id", 1).limit(batch_size)
+        )
+        if not batch:
+            break
+
+        operations = [
+            # Guard on the target field so concurrent API writes are never overwritten
+            UpdateOne({"_id": doc["_id"], target: {"$exists": False}}, {"$set": {target: to_paise(doc.get(source))}})
+            for doc in batch
+            if target not in doc
+        ]
+        if operations:
+            result = db[name].bulk_write(operations, ordered=False)
+            updated += result.modified_count
+
+        last_id = batch[-1]["_id"]
+        db["migrations"].update_one(
+            {"_id": MIGRATION_ID},
+            {"$set": {
+                f"collections.{name}.lastId": last_id,
+                f"collections.{name}.updated": updated,
+                "updatedAt": datetime.now(timezone.utc).isoformat(),
+            }},
+            upsert=True,
+        )
+        print(f"{name}: processed up to {last_id} ({updated} updated)")
+
+    db["migrations"].update_one(
+        {"_id": MIGRATION_ID},
+        {"$set": {f"collections.{name}.done": True, "updatedAt": datetime.now(timezone.utc).isoformat()}},
+        upsert=True,
+    )
+    print(f"{name}: done ({updated} updated)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill amountPaise / rentPaise")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--restart", action="store_true", help="ignore the saved checkpoint and start over")
+    args = parser.parse_args()
+
+    if not MONGO_URI or not DB_NAME:
+        raise RuntimeError("MONGO_URL and MONGO_DB_NAME environment variables must be set.")
+
+    client = MongoClient(MONGO_URI)
+    db = client[DB_NAME]
+    print(f"Using Database Name: {DB_NAME}")
+
+    if args.restart:
+        db["migrations"].delete_one({"_id": MIGRATION_ID})
+    checkpoint = (db["migrations"].find_one({"_id": MIGRATION_ID}) or {}).get("collections", {})
+
+    for name, (source, target) in FIELDS.items():
+        migrate_collection(db, name, source, target, args.batch_size, checkpoint)
+
+    db["migrations"].update_one(
+        {"_id": MIGRATION_ID},
+        {"$set": {"completedAt": datetime.now(timezone.utc).isoformat()}},
+        upsert=True,
+    )
+    print("Migration complete.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Backfill payments.updatedAt as a BSON date.
+
+The payment listing sorts and pages on (updatedAt desc, _id desc). Older
+payments may lack updatedAt or hold it as an ISO string; MongoDB orders
+values of different types apart, so such rows would be skipped when a
+cursor crosses from dates to strings. This sets every non-date updatedAt
+to a date: the parsed string if it is one, else createdAt, else the time
+encoded in the _id.
+
+Runs in _id order in batches and stores a checkpoint in the `migrations`
+collection after every batch, so an interrupted run resumes where it
+stopped. Payments that already have a date are left untouched.
+
+Usage:
+  python migrate_payment_updated_at.py [--batch-size 1000] [--restart]
+"""
+import argparse
+import os
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+
+load_dotenv()
+MONGO_URI = os.environ.get("MONGO_URL")
+DB_NAME = os.environ.get("MONGO_DB_NAME")
+
+MIGRATION_ID = "payment_updated_at_v1"
+COLLECTION = "payments"
+
+
+def _as_datetime(value):
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if isinstance(value, str) and value:
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+    return None
+
+
+def backfill_value(doc) -> datetime:
+    return _as_datetime(doc.get("updatedAt")) or _as_datetime(doc.get("createdAt")) or doc["_id"].generation_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill payments.updatedAt as a date")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--restart", action="store_true", help="ignore the saved checkpoint and start over")
+    args = parser.parse_args()
+
+    if not MONGO_URI or not DB_NAME:
+        raise RuntimeError("MONGO_URL and MONGO_DB_NAME environment variables must be set.")
+
+    client = MongoClient(MONGO_URI)
+    db = client[DB_NAME]
+    print(f"Using Database Name: {DB_NAME}")
+
+    if args.restart:
+        db["migrations"].delete_one({"_id": MIGRATION_ID})
+    state = db["migrations"].find_one({"_id": MIGRATION_ID}) or {}
+    if state.get("completedAt"):
+        print(f"{COLLECTION}: already migrated, skipping")
+        return
+
+    last_id = state.get("lastId")
+    updated = state.get("updated", 0)
+    while True:
+        query = {"updatedAt": {"$not": {"$type": "date"}}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = list(
+            db[COLLECTION].find(query, {"updatedAt": 1, "createdAt": 1}).sort("_id", 1).limit(args.batch_size)
+        )
+        if not batch:
+            break
+
+        operations = [
+            # Guard on the old value so a concurrent API write (which stores a date) is never overwritten
+            UpdateOne(
+                {"_id": doc["_id"], "updatedAt": doc["updatedAt"] if "updatedAt" in doc else {"$exists": False}},
+                {"$set": {"updatedAt": backfill_value(doc)}},
+            )
+            for doc in batch
+        ]
+        result = db[COLLECTION].bulk_write(operations, ordered=False)
+        updated += result.modified_count
+
+        last_id = batch[-1]["_id"]
+        db["migrations"].update_one(
+            {"_id": MIGRATION_ID},
+            {"$set": {
+                "lastId": last_id,
+                "updated": updated,
+                "updatedAt": datetime.now(timezone.utc).isoformat(),
+            }},
+            upsert=True,
+        )
+        print(f"{COLLECTION}: processed up to {last_id} ({updated} updated)")
+
+    db["migrations"].update_one(
+        {"_id": MIGRATION_ID},
+        {"$set": {"completedAt": datetime.now(timezone.utc).isoformat()}},
+        upsert=True,
+    )
+    print(f"Migration complete ({updated} updated).")
+
+
+if __name__ == "__main__":
+    main()
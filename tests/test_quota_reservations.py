@@ -0,0 +1,97 @@
+"""
+Quota reservations racing the counter rebuilds. Needs a MongoDB server:
+set MONGO_URL to run; the tests use (and drop) their own database.
+"""
+import asyncio
+import os
+
+import pytest
+
+pytest.importorskip("motor")
+if not os.environ.get("MONGO_URL"):
+    pytest.skip("MONGO_URL is not set", allow_module_level=True)
+
+os.environ["MONGO_DB_NAME"] = "test_quota_reservations"
+
+from app.database.mongodb import client, db  # noqa: E402
+from app.services.owner_usage_service import OwnerUsageService  # noqa: E402
+from app.services.property_stats_service import PropertyStatsService  # noqa: E402
+
+PROPERTY_ID = "property-1"
+OWNER_ID = "owner-1"
+
+# Motor binds its client to the loop that first uses it
+loop = asyncio.new_event_loop()
+
+
+def run(coro):
+    return loop.run_until_complete(coro)
+
+
+@pytest.fixture(autouse=True)
+def clean_database():
+    run(client.drop_database(db.name))
+    yield
+    run(client.drop_database(db.name))
+
+
+def test_reservations_survive_concurrent_rebuilds():
+    stats = PropertyStatsService()
+
+    async def scenario():
+        await db.tenants.insert_many([{"propertyId": PROPERTY_ID, "name": f"t{i}"} for i in range(5)])
+        await stats.rebuild(PROPERTY_ID)
+
+        # Room for three more; ten requests race four rebuilds
+        results = await asyncio.gather(
+            *(stats.reserve(PROPERTY_ID, "tenantCount", 8) for _ in range(10)),
+            *(stats.rebuild(PROPERTY_ID) for _ in range(4)),
+        )
+        granted = sum(1 for result in results[:10] if result is True)
+        doc = await db.property_stats.find_one({"_id": PROPERTY_ID})
+        assert granted == 3
+        assert doc["tenantCount"] == 5
+        assert doc["reserved"]["tenantCount"] == 3
+
+        # One reserved insert goes through, one is given back
+        tenant = {"propertyId": PROPERTY_ID, "name": "new"}
+        await db.tenants.insert_one(tenant)
+        await stats.record_change("tenants", after=tenant, reserved=True)
+        await stats.release(PROPERTY_ID, "tenantCount")
+        await stats.rebuild(PROPERTY_ID)
+
+        doc = await db.property_stats.find_one({"_id": PROPERTY_ID})
+        assert doc["tenantCount"] == 6
+        assert doc["reserved"]["tenantCount"] == 1
+        assert not await stats.reserve(PROPERTY_ID, "tenantCount", 7)
+
+    run(scenario())
+
+
+def test_owner_reservations_survive_reconciliation():
+    usage = OwnerUsageService()
+
+    async def scenario():
+        await db.properties.insert_many([{"ownerIds": [OWNER_ID], "name": f"p{i}"} for i in range(2)])
+
+        results = await asyncio.gather(
+            *(usage.reserve_property(OWNER_ID, 4) for _ in range(5)),
+            usage.reconcile_all(),
+            usage.reconcile_all(),
+        )
+        granted = sum(1 for result in results[:5] if result is True)
+        doc = await db.owner_usage.find_one({"_id": OWNER_ID})
+        assert granted == 2
+        assert doc["properties"] == 2
+        assert doc["reserved"] == 2
+
+        await db.properties.insert_one({"ownerIds": [OWNER_ID], "name": "p2"})
+        await usage.record_property_created(OWNER_ID, reserved=True)
+        await usage.reconcile_all()
+
+        doc = await db.owner_usage.find_one({"_id": OWNER_ID})
+        assert doc["properties"] == 3
+        assert doc["reserved"] == 1
+        assert not await usage.reserve_property(OWNER_ID, 4)
+
+    run(scenario())
@@ -0,0 +1,52 @@
+import re
+
+from app.utils.tenant_search import build_tenant_search, normalize_phone
+
+
+def _regex(clause: dict, field: str) -> re.Pattern:
+    """Compile the first regex on `field` in an $or clause the way MongoDB would"""
+    for branch in clause["$or"]:
+        if field in branch:
+            spec = branch[field]
+            flags = re.IGNORECASE if "i" in spec.get("$options", "") else 0
+            return re.compile(spec["$regex"], flags)
+    raise AssertionError(f"no {field} regex in {clause}")
+
+
+def test_partial_name_matches_by_prefix():
+    clause, text_search = build_tenant_search("Ram")
+    assert text_search
+    assert {"$text": {"$search": "Ram"}} in clause["$or"]
+    name = _regex(clause, "name")
+    assert name.search("Ramesh Kumar")
+    assert name.search("ramesh")
+    assert not name.search("Sriram")
+
+
+def test_name_search_is_escaped_and_whitespace_normalized():
+    clause, _ = build_tenant_search("  Ram   (K)  ")
+    name = _regex(clause, "name")
+    assert name.search("Ram (K) Sharma")
+    assert not name.search("Ram K")
+
+
+def test_phone_search_ignores_country_code_on_either_side():
+    for term in ("+91 98765", "+91-98765", "98765", "+919876543210", "919876543210"):
+        clause, text_search = build_tenant_search(term)
+        assert not text_search
+        phone = _regex(clause, "phone")
+        for stored in ("9876543210", "+91 98765 43210", "+919876543210", "98765-43210", "09876543210"):
+            assert phone.search(stored), (term, stored)
+        assert not phone.search("8876543210")
+
+
+def test_ten_digit_number_starting_with_91_is_not_stripped():
+    assert normalize_phone("9123456789") == "9123456789"
+    assert normalize_phone("+91 9123456789") == "9123456789"
+    assert normalize_phone("+91") == "91"
+
+
+def test_document_ids_use_case_variants():
+    clause, text_search = build_tenant_search("ab12")
+    assert not text_search
+    assert {"documentId": {"$regex": "^AB12"}} in clause["$or"]